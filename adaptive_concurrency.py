@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+自适应并发控制
+AIMD（加性增、乘性减）控制在途检测数：延迟和超时率正常时逐步加并发，
+超时率突增、延迟恶化或出现文件描述符压力时成倍回退
+"""
+
+import asyncio
+import concurrent.futures
+import errno
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+from config import ADAPTIVE_CONCURRENCY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 表示本机资源不足（而不是代理本身失效）的错误码
+FD_PRESSURE_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL}
+
+
+def is_fd_pressure(error: BaseException) -> bool:
+    """判断异常是否由本机文件描述符/端口耗尽引起"""
+    while error is not None:
+        if isinstance(error, OSError) and error.errno in FD_PRESSURE_ERRNOS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def fd_limit() -> int:
+    """当前进程可用的文件描述符上限"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        return soft
+    except (ImportError, ValueError, OSError):
+        return 1024
+
+
+class AIMDController:
+    """AIMD 并发控制器（线程安全，可同时用于线程池和 asyncio）"""
+
+    def __init__(self, initial: Optional[int] = None, min_limit: Optional[int] = None,
+                 max_limit: Optional[int] = None):
+        config = ADAPTIVE_CONCURRENCY_CONFIG
+        # 为连接之外的文件描述符预留余量
+        fd_cap = max(1, int(fd_limit() * 0.8))
+        self.min_limit = min_limit or config['min']
+        self.max_limit = min(max_limit or config['max'], fd_cap)
+        self.increase = config['increase']
+        self.decrease = config['decrease']
+        self.timeout_tolerance = config['timeout_tolerance']
+        self.latency_tolerance = config['latency_tolerance']
+        self._limit = float(max(self.min_limit, min(initial or config['initial'], self.max_limit)))
+        self._lock = threading.Lock()
+        self._timeout_baseline: Optional[float] = None
+        self._latency_baseline: Optional[float] = None
+        # 与TCP拥塞控制一样，首次回退前按倍数增长，尽快找到机器的承载上限
+        self._slow_start = True
+        self._reset_window()
+
+    @property
+    def limit(self) -> int:
+        """当前允许的在途数"""
+        return int(self._limit)
+
+    def _reset_window(self):
+        self._count = 0
+        self._timeouts = 0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._backed_off = False
+
+    def _back_off(self, reason: str):
+        # 每个窗口最多回退一次，避免同一批失败把并发打到底
+        if self._backed_off:
+            return
+        self._limit = max(self.min_limit, self._limit * self.decrease)
+        self._backed_off = True
+        self._slow_start = False
+        logger.debug(f"并发回退到 {self.limit} ({reason})")
+
+    def record(self, latency: float, success: bool, timeout: bool = False, overload: bool = False):
+        """记录一次检测结果"""
+        with self._lock:
+            if overload:
+                self._back_off('fd_pressure')
+                return
+
+            self._count += 1
+            if timeout:
+                self._timeouts += 1
+            elif success:
+                self._latency_sum += latency
+                self._latency_count += 1
+
+            # 每完成约一个并发窗口的检测评估一次
+            if self._count < max(self.limit, self.min_limit):
+                return
+
+            timeout_rate = self._timeouts / self._count
+            avg_latency = self._latency_sum / self._latency_count if self._latency_count else None
+
+            healthy = True
+            if self._timeout_baseline is not None and timeout_rate > self._timeout_baseline + self.timeout_tolerance:
+                healthy = False
+                self._back_off(f'timeout_rate={timeout_rate:.2f}')
+            elif (avg_latency is not None and self._latency_baseline is not None
+                  and avg_latency > self._latency_baseline * self.latency_tolerance):
+                healthy = False
+                self._back_off(f'latency={avg_latency:.2f}s')
+
+            if healthy:
+                if not self._backed_off:
+                    grown = self._limit * 2 if self._slow_start else self._limit + self.increase
+                    self._limit = min(self.max_limit, grown)
+                # 基线只在健康窗口里更新，免得过载状态被当成常态
+                self._timeout_baseline = timeout_rate if self._timeout_baseline is None else \
+                    0.8 * self._timeout_baseline + 0.2 * timeout_rate
+                if avg_latency is not None:
+                    self._latency_baseline = avg_latency if self._latency_baseline is None else \
+                        0.8 * self._latency_baseline + 0.2 * avg_latency
+
+            self._reset_window()
+
+
+async def gather_adaptive(controller: AIMDController, items: Iterable[Any],
+                          worker: Callable[[Any], Awaitable[Any]]) -> List[Any]:
+    """按控制器的当前并发上限执行 worker，结果顺序与输入一致（worker 负责调用 record）"""
+    items = list(items)
+    results: List[Any] = [None] * len(items)
+    pending = {}
+    next_index = 0
+
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < controller.limit:
+            task = asyncio.ensure_future(worker(items[next_index]))
+            pending[task] = next_index
+            next_index += 1
+        done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            index = pending.pop(task)
+            results[index] = task.exception() or task.result()
+    return results
+
+
+def map_adaptive(controller: AIMDController, items: Iterable[Any], worker: Callable[[Any], Any],
+                 max_threads: Optional[int] = None) -> List[Any]:
+    """线程池版本的 gather_adaptive"""
+    items = list(items)
+    results: List[Any] = [None] * len(items)
+    max_threads = min(max_threads or ADAPTIVE_CONCURRENCY_CONFIG['max_threads'], controller.max_limit)
+    pending = {}
+    next_index = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+        while next_index < len(items) or pending:
+            while next_index < len(items) and len(pending) < min(controller.limit, max_threads):
+                future = executor.submit(worker, items[next_index])
+                pending[future] = next_index
+                next_index += 1
+            done, _ = concurrent.futures.wait(pending.keys(), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.exception() or future.result()
+    return results
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+异步代理验证引擎
+使用共享连接器 + 有界并发 + 单代理总时限批量验证代理
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from adaptive_concurrency import AIMDController, gather_adaptive, is_fd_pressure
+from config import PROXY_CHECK_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def match_origin(ip: str, text: str) -> bool:
+    """判断检测URL的响应内容中是否包含代理IP"""
+    try:
+        json_data = json.loads(text)
+    except ValueError:
+        return ip in text
+
+    if isinstance(json_data, dict):
+        origin = json_data.get('origin', json_data.get('ip', ''))
+        if isinstance(origin, list):
+            return any(ip in o for o in origin)
+        return isinstance(origin, str) and ip in origin
+    return False
+
+
+# 代理转发请求时可能添加的请求头（出现即说明对方能看出使用了代理）
+PROXY_HEADERS = ('via', 'x-forwarded-for', 'forwarded', 'x-real-ip', 'client-ip',
+                 'x-proxy-id', 'x-forwarded', 'forwarded-for', 'proxy-connection')
+
+
+def classify_anonymity(text: str, real_ip: str) -> str:
+    """
+    根据判定服务回显的 origin 和请求头判断匿名度
+    transparent: 暴露了本机真实IP；anonymous: 未暴露真实IP但带有代理请求头；high_anonymous: 两者都没有
+    无法解析回显内容时返回空字符串
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return ''
+    if not isinstance(data, dict) or not isinstance(data.get('headers'), dict):
+        return ''
+
+    headers = {str(k).lower(): str(v) for k, v in data['headers'].items()}
+    origin = data.get('origin', '')
+    origin = ','.join(origin) if isinstance(origin, list) else str(origin)
+    if real_ip and (real_ip in origin or any(real_ip in v for v in headers.values())):
+        return 'transparent'
+    if any(name in headers for name in PROXY_HEADERS):
+        return 'anonymous'
+    return 'high_anonymous'
+
+
+async def tcp_alive(proxy: str, timeout: Optional[float] = None) -> bool:
+    """TCP连通性检测：仅建立连接，不发送任何数据"""
+    timeout = timeout or PROXY_CHECK_CONFIG['connect_timeout']
+    try:
+        host, port = proxy.strip().rsplit(':', 1)
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout=timeout)
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+async def async_tcp_prefilter(proxies: Iterable[str], timeout: Optional[float] = None,
+                              max_concurrent: Optional[int] = None) -> List[str]:
+    """TCP预筛：返回端口可连通的代理，顺序与输入一致"""
+    proxies = list(proxies)
+    semaphore = asyncio.Semaphore(max_concurrent or PROXY_CHECK_CONFIG['prefilter_concurrency'])
+
+    async def probe(proxy):
+        async with semaphore:
+            return await tcp_alive(proxy, timeout)
+
+    alive = await asyncio.gather(*(probe(p) for p in proxies))
+    reachable = [p for p, ok in zip(proxies, alive) if ok]
+    logger.info(f"TCP预筛完成，可连通: {len(reachable)}/{len(proxies)}")
+    return reachable
+
+
+def tcp_prefilter(proxies: Iterable[str], timeout: Optional[float] = None,
+                  max_concurrent: Optional[int] = None) -> List[str]:
+    """同步入口：TCP预筛"""
+    return asyncio.run(async_tcp_prefilter(proxies, timeout=timeout, max_concurrent=max_concurrent))
+
+
+def default_test_url() -> str:
+    """默认检测URL：识别匿名度时需要能回显请求头的URL"""
+    return PROXY_CHECK_CONFIG['anonymity_url'] if PROXY_CHECK_CONFIG['classify_anonymity'] \
+        else PROXY_CHECK_CONFIG['test_urls'][0]
+
+
+class AsyncProxyChecker:
+    """异步代理验证器"""
+
+    def __init__(self, test_url: Optional[str] = None, timeout: Optional[float] = None,
+                 max_concurrent: Optional[int] = None, classify: Optional[bool] = None):
+        self.classify = PROXY_CHECK_CONFIG['classify_anonymity'] if classify is None else classify
+        # 识别匿名度需要能回显请求头的检测URL
+        default_url = PROXY_CHECK_CONFIG['anonymity_url'] if self.classify else PROXY_CHECK_CONFIG['test_urls'][0]
+        self.test_url = test_url or default_url
+        self.timeout = timeout or PROXY_CHECK_CONFIG['timeout']
+        self.deadline = max(self.timeout, PROXY_CHECK_CONFIG['deadline'])
+        self.max_concurrent = max_concurrent or PROXY_CHECK_CONFIG['async_concurrency']
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.real_ip = ''
+
+    async def __aenter__(self):
+        # 每个代理都是不同的主机，连接无法复用，强制关闭避免占用文件描述符
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrent,
+            ttl_dns_cache=300,
+            force_close=True,
+            ssl=False,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.timeout),
+        )
+        if self.classify:
+            self.real_ip = await self._lookup_real_ip()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _lookup_real_ip(self) -> str:
+        """不经代理直接访问检测URL，取得判定服务看到的本机IP"""
+        try:
+            async with self.session.get(self.test_url) as response:
+                data = await response.json(content_type=None)
+            origin = data.get('origin', '')
+            return origin.split(',')[0].strip() if isinstance(origin, str) else ''
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError, AttributeError) as e:
+            logger.warning(f"获取本机IP失败，无法识别透明代理: {e}")
+            return ''
+
+    async def _fetch(self, proxy: str) -> Tuple[int, str]:
+        async with self.session.get(self.test_url, proxy=f"http://{proxy}") as response:
+            text = await response.text(errors='ignore')
+            return response.status, text
+
+    def evaluate(self, proxy: str, status: int, text: str, response_time: float) -> Dict:
+        """根据通过代理请求检测URL得到的响应判定代理（协议探测已取得响应时直接复用）"""
+        result = {'proxy': proxy, 'valid': False, 'response_time': round(response_time, 3),
+                  'anonymity': '', 'error': ''}
+        if status == 200 and match_origin(proxy.split(':')[0], text):
+            result['valid'] = True
+            if self.classify:
+                result['anonymity'] = classify_anonymity(text, self.real_ip)
+        else:
+            result['error'] = f'status_{status}'
+        return result
+
+    async def check(self, proxy: str) -> Dict:
+        """检测单个代理，超过总时限即判定失败"""
+        result = {'proxy': proxy, 'valid': False, 'response_time': 0.0, 'anonymity': '', 'error': ''}
+        start_time = time.monotonic()
+        try:
+            status, text = await asyncio.wait_for(self._fetch(proxy), timeout=self.deadline)
+            result = self.evaluate(proxy, status, text, time.monotonic() - start_time)
+        except asyncio.TimeoutError:
+            result['error'] = 'timeout'
+        except (aiohttp.ClientError, OSError) as e:
+            result['error'] = 'fd_pressure' if is_fd_pressure(e) else type(e).__name__
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    async def check_all(self, proxies: Iterable[str],
+                        progress: Optional[Callable[[int, int, int], None]] = None,
+                        controller: Optional[AIMDController] = None) -> List[Dict]:
+        """批量检测代理，结果顺序与输入一致；传入 controller 时按其自适应并发上限调度"""
+        proxies = list(proxies)
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        done_count = 0
+        valid_count = 0
+
+        async def worker(proxy):
+            nonlocal done_count, valid_count
+            if controller:
+                result = await self.check(proxy)
+                controller.record(result['response_time'], result['valid'],
+                                  timeout=result['error'] == 'timeout',
+                                  overload=result['error'] == 'fd_pressure')
+            else:
+                async with semaphore:
+                    result = await self.check(proxy)
+            done_count += 1
+            if result['valid']:
+                valid_count += 1
+            if progress:
+                progress(done_count, len(proxies), valid_count)
+            return result
+
+        if controller:
+            return await gather_adaptive(controller, proxies, worker)
+        return list(await asyncio.gather(*(worker(p) for p in proxies)))
+
+
+async def async_check_all(proxies: Iterable[str], max_concurrent: Optional[int] = None,
+                          progress: Optional[Callable[[int, int, int], None]] = None,
+                          adaptive: bool = False) -> List[Dict]:
+    """使用共享会话批量检测代理，返回详细结果；adaptive 为 True 时由AIMD控制器决定并发"""
+    controller = None
+    if adaptive:
+        controller = AIMDController(max_limit=max_concurrent)
+        max_concurrent = controller.max_limit
+    async with AsyncProxyChecker(max_concurrent=max_concurrent) as checker:
+        results = await checker.check_all(proxies, progress=progress, controller=controller)
+    if controller:
+        logger.info(f"自适应并发结束时的并发上限: {controller.limit}")
+    return results
+
+
+def evaluate_responses(responses: Dict[str, Dict]) -> List[Dict]:
+    """同步入口：用协议探测已取得的检测URL响应判定代理（{代理: {'status', 'text', 'response_time'}}）"""
+    async def evaluate():
+        async with AsyncProxyChecker(max_concurrent=1) as checker:
+            return [checker.evaluate(proxy, **response) for proxy, response in responses.items()]
+
+    return asyncio.run(evaluate())
+
+
+def _check_shard(proxies: List[str], max_concurrent: Optional[int], adaptive: bool) -> List[Dict]:
+    """子进程入口：在独立的事件循环中检测一个分片"""
+    return asyncio.run(async_check_all(proxies, max_concurrent=max_concurrent, adaptive=adaptive))
+
+
+def check_all_sharded(proxies: Iterable[str], processes: Optional[int] = None,
+                      max_concurrent: Optional[int] = None, adaptive: bool = False,
+                      progress: Optional[Callable[[int, int, int], None]] = None) -> List[Dict]:
+    """
+    多进程分片检测：每个进程运行自己的事件循环，结果按输入顺序合并
+    单进程在高并发下会被TLS和响应解析占满CPU，分片后验证吞吐随核数扩展
+    """
+    proxies = list(proxies)
+    processes = processes or os.cpu_count() or 1
+    # 分片太小时进程启动开销得不偿失
+    processes = min(processes, max(1, len(proxies) // PROXY_CHECK_CONFIG['min_shard_size']))
+    if processes <= 1:
+        return asyncio.run(async_check_all(proxies, max_concurrent=max_concurrent,
+                                           progress=progress, adaptive=adaptive))
+
+    # 交错分片，让各分片中新旧代理的比例接近，负载更均衡
+    shards = [list(range(i, len(proxies), processes)) for i in range(processes)]
+    results: List[Optional[Dict]] = [None] * len(proxies)
+    done_count = 0
+    valid_count = 0
+
+    logger.info(f"多进程分片检测: {len(proxies)} 个代理, {processes} 个进程")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(_check_shard, [proxies[i] for i in shard], max_concurrent, adaptive): shard
+            for shard in shards
+        }
+        for future in concurrent.futures.as_completed(futures):
+            shard = futures[future]
+            for index, result in zip(shard, future.result()):
+                results[index] = result
+                valid_count += result['valid']
+            done_count += len(shard)
+            if progress:
+                progress(done_count, len(proxies), valid_count)
+    return results
+
+
+def verify_all(proxies: Iterable[str], max_concurrent: Optional[int] = None,
+               progress: Optional[Callable[[int, int, int], None]] = None,
+               adaptive: bool = False, processes: Optional[int] = None) -> List[Dict]:
+    """
+    同步入口：批量异步检测，返回详细结果列表
+    processes 大于1时按进程分片检测，max_concurrent 为每个进程的并发数
+    """
+    if processes and processes > 1:
+        return check_all_sharded(proxies, processes=processes, max_concurrent=max_concurrent,
+                                 adaptive=adaptive, progress=progress)
+    return asyncio.run(async_check_all(proxies, max_concurrent=max_concurrent,
+                                       progress=progress, adaptive=adaptive))
+
+
+def check_proxies_async(proxies: Iterable[str], max_concurrent: Optional[int] = None,
+                        progress: Optional[Callable[[int, int, int], None]] = None,
+                        adaptive: bool = False, processes: Optional[int] = None) -> List[Tuple[str, bool]]:
+    """同步入口：批量异步检测，返回 (代理, 是否有效) 列表"""
+    results = verify_all(proxies, max_concurrent=max_concurrent, progress=progress,
+                         adaptive=adaptive, processes=processes)
+    return [(r['proxy'], r['valid']) for r in results]
+
+
+def check_proxy_async(proxy: str) -> bool:
+    """同步入口：异步检测单个代理"""
+    return check_proxies_async([proxy], max_concurrent=1)[0][1]
@@ -4,155 +4,215 @@
 """
 
 import asyncio
+import contextlib
+import json
 import time
-from typing import Optional, Dict, Any
+from functools import cached_property
+from typing import Optional, Any
 import aiohttp
 from fake_useragent import UserAgent
 import logging
 
+from config import REQUEST_CONFIG
+from page_cache import PageCache
+from rate_limit import HostLimiter
+from source_health import is_dns_error
+
 logger = logging.getLogger(__name__)
 
 ua = UserAgent()
 
 
+class AsyncResponse:
+    """
+    异步请求结果
+    text / json / tree 在首次访问时才解码、解析并缓存，只用正则或JSON解析的源不会构建HTML树；
+    兼容原来的字典用法（result['text']、result.get('tree')）
+    """
+
+    FIELDS = ('status_code', 'text', 'json', 'tree', 'content', 'url', 'error')
+
+    def __init__(self, status_code: int, content: bytes = b'', url: str = '', error: str = '', **extra):
+        self.status_code = status_code
+        self.content = content
+        # 页面字节数，release 后仍保留用于统计
+        self.size = len(content)
+        self.url = url
+        self.error = error
+        # 附加字段，如页面缓存命中时的 not_modified / parser / proxies
+        self.extra = extra
+
+    @cached_property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='ignore')
+
+    @cached_property
+    def json(self) -> Any:
+        if not self.content:
+            return {}
+        try:
+            return json.loads(self.content)
+        except (ValueError, UnicodeDecodeError):
+            return {}
+
+    @cached_property
+    def tree(self):
+        if not self.content:
+            return None
+        try:
+            from lxml import etree
+            return etree.HTML(self.content)
+        except Exception:
+            return None
+
+    def release(self):
+        """解析完成后释放页面内容和解析结果，降低批量请求时的峰值内存"""
+        self.content = b''
+        for name in ('text', 'json', 'tree'):
+            self.__dict__.pop(name, None)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.extra:
+            return self.extra[key]
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.extra or key in self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def create_session(max_concurrent: Optional[int] = None) -> aiohttp.ClientSession:
+    """
+    创建可长期复用的会话：同一站点的多个页面复用 keep-alive 连接和TLS会话，域名解析结果缓存；
+    每个站点的并发由 HostLimiter 控制，连接器不再单独限制
+    """
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrent or REQUEST_CONFIG['max_concurrent'],
+        limit_per_host=0,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_CONFIG['timeout']),
+        headers={'User-Agent': ua.random}
+    )
+
+
 class AsyncWebRequest:
     """异步HTTP请求类"""
 
-    def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
+    def __init__(self, cache: Optional[PageCache] = None, limiter: Optional[HostLimiter] = None,
+                 session: Optional[aiohttp.ClientSession] = None):
+        # 传入的会话由调用方管理生命周期，退出时不关闭
+        self.session = session
+        self._owns_session = session is None
+        # 传入页面缓存时使用条件请求，304 时复用缓存的页面
+        self.cache = cache
+        # 按站点限速，每次请求（包括重试）都需要先拿到令牌
+        self.limiter = limiter
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=10),
-            headers={'User-Agent': ua.random}
-        )
+        if self.session is None:
+            self.session = create_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
 
-    async def get(self, url: str, **kwargs) -> Dict[str, Any]:
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
         """异步GET请求"""
         if not self.session:
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=10),
-                headers={'User-Agent': ua.random}
-            ) as session:
+            async with create_session() as session:
                 return await self._request(session, url, **kwargs)
         else:
             return await self._request(self.session, url, **kwargs)
 
-    async def _request(self, session: aiohttp.ClientSession, url: str, **kwargs) -> Dict[str, Any]:
+    def _limit(self, url: str):
+        return self.limiter.limit(url) if self.limiter else contextlib.nullcontext()
+
+    async def _request(self, session: aiohttp.ClientSession, url: str, **kwargs) -> AsyncResponse:
         """执行HTTP请求"""
         retry_times = kwargs.pop('retry_times', 3)
         retry_interval = kwargs.pop('retry_interval', 2)
+        cached = self.cache.get(url) if self.cache else None
+        if cached:
+            kwargs['headers'] = {**PageCache.validators(cached), **kwargs.get('headers', {})}
 
         for attempt in range(retry_times):
             try:
-                async with session.get(url, **kwargs) as response:
+                async with self._limit(url), session.get(url, **kwargs) as response:
+                    if response.status == 304 and cached:
+                        # 页面未变化：由调用方决定复用缓存的解析结果还是重新解析缓存的页面
+                        self.cache.touch(url)
+                        return AsyncResponse(304, cached['body'], url, not_modified=True,
+                                             parser=cached['parser'], proxies=cached['proxies'])
+
                     content = await response.read()
-                    text = content.decode('utf-8', errors='ignore')
-
-                    # 尝试解析JSON
-                    json_data = {}
-                    try:
-                        json_data = await response.json()
-                    except:
-                        pass
-
-                    # 解析HTML
-                    tree = None
-                    try:
-                        from lxml import etree
-                        tree = etree.HTML(content)
-                    except:
-                        pass
-
-                    return {
-                        'status_code': response.status,
-                        'text': text,
-                        'json': json_data,
-                        'tree': tree,
-                        'content': content,
-                        'url': str(response.url),
-                    }
+                    if self.cache and response.status == 200:
+                        self.cache.store(url, response.headers.get('ETag'),
+                                         response.headers.get('Last-Modified'), content)
+                    return AsyncResponse(response.status, content, str(response.url))
 
             except Exception as e:
                 logger.warning(f"请求失败 (尝试 {attempt + 1}/{retry_times}): {url} - {str(e)}")
-                if attempt < retry_times - 1:
+                # 域名解析失败重试也无法恢复
+                if attempt < retry_times - 1 and not is_dns_error(e):
                     await asyncio.sleep(retry_interval)
                 else:
-                    return {
-                        'status_code': 0,
-                        'text': '',
-                        'json': {},
-                        'tree': None,
-                        'content': b'',
-                        'url': url,
-                        'error': str(e),
-                    }
-
-    async def post(self, url: str, **kwargs) -> Dict[str, Any]:
+                    return AsyncResponse(0, url=url, error=str(e))
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
         """异步POST请求"""
         if not self.session:
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=10),
-                headers={'User-Agent': ua.random}
-            ) as session:
+            async with create_session() as session:
                 return await self._post_request(session, url, **kwargs)
         else:
             return await self._post_request(self.session, url, **kwargs)
 
-    async def _post_request(self, session: aiohttp.ClientSession, url: str, **kwargs) -> Dict[str, Any]:
+    async def _post_request(self, session: aiohttp.ClientSession, url: str, **kwargs) -> AsyncResponse:
         """执行POST请求"""
         retry_times = kwargs.pop('retry_times', 3)
         retry_interval = kwargs.pop('retry_interval', 2)
 
         for attempt in range(retry_times):
             try:
-                async with session.post(url, **kwargs) as response:
+                async with self._limit(url), session.post(url, **kwargs) as response:
                     content = await response.read()
-                    text = content.decode('utf-8', errors='ignore')
-
-                    # 尝试解析JSON
-                    json_data = {}
-                    try:
-                        json_data = await response.json()
-                    except:
-                        pass
-
-                    return {
-                        'status_code': response.status,
-                        'text': text,
-                        'json': json_data,
-                        'content': content,
-                        'url': str(response.url),
-                    }
+                    return AsyncResponse(response.status, content, str(response.url))
 
             except Exception as e:
                 logger.warning(f"POST请求失败 (尝试 {attempt + 1}/{retry_times}): {url} - {str(e)}")
-                if attempt < retry_times - 1:
+                if attempt < retry_times - 1 and not is_dns_error(e):
                     await asyncio.sleep(retry_interval)
                 else:
-                    return {
-                        'status_code': 0,
-                        'text': '',
-                        'json': {},
-                        'content': b'',
-                        'url': url,
-                        'error': str(e),
-                    }
-
-
-async def batch_request(urls: list, max_concurrent: int = 10) -> list:
-    """批量异步请求"""
+                    return AsyncResponse(0, url=url, error=str(e))
+
+
+async def batch_request(urls: list, max_concurrent: int = 10, cache: Optional[PageCache] = None,
+                        limiter: Optional[HostLimiter] = None,
+                        session: Optional[aiohttp.ClientSession] = None) -> list:
+    """
+    批量异步请求（传入 cache 时使用条件请求）
+    limiter 为按站点限速器，多次调用共用同一个限速器时限速跨批次生效；未传入时为本批请求单独创建
+    session 为共享会话，多次调用共用时连接跨批次复用；未传入时本批请求共用一个临时会话
+    """
     semaphore = asyncio.Semaphore(max_concurrent)
+    limiter = limiter or HostLimiter()
 
-    async def fetch(url):
-        async with semaphore:
-            async with AsyncWebRequest() as requester:
+    async with AsyncWebRequest(cache=cache, limiter=limiter, session=session) as requester:
+        async def fetch(url):
+            async with semaphore:
                 return await requester.get(url)
 
-    tasks = [fetch(url) for url in urls]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+        tasks = [fetch(url) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=True)
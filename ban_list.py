@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+会过期的代理禁用列表
+免费代理时好时坏，禁用不再是永久的：第 n 次禁用时长为 ban_ttl * 2^(n-1)（上限 max_ban_ttl），
+到期后代理可以重新加入代理池；禁用结束后仍记住禁用次数 ban_memory 秒，期间再次被禁用时长继续翻倍，
+之后彻底遗忘，列表大小有上限。到期时间保存在小顶堆中（惰性删除），只处理到期的条目。
+
+可选的布隆过滤器层（ban_bloom）：被禁用次数达到 bloom_strikes 的代理遗忘时转入布隆过滤器永久禁用，
+每个代理只占约2字节，有极小概率误判
+"""
+
+import base64
+import hashlib
+import heapq
+import logging
+import math
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """布隆过滤器（只能添加，不能删除）"""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytes] = None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits else bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BanList:
+    """
+    代理禁用列表：key in ban_list 表示当前处于禁用期
+    条目为 {代理: [禁用截止时间, 禁用次数, 遗忘时间]}
+    """
+
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.ban_ttl = config.get('ban_ttl', 3600)
+        self.max_ban_ttl = config.get('max_ban_ttl', 7 * 24 * 3600)
+        self.ban_memory = config.get('ban_memory', 7 * 24 * 3600)
+        if self.ban_memory < 0:
+            raise ValueError(f"ban_memory 不能为负数: {self.ban_memory}")
+        self.bloom_strikes = config.get('bloom_strikes', 8)
+        self.bloom_capacity = config.get('bloom_capacity', 1000000)
+        self.bloom_error_rate = config.get('bloom_error_rate', 0.001)
+        self.bloom: Optional[BloomFilter] = None
+        if config.get('ban_bloom', False):
+            self.bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        self._entries: Dict[str, List[float]] = {}
+        # (时间, 代理)：时间为禁用截止或遗忘时间，与条目中的值不一致的是过期条目
+        self._heap: List[Tuple[float, str]] = []
+        self._active = 0
+
+    def __contains__(self, proxy_key: str) -> bool:
+        entry = self._entries.get(proxy_key)
+        if entry is not None and entry[0] > time.time():
+            return True
+        return self.bloom is not None and proxy_key in self.bloom
+
+    def __len__(self) -> int:
+        """当前处于禁用期的代理数（不含布隆过滤器层）"""
+        self.expire()
+        return self._active
+
+    def __iter__(self) -> Iterator[str]:
+        now = time.time()
+        return (key for key, entry in list(self._entries.items()) if entry[0] > now)
+
+    def ban(self, proxy_key: str, now: Optional[float] = None) -> float:
+        """禁用代理，返回本次禁用时长；仍记得的代理每次禁用时长翻倍"""
+        now = now or time.time()
+        self.expire(now)
+        entry = self._entries.get(proxy_key)
+        strikes = entry[1] + 1 if entry else 1
+        ttl = min(self.max_ban_ttl, self.ban_ttl * 2 ** (strikes - 1))
+        if entry is None or entry[0] <= now:
+            self._active += 1
+        until = now + ttl
+        self._entries[proxy_key] = [until, strikes, until + self.ban_memory]
+        heapq.heappush(self._heap, (until, proxy_key))
+        return ttl
+
+    add = ban
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """处理到期的条目，返回本次禁用到期（可重新加入）的代理"""
+        now = now or time.time()
+        released = []
+        while self._heap and self._heap[0][0] <= now:
+            moment, proxy_key = heapq.heappop(self._heap)
+            entry = self._entries.get(proxy_key)
+            if entry is None:
+                continue
+            if moment == entry[0]:
+                # 禁用到期：保留禁用次数直到遗忘时间（ban_memory 为0时立即遗忘）
+                self._active -= 1
+                released.append(proxy_key)
+                if entry[2] > moment:
+                    heapq.heappush(self._heap, (entry[2], proxy_key))
+                    continue
+            elif moment != entry[2]:
+                continue
+            del self._entries[proxy_key]
+            if self.bloom is not None and entry[1] >= self.bloom_strikes:
+                self.bloom.add(proxy_key)
+        # 过期条目太多时重建堆
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(entry[0] if entry[0] > now else entry[2], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+        return released
+
+    def to_dict(self) -> Dict:
+        """序列化（保存到 proxy_pool.json）"""
+        self.expire()
+        data = {'entries': self._entries}
+        if self.bloom is not None:
+            data['bloom'] = base64.b64encode(bytes(self.bloom.bits)).decode()
+            data['bloom_count'] = self.bloom.count
+        return data
+
+    def load(self, data: Optional[Dict] = None, legacy: Iterable[str] = ()):
+        """从 to_dict 的结果恢复；旧版本保存的永久禁用列表（legacy）按首次禁用处理"""
+        self._entries = {}
+        self._heap = []
+        self._active = 0
+        now = time.time()
+        for proxy_key, (until, strikes, forget) in (data or {}).get('entries', {}).items():
+            self._entries[proxy_key] = [until, int(strikes), forget]
+            if until > now:
+                self._active += 1
+            heapq.heappush(self._heap, (until if until > now else forget, proxy_key))
+        for proxy_key in legacy:
+            if proxy_key not in self._entries:
+                self.ban(proxy_key, now)
+        if self.bloom is not None and (data or {}).get('bloom'):
+            bits = base64.b64decode(data['bloom'])
+            if len(bits) == len(self.bloom.bits):
+                self.bloom.bits = bytearray(bits)
+                self.bloom.count = data.get('bloom_count', 0)
+            else:
+                logger.warning("布隆过滤器配置已变化，丢弃旧的永久禁用记录")
+        self.expire(now)
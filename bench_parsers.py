@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+代理源解析性能对比：xpath（构建DOM + 逐行xpath）与正则快速提取（parse_table）
+
+用法:
+    python bench_parsers.py                 # 使用 fixtures/<源名称>/*.html，没有时使用生成的样例页面
+    python bench_parsers.py --save          # 先抓取各表格源的当前页面保存为 fixtures
+    python bench_parsers.py --rounds 20 --sources kxdaili qiyun
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Dict, List
+
+from async_web import AsyncResponse
+from config import PROXY_SOURCES
+from optimized_fetcher import source_urls
+from source_parsers import parse_result
+
+FIXTURES_DIR = 'fixtures'
+
+# 各表格源的行模板（与站点页面结构一致），用于没有 fixtures 时生成样例页面
+ROW_TEMPLATES = {
+    'kxdaili': '<tr><td>{ip}</td><td>{port}</td><td>高匿</td><td>HTTP,HTTPS</td>'
+               '<td>中国 广东 </td><td>0.5 秒</td><td>1分钟前</td></tr>',
+    'kuaidaili': '<tr><td data-title="IP">{ip}</td><td data-title="PORT">{port}</td>'
+                 '<td data-title="匿名度">高匿名</td><td data-title="类型">HTTP</td>'
+                 '<td data-title="位置">中国 广东</td><td data-title="响应速度">2秒</td>'
+                 '<td data-title="最后验证时间">2024-01-01 00:00:00</td></tr>',
+    'ip3366': '<tr><td>{ip}</td><td>{port}</td><td>高匿代理IP</td><td>HTTP</td>'
+              '<td>广东省 电信</td><td>1秒</td><td>2024/1/1 0:00:00</td></tr>',
+    'qiyun': '<tr><td data-title="IP">{ip}</td><td data-title="PORT">{port}</td>'
+             '<td data-title="匿名度">高匿</td><td data-title="类型">HTTP</td>'
+             '<td data-title="位置">中国</td><td data-title="响应速度">1秒</td>'
+             '<td data-title="最后验证时间">2024-01-01</td></tr>',
+}
+TABLE_OPEN = {
+    'kxdaili': '<table class="active"><thead><tr><th>IP地址</th><th>端口</th></tr></thead><tbody>',
+    'kuaidaili': '<table class="table table-bordered table-striped"><thead><tr><th>IP</th><th>PORT</th></tr></thead><tbody>',
+    'ip3366': '<table class="table table-bordered table-striped"><thead><tr><th>IP</th><th>PORT</th></tr></thead><tbody>',
+    'qiyun': '<table class="table table-bordered table-striped"><thead><tr><th>IP</th><th>PORT</th></tr></thead><tbody>',
+}
+
+
+def sample_page(name: str, rows: int, rng: random.Random) -> bytes:
+    """生成一个与站点结构相同的样例页面（带导航、脚本等非表格内容）"""
+    body = ''.join(
+        ROW_TEMPLATES[name].format(ip='.'.join(str(rng.randint(1, 254)) for _ in range(4)),
+                                   port=rng.choice([80, 8080, 3128, 8888, 9999, 1080]))
+        for _ in range(rows)
+    )
+    filler = '<div class="nav"><ul>' + ''.join(f'<li><a href="/p/{i}">链接{i}</a></li>' for i in range(200)) + '</ul></div>'
+    script = '<script>var data = {};</script>' * 20
+    return (f'<html><head><meta charset="utf-8"><title>{name}</title>{script}</head><body>{filler}'
+            f'{TABLE_OPEN[name]}{body}</tbody></table>{filler}</body></html>').encode()
+
+
+def load_pages(name: str, pages: int, rows: int) -> List[bytes]:
+    """读取 fixtures/<源名称>/ 下保存的页面，没有时生成样例页面"""
+    directory = os.path.join(FIXTURES_DIR, name)
+    if os.path.isdir(directory):
+        files = sorted(f for f in os.listdir(directory) if f.endswith('.html'))
+        if files:
+            result = []
+            for filename in files:
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    result.append(f.read())
+            return result
+    rng = random.Random(name)
+    return [sample_page(name, rows, rng) for _ in range(pages)]
+
+
+def save_fixtures(names: List[str]):
+    """抓取各源当前的页面保存为 fixtures"""
+    from webRequest import WebRequest
+
+    for name in names:
+        directory = os.path.join(FIXTURES_DIR, name)
+        os.makedirs(directory, exist_ok=True)
+        for index, url in enumerate(source_urls(PROXY_SOURCES[name]), 1):
+            content = WebRequest().get(url).response.content
+            if content:
+                with open(os.path.join(directory, f'{index:02d}.html'), 'wb') as f:
+                    f.write(content)
+
+
+def bench(name: str, pages: List[bytes], rounds: int) -> Dict:
+    """分别用 xpath 和正则快速提取解析同一组页面"""
+    spec = dict(PROXY_SOURCES[name]['parser'], fast=False)
+    fast_spec = dict(spec, kind='table')
+
+    def run(parser_spec):
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            # 每轮都使用新的响应对象，计入DOM构建的开销
+            proxies = [parse_result(AsyncResponse(200, content), parser_spec) for content in pages]
+        return (time.perf_counter() - start_time) / rounds, proxies
+
+    xpath_time, xpath_proxies = run(spec)
+    fast_time, fast_proxies = run(fast_spec)
+    return {
+        'source': name,
+        'pages': len(pages),
+        'proxies': sum(len(p) for p in xpath_proxies),
+        'xpath_ms': xpath_time * 1000,
+        'fast_ms': fast_time * 1000,
+        'same': xpath_proxies == fast_proxies,
+    }
+
+
+def main():
+    """主函数"""
+    table_sources = [name for name, source in PROXY_SOURCES.items() if source['parser'].get('fast')]
+    parser = argparse.ArgumentParser(description='代理源解析性能对比')
+    parser.add_argument('--sources', nargs='*', default=table_sources)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=10, help='没有 fixtures 时每个源生成的页面数')
+    parser.add_argument('--rows', type=int, default=100, help='生成页面的表格行数')
+    parser.add_argument('--save', action='store_true', help='先抓取页面保存为 fixtures')
+    args = parser.parse_args()
+
+    if args.save:
+        save_fixtures(args.sources)
+
+    print(f"{'源':<12}{'页面':>6}{'代理':>8}{'xpath(ms)':>12}{'正则(ms)':>12}{'加速':>8}  结果一致")
+    for name in args.sources:
+        result = bench(name, load_pages(name, args.pages, args.rows), args.rounds)
+        speedup = result['xpath_ms'] / result['fast_ms'] if result['fast_ms'] else 0
+        print(f"{result['source']:<12}{result['pages']:>6}{result['proxies']:>8}"
+              f"{result['xpath_ms']:>12.2f}{result['fast_ms']:>12.2f}{speedup:>7.1f}x  {result['same']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,10 @@ requests.packages.urllib3.disable_warnings()
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 from fake_useragent import UserAgent
 
+from adaptive_concurrency import AIMDController, is_fd_pressure, map_adaptive
+from async_checker import check_proxy_async, check_proxies_async, tcp_prefilter
+from config import PROXY_CHECK_CONFIG, JUDGE_CONFIG
+
 ua = UserAgent()
 
 HEADER = {'User-Agent': ua.random,
@@ -22,13 +26,21 @@ HEADER = {'User-Agent': ua.random,
           'Connection': 'keep-alive',
           'Accept-Language': 'zh-CN,zh;q=0.8'}
 
-# 检测URL列表
-TEST_URLS = [
-    "http://icanhazip.com/",
-    "http://httpbin.org/ip",
-    "http://ipinfo.io/ip",
-    "http://httpbin.org/get",
-]
+# 检测URL列表（配置了自建判定服务时全部指向判定服务的对应接口）
+if JUDGE_CONFIG['url']:
+    TEST_URLS = [
+        JUDGE_CONFIG['url'] + "/text",
+        JUDGE_CONFIG['url'] + "/ip",
+        JUDGE_CONFIG['url'] + "/text",
+        JUDGE_CONFIG['url'] + "/get",
+    ]
+else:
+    TEST_URLS = [
+        "http://icanhazip.com/",
+        "http://httpbin.org/ip",
+        "http://ipinfo.io/ip",
+        "http://httpbin.org/get",
+    ]
 
 # 支持的代理类型
 SUPPORTED_PROXY_TYPES = ['http', 'https']
@@ -170,22 +182,56 @@ def get_proxy_info(proxy):
     return info
 
 
-def batch_check_proxies(proxies, check_method='basic', max_workers=10):
-    """批量检测代理"""
+def batch_check_proxies(proxies, check_method='basic', max_workers=10, prefilter=None, adaptive=False,
+                        processes=None):
+    """
+    批量检测代理
+    'async' 方法使用异步引擎，并发数取自配置，processes 大于1时按进程分片（仅对 'async' 生效）；
+    prefilter 为 True 时先做TCP预筛，端口不通的代理直接判定失败（默认取配置）；
+    adaptive 为 True 时忽略 max_workers，由AIMD控制器根据延迟和超时率自动调整并发
+    """
     import concurrent.futures
 
+    if prefilter is None:
+        prefilter = PROXY_CHECK_CONFIG['tcp_prefilter']
+
     results = []
+    proxies = list(proxies)
+    if prefilter:
+        reachable = set(tcp_prefilter(proxies))
+        results = [(proxy, False) for proxy in proxies if proxy not in reachable]
+        proxies = [proxy for proxy in proxies if proxy in reachable]
+
+    if check_method == 'async':
+        return results + check_proxies_async(proxies, adaptive=adaptive, processes=processes)
+
+    check_func = {
+        'basic': check_proxy_basic,
+        'multiple': check_proxy_multiple,
+        'fast': check_proxy_fast,
+        'strict': check_proxy_strict,
+    }.get(check_method, check_proxy_basic)
+
+    if adaptive:
+        controller = AIMDController()
+        timeout_threshold = PROXY_CHECK_CONFIG['timeout'] * 0.95
+
+        def timed_check(proxy):
+            start_time = time.time()
+            try:
+                is_valid = check_func(proxy)
+            except Exception as e:
+                controller.record(time.time() - start_time, False, overload=is_fd_pressure(e))
+                return False
+            elapsed = time.time() - start_time
+            controller.record(elapsed, is_valid, timeout=not is_valid and elapsed >= timeout_threshold)
+            return is_valid
+
+        outcomes = map_adaptive(controller, proxies, timed_check)
+        return results + [(proxy, outcome is True) for proxy, outcome in zip(proxies, outcomes)]
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        if check_method == 'basic':
-            futures = {executor.submit(check_proxy_basic, proxy): proxy for proxy in proxies}
-        elif check_method == 'multiple':
-            futures = {executor.submit(check_proxy_multiple, proxy): proxy for proxy in proxies}
-        elif check_method == 'fast':
-            futures = {executor.submit(check_proxy_fast, proxy): proxy for proxy in proxies}
-        elif check_method == 'strict':
-            futures = {executor.submit(check_proxy_strict, proxy): proxy for proxy in proxies}
-        else:
-            futures = {executor.submit(check_proxy_basic, proxy): proxy for proxy in proxies}
+        futures = {executor.submit(check_func, proxy): proxy for proxy in proxies}
 
         for future in concurrent.futures.as_completed(futures):
             proxy = futures[future]
@@ -198,18 +244,30 @@ def batch_check_proxies(proxies, check_method='basic', max_workers=10):
     return results
 
 
-def check_proxy(proxy, method='basic'):
-    """主检测函数"""
+def check_proxy(proxy, method='basic', cache=None):
+    """主检测函数，传入 cache（VerifyCache）时优先复用未过期的验证结果"""
+    if cache is not None:
+        cached = cache.get(proxy)
+        if cached is not None:
+            return cached['valid']
+
+    start_time = time.time()
     if method == 'basic':
-        return check_proxy_basic(proxy)
+        result = check_proxy_basic(proxy)
     elif method == 'multiple':
-        return check_proxy_multiple(proxy)
+        result = check_proxy_multiple(proxy)
     elif method == 'fast':
-        return check_proxy_fast(proxy)
+        result = check_proxy_fast(proxy)
     elif method == 'strict':
-        return check_proxy_strict(proxy)
+        result = check_proxy_strict(proxy)
+    elif method == 'async':
+        result = check_proxy_async(proxy)
     else:
-        return check_proxy_basic(proxy)
+        result = check_proxy_basic(proxy)
+
+    if cache is not None:
+        cache.put(proxy, result, round(time.time() - start_time, 3) if result else 0.0)
+    return result
 
 
 if __name__ == '__main__':
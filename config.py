@@ -3,6 +3,8 @@
 配置文件
 """
 
+import os
+
 # 代理验证配置
 PROXY_CHECK_CONFIG = {
     'timeout': 5,  # 验证超时时间（秒）
@@ -13,15 +15,104 @@ PROXY_CHECK_CONFIG = {
         'http://ipinfo.io/ip'
     ],
     'min_success_rate': 0.5,  # 最小成功率阈值
+    'async_concurrency': 200,  # 异步验证并发数
+    'deadline': 8,  # 单个代理验证总时限（秒），包含连接和读取
+    'tcp_prefilter': True,  # HTTP检测前先做TCP连通性预筛
+    'connect_timeout': 1.5,  # TCP预筛连接超时（秒）
+    'prefilter_concurrency': 1000,  # TCP预筛并发数
+    'processes': int(os.getenv('VERIFY_PROCESSES', '1')),  # 验证进程数，大于1时按进程分片验证
+    'min_shard_size': 500,  # 每个进程分片的最少代理数
+    'pipeline_queue_size': 1000,  # 抓取-验证流水线的队列长度，队列满时抓取端等待验证（背压）
+    'classify_anonymity': True,  # 异步验证时根据判定服务回显的请求头识别匿名度
+    'anonymity_url': 'http://httpbin.org/get',  # 回显请求头的检测URL（需返回 origin 和 headers）
+}
+
+# 验证结果缓存配置（verify_cache.py）
+VERIFY_CACHE_CONFIG = {
+    'enabled': os.getenv('VERIFY_CACHE', 'true').lower() != 'false',  # 是否复用未过期的验证结果
+    'file': 'verify_cache.db',  # SQLite 缓存文件
+    'ttl': int(os.getenv('VERIFY_CACHE_TTL', '1800')),  # 验证结果有效期（秒）
+}
+
+# 代理源页面缓存配置（page_cache.py）
+PAGE_CACHE_CONFIG = {
+    'enabled': os.getenv('PAGE_CACHE', 'true').lower() != 'false',  # 是否使用条件请求（ETag / Last-Modified）
+    'file': 'page_cache.db',  # SQLite 缓存文件
+    'max_age': 7 * 24 * 3600,  # 超过该时间未更新的页面记录会被清理（秒）
+}
+
+# 代理源熔断配置（source_health.py）
+SOURCE_BREAKER_CONFIG = {
+    'enabled': True,  # 是否跳过连续失败的代理源
+    'file': 'source_health.json',  # 各源健康状态文件，跨运行保存
+    'failure_threshold': 3,  # 连续失败多少次后熔断
+    'base_backoff': 3600,  # 首次熔断后多久试探一次（秒）
+    'max_backoff': 7 * 24 * 3600,  # 试探间隔上限（秒），每次试探失败翻倍
+}
+
+# 代理源产出统计配置（source_stats.py）
+SOURCE_STATS_CONFIG = {
+    'enabled': os.getenv('SOURCE_STATS', 'true').lower() != 'false',  # 是否保存每次运行的各源统计
+    'file': 'source_stats.jsonl',  # 历史记录文件，每次运行一行
+    'max_runs': 1000,  # 最多保留的运行次数
 }
 
+# 代理协议探测配置（protocol_probe.py）
+PROTOCOL_PROBE_CONFIG = {
+    'enabled': True,  # 验证时是否探测代理实际支持的协议
+    'timeout': 3,  # 单次探测超时（秒）
+    'max_concurrent': 300,  # 同时探测的代理数（每个代理占用3条连接）
+    # CONNECT / SOCKS 探测的目标，留空时使用判定服务地址（未配置判定服务时为 httpbin.org:443）
+    'connect_target': os.getenv('PROXY_CONNECT_TARGET', ''),
+}
+
+# 代理判定服务配置（judge_server.py）
+JUDGE_CONFIG = {
+    'url': os.getenv('PROXY_JUDGE_URL', '').rstrip('/'),  # 判定服务地址，设置后所有验证器都使用它
+    'host': '0.0.0.0',  # 判定服务监听地址
+    'port': 8899,  # 判定服务监听端口
+}
+
+if JUDGE_CONFIG['url']:
+    PROXY_CHECK_CONFIG['test_urls'] = [JUDGE_CONFIG['url'] + '/ip']
+    PROXY_CHECK_CONFIG['anonymity_url'] = JUDGE_CONFIG['url'] + '/get'
+
 # 代理池配置
 PROXY_POOL_CONFIG = {
     'max_size': 1000,  # 最大代理数量
     'min_score': 0.3,  # 最小评分阈值
-    'health_check_interval': 300,  # 健康检查间隔（秒）
-    'score_decay': 0.95,  # 评分衰减因子
+    'health_check_interval': 300,  # 健康检查基础间隔（秒），不稳定代理更短，长期稳定代理更长
+    'max_check_interval': 3600,  # 长期稳定代理的最大复检间隔（秒）
+    'score_half_life': 6 * 3600,  # 评分随时间衰减的半衰期（秒），读取时按距上次检测的时间计算
+    'initial_score': 0.5,  # 未检测过的新代理的先验评分（实测可用的代理评分不低于 1 - latency_weight）
+    'ewma_alpha': 0.3,  # 成功率和响应时间指数加权移动平均的新样本权重
+    'latency_ref': 2.0,  # 延迟参考值（秒），响应时间等于该值时评分降低 latency_weight 的一半
+    'latency_weight': 0.5,  # 延迟对评分的最大影响
     'ban_threshold': 3,  # 连续失败次数阈值
+    'ban_ttl': 3600,  # 首次禁用时长（秒），再次禁用时翻倍
+    'max_ban_ttl': 7 * 24 * 3600,  # 最长禁用时长（秒）
+    'ban_memory': 7 * 24 * 3600,  # 禁用到期后记住禁用次数的时间（秒），之后从禁用列表中删除
+    'ban_bloom': False,  # 是否把屡次被禁用的代理转入布隆过滤器永久禁用
+    'bloom_strikes': 8,  # 转入布隆过滤器的禁用次数
+    'bloom_capacity': 1000000,  # 布隆过滤器容量
+    'bloom_error_rate': 0.001,  # 布隆过滤器误判率
+    'check_timeout': 5,  # 健康检查单代理超时（秒）
+    'connection_limit': 500,  # 健康检查共享连接器的最大连接数（也是自适应并发的上限）
+    'adaptive_concurrency': True,  # 批量健康检查是否启用自适应并发
+    'dns_cache_ttl': 300,  # 共享连接器DNS缓存时间（秒）
+    'store': os.getenv('PROXY_POOL_STORE', 'dict'),  # 代理存储：'dict' 为对象字典，'array' 为紧凑列式存储（百万级代理）
+}
+
+# 自适应并发配置（AIMD）
+ADAPTIVE_CONCURRENCY_CONFIG = {
+    'initial': 20,  # 初始并发数
+    'min': 5,  # 最小并发数
+    'max': 2000,  # 最大并发数（还会受文件描述符上限约束）
+    'max_threads': 200,  # 线程池模式下的最大线程数
+    'increase': 2,  # 每个健康窗口增加的并发数
+    'decrease': 0.7,  # 回退时的乘性因子
+    'timeout_tolerance': 0.15,  # 超时率超出基线多少视为过载
+    'latency_tolerance': 2.0,  # 平均延迟超过基线多少倍视为过载
 }
 
 # 请求配置
@@ -30,7 +121,14 @@ REQUEST_CONFIG = {
     'retry_times': 3,  # 重试次数
     'retry_interval': 2,  # 重试间隔（秒）
     'max_concurrent': 50,  # 最大并发数
-    'rate_limit': 10,  # 每秒请求数限制
+    'rate_limit': 10,  # 每个站点每秒请求数限制
+    'host_concurrent': 5,  # 每个站点同时进行的请求数
+    # 单独限速的站点：{域名: {'rate_limit': 每秒请求数, 'max_concurrent': 同时请求数}}
+    'host_limits': {
+        'www.kuaidaili.com': {'rate_limit': 1, 'max_concurrent': 1},  # 请求过快会返回空页面
+    },
+    'page_window': 3,  # 自动翻页时每批并发请求的页数
+    'max_pages': 20,  # 自动翻页的页数上限
 }
 
 # 日志配置
@@ -49,55 +147,204 @@ GITHUB_CONFIG = {
 }
 
 # 代理源网站配置（修复失效网站）
+# 每个源由 optimized_fetcher.OptimizedProxyFetcher 并发抓取，新增源只需在这里添加一项：
+#   urls/url        抓取地址；含 {} 的地址为页模板，按 pages 展开为第 1..pages 页
+#   paginate        True 时自动翻页：页模板从第1页起每批并发请求 page_window 页，
+#                   某页没有新的 ip:port（空页或重复页）即停止，最多 max_pages 页（默认见 REQUEST_CONFIG），忽略 pages
+#   parser          解析方式，kind 取值见 source_parsers.PARSERS：
+#                   xpath(rows/ip/port/skip，fast=True 时先用正则快速提取相邻的IP、端口单元格)
+#                   | table | regex(pattern) | json(items/ip/port) | text | base64(pattern)
+#                   | legacy(function，调用 proxyFetcher 中的同步生成器，用于需要会话或特殊解码的源)
+#   max_concurrent  该源同时请求的页面数（默认5）
+#   enabled         False 的源不抓取；失效的源由熔断器（source_health.py）自动跳过并定期试探，无需手动关闭
+_TABLE_ROWS = "//table[@class='table table-bordered table-striped']//tr"
+_IP_PORT_CELLS = r'<td>(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})</td>[\s\S]*?<td>(\d+)</td>'
+
 PROXY_SOURCES = {
-    'kuaidaili': {
+    'mimvp': {
+        'name': '米扑代理',
         'urls': [
-            'https://www.kuaidaili.com/free/inha/{}/',
-            'https://www.kuaidaili.com/free/intr/{}/'
+            'https://proxy.mimvcom/freeopen?proxy=in_hp',
+            'https://proxy.mimvcom/freeopen?proxy=out_hp',
+            'https://proxy.mimvcom/freeopen?proxy=in_socks',
+            'https://proxy.mimvcom/freeopen?proxy=out_socks',
+            'https://proxy.mimvcom/freesecret',
+            'https://proxy.mimvcom/freesole',
+            'https://proxy.mimvcom/freeopen'
         ],
-        'pages': 5,
+        # 端口以图片形式给出，需要专门的解码表
+        'parser': {'kind': 'legacy', 'function': 'proxyFetcher.freeProxy01'},
+        'enabled': True,
+    },
+    'ip66': {
+        'name': '代理66',
+        'urls': [
+            'http://www.66icn/mo.php',
+            'http://www.66icn/nmtq.php?getnum=300&isp=0&anonymoustype=4&start=&ports=&export=&ipaddress=&area=0&proxytype=2&api=66ip',
+            'http://www.66icn/nmtq.php?getnum=300&isp=0&anonymoustype=3&start=&ports=&export=&ipaddress=&area=0&proxytype=2&api=66ip'
+        ],
+        'parser': {'kind': 'regex', 'pattern': r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:\d{1,5})'},
         'enabled': True,
     },
     'kxdaili': {
+        'name': '开心代理',
         'urls': [
-            'http://www.kxdaili.com/dailiip.html',
-            'http://www.kxdaili.com/dailiip/1/2.html',
-            'http://www.kxdaili.com/dailiip/1/3.html',
-            'http://www.kxdaili.com/dailiip/1/4.html',
+            'http://www.kxdaili.com/dailiip/1/{}.html',
+            'http://www.kxdaili.com/dailiip/2/{}.html'
         ],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': "//table[@class='active']//tr", 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()', 'fast': True},
         'enabled': True,
     },
-    'ip3366': {
+    'dieniao': {
+        'name': '蝶鸟IP',
+        'urls': [
+            'https://www.dieniao.com/FreeProxy.html',
+            'https://www.dieniao.com/FreeProxy/2.html',
+            'https://www.dieniao.com/FreeProxy/3.html',
+            'https://www.dieniao.com/FreeProxy/4.html'
+        ],
+        'parser': {'kind': 'xpath', 'rows': "//div[@class='free-main col-lg-12 col-md-12 col-sm-12 col-xs-12']/ul/li",
+                   'skip': 1, 'ip': './span[1]/text()', 'port': './span[2]/text()'},
+        'enabled': True,
+    },
+    'kuaidaili': {
+        'name': '快代理',
         'urls': [
-            'http://www.ip3366.net/free/?stype=1',
-            'http://www.ip3366.net/free/?stype=1&page=2',
-            'http://www.ip3366.net/free/?stype=1&page=3',
+            'https://www.kuaidaili.com/free/inha/{}/',
+            'https://www.kuaidaili.com/free/intr/{}/'
         ],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': './/table//tr', 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()', 'fast': True},
         'enabled': True,
     },
     'proxy11': {
+        'name': 'PROXY11',
         'url': 'https://proxy11.com/api/demoweb/proxy.json',
+        'parser': {'kind': 'json', 'items': 'data', 'ip': 'ip', 'port': 'port'},
+        'enabled': True,
+    },
+    'ip3366': {
+        'name': '云代理',
+        'urls': [
+            'http://www.ip3366.net/free/?stype=1&page={}',
+            'http://www.ip3366.net/free/?stype=2&page={}'
+        ],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': _TABLE_ROWS, 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()', 'fast': True},
+        'enabled': True,
+    },
+    'ihuan': {
+        'name': '小幻代理',
+        'urls': ['https://iihuan.me/address/5Lit5Zu9.html'],
+        'parser': {'kind': 'regex',
+                   'pattern': r'>\s*?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s*?</a></td><td>(\d+)</td>'},
+        'enabled': True,
+    },
+    'jiangxianli': {
+        'name': '高可用全球免费代理ip库',
+        'urls': ['http://ijiangxianli.com/?country=中国&page={}'],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': '//table//tr', 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()'},
+        'enabled': True,
+    },
+    'ip89': {
+        'name': '89免费代理',
+        'urls': ['https://www.89icn/index_{}.html'],
+        'paginate': True,
+        'parser': {'kind': 'regex',
+                   'pattern': r'<td.*?>[\s\S]*?(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})[\s\S]*?</td>'
+                              r'[\s\S]*?<td.*?>[\s\S]*?(\d+)[\s\S]*?</td>'},
         'enabled': True,
     },
     'proxy_list': {
-        'urls': ['https://proxy-list.org/english/index.php?p=%s' % n for n in range(1, 5)],
+        'name': 'proxy-list.org',
+        'urls': ['https://proxy-list.org/english/index.php?p={}'],
+        'paginate': True,
+        'parser': {'kind': 'base64', 'pattern': r"Proxy\('(.*?)'\)"},
         'enabled': True,
     },
     'proxylistplus': {
-        'urls': ['https://list.proxylistplus.com/Fresh-HTTP-Proxy-List-%s' % n for n in range(1, 4)],
+        'name': 'proxylist+',
+        'urls': ['https://list.proxylistplus.com/Fresh-HTTP-Proxy-List-{}'],
+        'paginate': True,
+        'parser': {'kind': 'regex', 'pattern': _IP_PORT_CELLS},
+        'max_concurrent': 3,
         'enabled': True,
     },
-    'dieniao': {
+    'pzzqz': {
+        'name': 'PzzQz',
+        'url': 'https://pzzqz.com/',
+        # 需要先取 CSRF Token 再 POST 查询
+        'parser': {'kind': 'legacy', 'function': 'proxyFetcher.freeProxy13'},
+        'enabled': True,
+    },
+    'cn_proxy': {
+        'name': 'cn-proxy',
         'urls': [
-            'https://www.dieniao.com/FreeProxy.html',
-            'https://www.dieniao.com/FreeProxy/2.html',
+            'http://cn-proxy.com/',
+            'http://cn-proxy.com/archives/218'
         ],
+        'parser': {'kind': 'regex', 'pattern': r'<td>(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})</td>[\w\W]<td>(\d+)</td>'},
         'enabled': True,
     },
     'qiyun': {
+        'name': '齐云代理',
+        'urls': ['https://proxy.ip3366.net/free/?action=china&page={}'],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': _TABLE_ROWS, 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()', 'fast': True},
+        'enabled': True,
+    },
+    'proxyscrape': {
+        'name': 'ProxyScrape',
+        'urls': [
+            'https://api.proxyscrape.com/v2/',
+            'https://api.proxyscrape.com/v2/?request=get&protocol=http&timeout=5000&country=all&ssl=all&anonymity=all',
+        ],
+        'parser': {'kind': 'text'},
+        'enabled': True,
+    },
+    'proxynova': {
+        'name': 'ProxyNova',
+        'urls': ['http://www.proxynova.com/proxy-list.aspx?page={}'],
+        'paginate': True,
+        'parser': {'kind': 'xpath', 'rows': "//table[@class='cells']//tr", 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()'},
+        'enabled': True,
+    },
+    'hidemy': {
+        'name': 'HideMy.name',
+        'urls': [
+            'https://hidemy.name/en/proxy-list/',
+            'https://hidemy.name/en/proxy-list/?type=h',
+            'https://hidemy.name/en/proxy-list/?start=0#list',
+        ],
+        'parser': {'kind': 'xpath', 'rows': "//table[@class='proxy__t']//tr", 'skip': 1,
+                   'ip': './td[1]/text()', 'port': './td[2]/text()'},
+        'enabled': True,
+    },
+    'spys': {
+        'name': 'Spys.me',
+        'urls': [
+            'http://spys.me/proxy.txt',
+            'http://spys.me/socks.txt',
+        ],
+        'parser': {'kind': 'text'},
+        'enabled': True,
+    },
+    'proxy_list_download': {
+        'name': 'Proxy-list.download',
         'urls': [
-            'https://proxy.ip3366.net/free/?action=china&page=%s' % n for n in range(1, 6)
+            'https://www.proxy-list.download/api/v1/get?type=http',
+            'https://www.proxy-list.download/api/v1/get?type=socks4',
+            'https://www.proxy-list.download/api/v1/get?type=socks5',
         ],
+        'parser': {'kind': 'text'},
         'enabled': True,
     },
 }
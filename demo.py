@@ -21,6 +21,7 @@ async def demo_basic_usage():
     # 获取并验证代理
     print("\n1. 正在获取代理...")
     exported_count = await manager.fetch_and_validate()
+    await manager.pool.close()
     print(f"   ✓ 获取到 {exported_count} 个有效代理")
 
     # 查看统计信息
@@ -37,7 +38,7 @@ async def demo_basic_usage():
     best_proxies = manager.pool.get_best_proxies(5)
     for i, proxy in enumerate(best_proxies, 1):
         print(f"   {i}. {proxy.ip}:{proxy.port} "
-              f"[评分: {proxy.score:.2f}, 成功率: {proxy.success_rate:.2%}]")
+              f"[评分: {manager.pool.current_score(proxy):.2f}, 成功率: {proxy.success_rate:.2%}]")
 
 
 async def demo_proxy_selection():
@@ -59,7 +60,7 @@ async def demo_proxy_selection():
         # 获取评分最高的代理
         best_proxy = pool.get_best_proxies(1)[0] if pool.get_best_proxies(1) else None
         if best_proxy:
-            print(f"最佳代理: {best_proxy.proxy_url} (评分: {best_proxy.score:.2f})")
+            print(f"最佳代理: {best_proxy.proxy_url} (评分: {pool.current_score(best_proxy):.2f})")
 
         # 导出代理列表
         count = pool.export_to_text('demo_proxies.txt')
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+代理判定服务 (judge)
+回显调用方IP和请求头，供代理验证使用，替代 httpbin.org / icanhazip.com 等第三方服务
+
+用法:
+    python judge_server.py [--host 0.0.0.0] [--port 8899]
+
+部署后设置环境变量 PROXY_JUDGE_URL=http://<host>:<port> 即可让所有验证器使用该服务。
+注意：代理需要能访问到判定服务，线上验证请部署在公网主机上；
+本机部署适合配合本地代理做离线压测。
+"""
+
+import argparse
+import logging
+
+from aiohttp import web
+
+from config import JUDGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _echo_data(request: web.Request) -> dict:
+    return {
+        'origin': request.remote or '',
+        'method': request.method,
+        'url': str(request.url),
+        'headers': dict(request.headers),
+    }
+
+
+async def handle_ip(request: web.Request) -> web.Response:
+    """JSON格式返回调用方IP（兼容 httpbin.org/ip）"""
+    return web.json_response({'origin': request.remote or ''})
+
+
+async def handle_text(request: web.Request) -> web.Response:
+    """纯文本返回调用方IP（兼容 icanhazip.com）"""
+    return web.Response(text=f"{request.remote or ''}\n")
+
+
+async def handle_get(request: web.Request) -> web.Response:
+    """返回调用方IP和完整请求头（兼容 httpbin.org/get）"""
+    return web.json_response(_echo_data(request))
+
+
+def create_app() -> web.Application:
+    """创建判定服务应用"""
+    app = web.Application()
+    app.router.add_get('/', handle_get)
+    app.router.add_get('/ip', handle_ip)
+    app.router.add_get('/text', handle_text)
+    app.router.add_get('/get', handle_get)
+    app.router.add_get('/headers', handle_get)
+    return app
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='代理判定服务')
+    parser.add_argument('--host', default=JUDGE_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=JUDGE_CONFIG['port'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"判定服务启动: http://{args.host}:{args.port}")
+    # 关闭访问日志，避免高并发验证时日志成为瓶颈
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
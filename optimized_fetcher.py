@@ -1,326 +1,296 @@
 # -*- coding: utf-8 -*-
 """
 优化的代理获取器 - 使用异步IO和现代技术
+所有代理源由 config.PROXY_SOURCES 声明，解析方式见 source_parsers，
+各源并发抓取，一次完整抓取的耗时取决于最慢的源而不是所有源之和
 """
 
 import asyncio
-import re
+import importlib
 import logging
-from typing import List, Generator
-from urllib.parse import urljoin, urlparse
-from config import PROXY_SOURCES, REQUEST_CONFIG
-from async_web import AsyncWebRequest, batch_request
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from config import PROXY_SOURCES, REQUEST_CONFIG, SOURCE_BREAKER_CONFIG
+from async_web import AsyncResponse, batch_request, create_session
+from page_cache import PageCache, default_page_cache, parser_key
+from rate_limit import HostLimiter
 from proxy_pool import Proxy
+from source_health import HALF_OPEN, SourceHealth
+from source_stats import SourceStats
+from source_parsers import normalize_proxy, parse_result
 
 logger = logging.getLogger(__name__)
 
 
-class OptimizedProxyFetcher:
-    """优化的代理获取器"""
+def source_urls(source: Dict) -> List[str]:
+    """展开源的抓取地址：含 {} 的地址按 pages 生成第 1..pages 页"""
+    urls = source.get('urls') or [source['url']]
+    pages = source.get('pages', 1)
+    expanded = []
+    for page in range(1, pages + 1):
+        for url in urls:
+            if '{}' in url:
+                expanded.append(url.format(page))
+            elif page == 1:
+                expanded.append(url)
+    return expanded
 
-    def __init__(self):
-        self.sources = PROXY_SOURCES
 
-    async def fetch_from_kuaidaili(self) -> List[Proxy]:
-        """从快代理获取代理"""
-        source = self.sources['kuaidaili']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
+def _reachable(results: List) -> bool:
+    """是否至少有一个页面正常响应（2xx/3xx，包括 304）"""
+    return any(isinstance(r, AsyncResponse) and 200 <= r.status_code < 400 for r in results)
 
-        urls = []
-        for page in range(1, source['pages'] + 1):
-            for url_template in source['urls']:
-                urls.append(url_template.format(page))
 
-        logger.info(f"正在从快代理获取代理，共 {len(urls)} 个URL")
+class OptimizedProxyFetcher:
+    """优化的代理获取器"""
 
+    def __init__(self, sources: Optional[Dict[str, Dict]] = None, page_cache: Optional[PageCache] = None):
+        self.sources = sources if sources is not None else PROXY_SOURCES
+        # 页面缓存：未变化的页面只发一个条件请求，并直接复用上次的解析结果
+        self.page_cache = page_cache if page_cache is not None else default_page_cache()
+        # 按站点限速器和共享会话，一次抓取期间所有源共用（见 _session_scope）
+        self.limiter: Optional[HostLimiter] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        # 熔断器：连续失败的源暂时跳过，到期后试探恢复
+        self.health = SourceHealth() if SOURCE_BREAKER_CONFIG['enabled'] else None
+        # 最近一次 stream_sources/fetch_sources 中各源的抓取统计，验证后由调用方补充新增和有效数并保存
+        self.stats = SourceStats()
+
+    async def _run_legacy(self, spec: Dict) -> List[str]:
+        """在线程池中运行旧的同步生成器（需要会话、POST 或特殊解码的源）"""
+        module_name, func_name = spec['function'].rsplit('.', 1)
+        func = getattr(importlib.import_module(module_name), func_name)
+        loop = asyncio.get_running_loop()
+        raw = await loop.run_in_executor(None, lambda: list(func()))
+        return [proxy for proxy in map(normalize_proxy, raw) if proxy]
+
+    async def fetch_source(self, name: str) -> List[str]:
+        """抓取并解析一个源，返回去重后的 ip:port 列表（失败或熔断时返回空列表）"""
+        source = self.sources[name]
+        spec = source['parser']
+        display_name = source.get('name', name)
+        start_time = time.monotonic()
+
+        if self.health and not self.health.allow(name):
+            logger.info(f"{display_name}处于熔断状态，跳过")
+            self.stats.record_fetch(name, skipped=True)
+            return []
+
+        pages = not_modified = size = 0
+        parse_time = 0.0
         try:
-            results = await batch_request(urls, max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('tree') is not None:
-                    tree = result['tree']
-                    for tr in tree.xpath('.//table//tr')[1:]:
-                        try:
-                            cols = tr.xpath('./td/text()')
-                            if len(cols) >= 2:
-                                ip = cols[0].strip()
-                                port = cols[1].strip()
-                                if ip and port:
-                                    proxy = Proxy(ip=ip, port=int(port))
-                                    proxies.append(proxy)
-                        except:
-                            continue
-
+            if spec['kind'] == 'legacy':
+                proxies = await self._run_legacy(spec)
+                # 旧式生成器吞掉了网络错误，只能以是否取到代理判断源是否可用
+                ok, error = bool(proxies), 'no proxies'
+            else:
+                # 半开状态先只请求第一页试探，可达后再抓取其余页面
+                probe = bool(self.health) and self.health.state(name) == HALF_OPEN
+                if source.get('paginate'):
+                    logger.info(f"正在从{display_name}获取代理，自动翻页")
+                    proxies, results, parse_time = await self._fetch_paginated(source, spec, probe)
+                else:
+                    urls = source_urls(source)
+                    logger.info(f"正在从{display_name}获取代理，共 {len(urls)} 个URL")
+                    if probe:
+                        results = await self._request_pages(source, urls[:1])
+                        if _reachable(results):
+                            results += await self._request_pages(source, urls[1:])
+                    else:
+                        results = await self._request_pages(source, urls)
+                    parse_start = time.perf_counter()
+                    proxies = self._parse_pages(urls, results, spec)
+                    parse_time = time.perf_counter() - parse_start
+                ok = _reachable(results)
+                error = '' if ok else next((r.error for r in results if isinstance(r, AsyncResponse) and r.error),
+                                           'no successful response')
+                responses = [r for r in results if isinstance(r, AsyncResponse) and 200 <= r.status_code < 400]
+                pages = len(responses)
+                not_modified = sum(1 for r in responses if r.get('not_modified'))
+                # 304 页面的内容来自缓存，不计入传输字节数
+                size = sum(r.size for r in responses if not r.get('not_modified'))
         except Exception as e:
-            logger.error(f"快代理获取失败: {str(e)}")
-
-        logger.info(f"快代理获取到 {len(proxies)} 个代理")
+            logger.error(f"{display_name}获取失败: {str(e)}")
+            proxies, ok, error = [], False, str(e)
+
+        if self.health:
+            self.health.record(name, ok, error)
+            self.health.save()
+
+        raw_count = len(proxies)
+        proxies = list(dict.fromkeys(proxies))
+        elapsed = time.monotonic() - start_time
+        self.stats.record_fetch(name, ok=ok, pages=pages, not_modified=not_modified, bytes=size,
+                                fetch_time=round(elapsed, 3), parse_time=round(parse_time, 4),
+                                raw=raw_count, unique=len(proxies))
+        logger.info(f"{display_name}获取到 {len(proxies)} 个代理，{pages} 个页面，耗时 {elapsed:.2f}s")
         return proxies
 
-    async def fetch_from_kxdaili(self) -> List[Proxy]:
-        """从开心代理获取代理"""
-        source = self.sources['kxdaili']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从开心代理获取代理")
-
+    async def _fetch_paginated(self, source: Dict, spec: Dict, probe: bool = False) -> Tuple[List[str], List, float]:
+        """
+        自动翻页：每个页模板从第1页起每批并发请求 page_window 页，按页码顺序解析，
+        某页没有新的 ip:port（空页、错误页或重复页）即停止该模板；不含 {} 的地址只请求一次
+        probe 为 True 时先只请求第一页，不可达则不再继续
+        返回 (代理列表, 所有请求结果, 解析耗时)
+        """
+        window = source.get('page_window', REQUEST_CONFIG['page_window'])
+        max_pages = source.get('max_pages', REQUEST_CONFIG['max_pages'])
+        seen = set()
+        proxies: List[str] = []
+        results: List = []
+        parse_time = 0.0
+
+        for template in source.get('urls') or [source['url']]:
+            page = 1
+            last_page = max_pages if '{}' in template else 1
+            while page <= last_page:
+                size = 1 if probe and not results else window
+                urls = [template.format(n) for n in range(page, min(page + size, last_page + 1))]
+                batch = await self._request_pages(source, urls)
+                results += batch
+                if probe and not _reachable(results):
+                    return proxies, results, parse_time
+
+                parse_start = time.perf_counter()
+                exhausted = False
+                for url, result in zip(urls, batch):
+                    page_proxies = self._parse_pages([url], [result], spec)
+                    fresh = [proxy for proxy in page_proxies if proxy not in seen]
+                    if not fresh:
+                        exhausted = True
+                        break
+                    seen.update(fresh)
+                    proxies += page_proxies
+                parse_time += time.perf_counter() - parse_start
+                if exhausted:
+                    logger.debug(f"{source.get('name')} {url} 没有新代理，停止翻页")
+                    break
+                page += len(urls)
+        return proxies, results, parse_time
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        """一次抓取期间共用一个限速器和一个会话（连接池、keep-alive、DNS缓存），已在作用域内时直接复用"""
+        if self.session is not None:
+            yield
+            return
+        self.limiter = HostLimiter()
+        self.session = create_session()
         try:
-            results = await batch_request(source['urls'], max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('tree') is not None:
-                    tree = result['tree']
-                    for tr in tree.xpath("//table[@class='active']//tr")[1:]:
-                        try:
-                            ip = ''.join(tr.xpath('./td[1]/text()')).strip()
-                            port = ''.join(tr.xpath('./td[2]/text()')).strip()
-                            if ip and port:
-                                proxy = Proxy(ip=ip, port=int(port))
-                                proxies.append(proxy)
-                        except:
-                            continue
-
-        except Exception as e:
-            logger.error(f"开心代理获取失败: {str(e)}")
-
-        logger.info(f"开心代理获取到 {len(proxies)} 个代理")
+            yield
+        finally:
+            await self.session.close()
+            self.session = None
+            self.limiter = None
+
+    async def _request_pages(self, source: Dict, urls: List[str]) -> List:
+        return await batch_request(urls, max_concurrent=source.get('max_concurrent', 5),
+                                   cache=self.page_cache, limiter=self.limiter, session=self.session)
+
+    def _parse_pages(self, urls: List[str], results: List, spec: Dict) -> List[str]:
+        """解析一个源的所有页面；未变化（304）且解析配置相同的页面直接复用缓存的解析结果"""
+        key = parser_key(spec)
+        proxies = []
+        for url, result in zip(urls, results):
+            if not isinstance(result, AsyncResponse):
+                continue
+            if result.get('not_modified') and result['proxies'] is not None and result['parser'] == key:
+                proxies.extend(result['proxies'])
+                continue
+            # 解析配置变化过的 304 页面用缓存的页面内容重新解析
+            page_proxies = parse_result(result, spec)
+            proxies.extend(page_proxies)
+            if self.page_cache and result.status_code in (200, 304):
+                self.page_cache.store_proxies(url, key, page_proxies)
+            result.release()
         return proxies
 
-    async def fetch_from_ip3366(self) -> List[Proxy]:
-        """从云代理获取代理"""
-        source = self.sources['ip3366']
+    async def stream_sources(self, names: Optional[Iterable[str]] = None) -> AsyncIterator[Tuple[str, List[str]]]:
+        """并发抓取多个源（默认所有启用的源），每个源完成后立即产出 (源名称, ip:port 列表)"""
+        names = [name for name in (names or self.sources) if self.sources[name].get('enabled', True)]
+        self.stats = SourceStats()
+
+        async def fetch_named(name):
+            return name, await self.fetch_source(name)
+
+        # 同一站点上的多个源共享限速和连接
+        async with self._session_scope():
+            tasks = [asyncio.ensure_future(fetch_named(name)) for name in names]
+            try:
+                for future in asyncio.as_completed(tasks):
+                    yield await future
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def fetch_sources(self, names: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """并发抓取多个源（默认所有启用的源），返回 {源名称: ip:port 列表}"""
+        names = list(names or self.sources)
+        results = {name: proxies async for name, proxies in self.stream_sources(names)}
+        return {name: results[name] for name in names if name in results}
+
+    async def fetch_from(self, name: str) -> List[Proxy]:
+        """从指定源获取代理"""
+        if not self.sources[name].get('enabled', True):
+            return []
+        async with self._session_scope():
+            fetched = await self.fetch_source(name)
         proxies = []
+        for proxy in fetched:
+            ip, port = proxy.split(':')
+            proxies.append(Proxy(ip=ip, port=int(port)))
+        return proxies
 
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从云代理获取代理")
-
-        try:
-            results = await batch_request(source['urls'], max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('tree') is not None:
-                    tree = result['tree']
-                    for tr in tree.xpath("//table[@class='table table-bordered table-striped']//tr")[1:]:
-                        try:
-                            ip = ''.join(tr.xpath('./td[1]/text()')).strip()
-                            port = ''.join(tr.xpath('./td[2]/text()')).strip()
-                            if ip and port:
-                                proxy = Proxy(ip=ip, port=int(port))
-                                proxies.append(proxy)
-                        except:
-                            continue
+    async def fetch_from_kuaidaili(self) -> List[Proxy]:
+        """从快代理获取代理"""
+        return await self.fetch_from('kuaidaili')
 
-        except Exception as e:
-            logger.error(f"云代理获取失败: {str(e)}")
+    async def fetch_from_kxdaili(self) -> List[Proxy]:
+        """从开心代理获取代理"""
+        return await self.fetch_from('kxdaili')
 
-        logger.info(f"云代理获取到 {len(proxies)} 个代理")
-        return proxies
+    async def fetch_from_ip3366(self) -> List[Proxy]:
+        """从云代理获取代理"""
+        return await self.fetch_from('ip3366')
 
     async def fetch_from_proxy11(self) -> List[Proxy]:
         """从Proxy11获取代理"""
-        source = self.sources['proxy11']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从Proxy11获取代理")
-
-        try:
-            async with AsyncWebRequest() as requester:
-                result = await requester.get(source['url'])
-
-                if result.get('json') and 'data' in result['json']:
-                    for item in result['json']['data']:
-                        ip = item.get('ip', '').strip()
-                        port = item.get('port', '').strip()
-                        if ip and port:
-                            try:
-                                proxy = Proxy(ip=ip, port=int(port))
-                                proxies.append(proxy)
-                            except:
-                                continue
-
-        except Exception as e:
-            logger.error(f"Proxy11获取失败: {str(e)}")
-
-        logger.info(f"Proxy11获取到 {len(proxies)} 个代理")
-        return proxies
+        return await self.fetch_from('proxy11')
 
     async def fetch_from_proxy_list(self) -> List[Proxy]:
         """从Proxy List获取代理"""
-        source = self.sources['proxy_list']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从Proxy List获取代理")
-
-        try:
-            results = await batch_request(source['urls'], max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('text'):
-                    text = result['text']
-                    # 提取Base64编码的代理
-                    proxy_matches = re.findall(r"Proxy\('(.*?)'\)", text)
-
-                    import base64
-                    for encoded_proxy in proxy_matches:
-                        try:
-                            decoded = base64.b64decode(encoded_proxy).decode()
-                            parts = decoded.split(':')
-                            if len(parts) >= 2:
-                                ip = parts[0].strip()
-                                port = parts[1].strip()
-                                if ip and port:
-                                    proxy = Proxy(ip=ip, port=int(port))
-                                    proxies.append(proxy)
-                        except:
-                            continue
-
-        except Exception as e:
-            logger.error(f"Proxy List获取失败: {str(e)}")
-
-        logger.info(f"Proxy List获取到 {len(proxies)} 个代理")
-        return proxies
+        return await self.fetch_from('proxy_list')
 
     async def fetch_from_proxylistplus(self) -> List[Proxy]:
         """从ProxyListPlus获取代理"""
-        source = self.sources['proxylistplus']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从ProxyListPlus获取代理")
-
-        try:
-            results = await batch_request(source['urls'], max_concurrent=3)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('text'):
-                    text = result['text']
-                    # 使用正则提取IP和端口
-                    proxy_matches = re.findall(
-                        r'<td>(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})</td>[\s\S]*?<td>(\d+)</td>',
-                        text
-                    )
-
-                    for ip, port in proxy_matches:
-                        try:
-                            proxy = Proxy(ip=ip, port=int(port))
-                            proxies.append(proxy)
-                        except:
-                            continue
-
-        except Exception as e:
-            logger.error(f"ProxyListPlus获取失败: {str(e)}")
-
-        logger.info(f"ProxyListPlus获取到 {len(proxies)} 个代理")
-        return proxies
+        return await self.fetch_from('proxylistplus')
 
     async def fetch_from_dieniao(self) -> List[Proxy]:
         """从蝶鸟代理获取代理"""
-        source = self.sources['dieniao']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从蝶鸟代理获取代理")
-
-        try:
-            results = await batch_request(source['urls'], max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('tree') is not None:
-                    tree = result['tree']
-                    for li in tree.xpath("//div[@class='free-main col-lg-12 col-md-12 col-sm-12 col-xs-12']/ul/li")[1:]:
-                        try:
-                            ip = ''.join(li.xpath('./span[1]/text()')).strip()
-                            port = ''.join(li.xpath('./span[2]/text()')).strip()
-                            if ip and port:
-                                proxy = Proxy(ip=ip, port=int(port))
-                                proxies.append(proxy)
-                        except:
-                            continue
-
-        except Exception as e:
-            logger.error(f"蝶鸟代理获取失败: {str(e)}")
-
-        logger.info(f"蝶鸟代理获取到 {len(proxies)} 个代理")
-        return proxies
+        return await self.fetch_from('dieniao')
 
     async def fetch_from_qiyun(self) -> List[Proxy]:
         """从齐云代理获取代理"""
-        source = self.sources['qiyun']
-        proxies = []
-
-        if not source['enabled']:
-            return proxies
-
-        logger.info(f"正在从齐云代理获取代理")
-
-        try:
-            results = await batch_request(source['urls'], max_concurrent=5)
-
-            for result in results:
-                if isinstance(result, dict) and result.get('tree') is not None:
-                    tree = result['tree']
-                    for tr in tree.xpath("//table[@class='table table-bordered table-striped']//tr")[1:]:
-                        try:
-                            ip = ''.join(tr.xpath('./td[1]/text()')).strip()
-                            port = ''.join(tr.xpath('./td[2]/text()')).strip()
-                            if ip and port:
-                                proxy = Proxy(ip=ip, port=int(port))
-                                proxies.append(proxy)
-                        except:
-                            continue
-
-        except Exception as e:
-            logger.error(f"齐云代理获取失败: {str(e)}")
-
-        logger.info(f"齐云代理获取到 {len(proxies)} 个代理")
-        return proxies
+        return await self.fetch_from('qiyun')
 
     async def fetch_all(self) -> List[Proxy]:
         """从所有源获取代理"""
         logger.info("开始从所有源获取代理")
 
-        tasks = [
-            self.fetch_from_kuaidaili(),
-            self.fetch_from_kxdaili(),
-            self.fetch_from_ip3366(),
-            self.fetch_from_proxy11(),
-            self.fetch_from_proxy_list(),
-            self.fetch_from_proxylistplus(),
-            self.fetch_from_dieniao(),
-            self.fetch_from_qiyun(),
-        ]
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        all_proxies = []
-        for result in results:
-            if isinstance(result, list):
-                all_proxies.extend(result)
+        results = await self.fetch_sources()
 
         # 去重
         unique_proxies = {}
-        for proxy in all_proxies:
-            key = proxy.proxy_url
-            if key not in unique_proxies:
-                unique_proxies[key] = proxy
+        for proxies in results.values():
+            for proxy in proxies:
+                if proxy not in unique_proxies:
+                    ip, port = proxy.split(':')
+                    unique_proxies[proxy] = Proxy(ip=ip, port=int(port))
 
         final_proxies = list(unique_proxies.values())
 
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+代理源页面缓存
+保存页面的 ETag / Last-Modified、页面内容和解析出的代理，
+再次抓取时发送条件请求，服务器返回 304 时直接复用上次的内容和解析结果
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import PAGE_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def parser_key(spec: Dict) -> str:
+    """解析配置的指纹，配置变化后缓存的解析结果自动失效"""
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+class PageCache:
+    """页面条件请求缓存（线程安全，同步和异步请求共用）"""
+
+    def __init__(self, filename: Optional[str] = None):
+        self.filename = filename or PAGE_CACHE_CONFIG['file']
+        self._lock = threading.Lock()
+        # 旧式同步生成器在线程池中运行，连接需要跨线程使用
+        self.conn = sqlite3.connect(self.filename, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS page_cache ('
+            ' url TEXT PRIMARY KEY,'
+            ' etag TEXT NOT NULL DEFAULT \'\','
+            ' last_modified TEXT NOT NULL DEFAULT \'\','
+            ' body BLOB NOT NULL,'
+            ' parser TEXT NOT NULL DEFAULT \'\','
+            ' proxies TEXT,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    def get(self, url: str) -> Optional[Dict]:
+        """获取页面的缓存记录，没有则返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, body, parser, proxies FROM page_cache WHERE url = ?', (url,)
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, body, parser, proxies = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': body,
+            'parser': parser,
+            'proxies': None if proxies is None else [p for p in proxies.split('\n') if p],
+        }
+
+    @staticmethod
+    def validators(entry: Optional[Dict]) -> Dict[str, str]:
+        """根据缓存记录生成条件请求头"""
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes):
+        """保存带校验信息的页面（没有 ETag 和 Last-Modified 的页面无法做条件请求，不保存）"""
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            # 页面变化后旧的解析结果随之作废
+            self.conn.execute(
+                'INSERT OR REPLACE INTO page_cache (url, etag, last_modified, body, parser, proxies, updated_at)'
+                ' VALUES (?, ?, ?, ?, \'\', NULL, ?)',
+                (url, etag or '', last_modified or '', body, time.time())
+            )
+            self.conn.commit()
+
+    def store_proxies(self, url: str, parser: str, proxies: List[str]):
+        """保存页面的解析结果，供 304 时直接复用"""
+        with self._lock:
+            self.conn.execute(
+                'UPDATE page_cache SET parser = ?, proxies = ? WHERE url = ?',
+                (parser, '\n'.join(proxies), url)
+            )
+            self.conn.commit()
+
+    def touch(self, url: str):
+        """页面未变化时刷新更新时间，避免被清理"""
+        with self._lock:
+            self.conn.execute('UPDATE page_cache SET updated_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """删除超过 max_age 未更新的页面，返回删除条数"""
+        max_age = max_age if max_age is not None else PAGE_CACHE_CONFIG['max_age']
+        with self._lock:
+            cursor = self.conn.execute('DELETE FROM page_cache WHERE updated_at < ?', (time.time() - max_age,))
+            self.conn.commit()
+        return cursor.rowcount
+
+
+def default_page_cache() -> Optional[PageCache]:
+    """进程内共享的页面缓存，未启用时返回 None"""
+    global _default_cache
+    if not PAGE_CACHE_CONFIG['enabled']:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = PageCache()
+            purged = _default_cache.purge()
+            if purged:
+                logger.info(f"清理过期页面缓存 {purged} 条")
+    return _default_cache
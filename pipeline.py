@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+抓取-验证流水线
+每个代理源抓取完成后，代理立即经过规范化和去重进入有界队列，先由预筛协程（缓存、TCP连通性）处理，
+再由验证协程并发消费：验证与抓取重叠进行，不必等最慢的源返回；队列满时抓取端等待验证（背压），内存占用有上限。
+预筛与批量验证一样使用独立的并发数，验证并发可由AIMD控制器自动调整
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from adaptive_concurrency import AIMDController
+from async_checker import AsyncProxyChecker, tcp_alive
+from config import PROTOCOL_PROBE_CONFIG, PROXY_CHECK_CONFIG
+from optimized_fetcher import OptimizedProxyFetcher
+from protocol_probe import detect_protocols, is_socks_only
+from source_parsers import normalize_proxy
+from verify_cache import VerifyCache
+
+logger = logging.getLogger(__name__)
+
+
+class ProxyPipeline:
+    """
+    抓取 → 规范化/去重 → 预筛 → 验证 流水线
+    prefilter（可选）在独立的协程组中运行（并发为 prefilter_concurrency），返回结果字典表示代理已有结论
+    （如命中缓存、端口不通），返回 None 才进入验证；传入 controller 时验证并发由AIMD控制器自动调整，
+    否则固定为 workers
+    """
+
+    def __init__(self, fetcher: OptimizedProxyFetcher, verify: Callable[[str], Awaitable[Dict]],
+                 workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 on_result: Optional[Callable[[Dict], None]] = None,
+                 prefilter: Optional[Callable[[str], Awaitable[Optional[Dict]]]] = None,
+                 controller: Optional[AIMDController] = None):
+        self.fetcher = fetcher
+        self.verify = verify
+        self.workers = workers or PROXY_CHECK_CONFIG['async_concurrency']
+        self.queue_size = queue_size or PROXY_CHECK_CONFIG['pipeline_queue_size']
+        self.on_result = on_result
+        self.prefilter = prefilter
+        self.controller = controller
+
+    async def run(self, initial: Iterable[str] = (), names: Optional[Iterable[str]] = None) -> Dict:
+        """
+        抓取 names 指定的源（默认所有启用的源），连同 initial 中已有的代理一起验证
+        返回 {'sources': {源名称: ip:port 列表}, 'results': {代理: 验证结果}}
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # 没有预筛时代理直接进入验证队列
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size) if self.prefilter else queue
+        seen = set()
+        sources: Dict[str, List[str]] = {}
+        results: Dict[str, Dict] = {}
+
+        def finish(proxy: str, result: Dict):
+            results[proxy] = result
+            if self.on_result:
+                # 回调出错不能让消费协程退出，否则验证协程越来越少，全部退出后 queue.join() 永远等待
+                try:
+                    self.on_result(result)
+                except Exception as e:
+                    logger.warning(f"处理验证结果 {proxy} 出错: {e}")
+
+        async def produce(proxies):
+            for raw in proxies:
+                proxy = normalize_proxy(raw)
+                if proxy and proxy not in seen:
+                    seen.add(proxy)
+                    await pending.put(proxy)
+
+        async def produce_sources():
+            async for name, proxies in self.fetcher.stream_sources(names):
+                sources[name] = proxies
+                await produce(proxies)
+
+        async def screen():
+            while True:
+                proxy = await pending.get()
+                try:
+                    try:
+                        result = await self.prefilter(proxy)
+                    except Exception as e:
+                        logger.warning(f"预筛代理 {proxy} 出错: {e}")
+                        result = None
+                    if result is None:
+                        await queue.put(proxy)
+                    else:
+                        finish(proxy, result)
+                finally:
+                    pending.task_done()
+
+        async def check(proxy):
+            try:
+                try:
+                    result = await self.verify(proxy)
+                except Exception as e:
+                    logger.warning(f"验证代理 {proxy} 出错: {e}")
+                    result = {'proxy': proxy, 'valid': False, 'response_time': 0.0, 'error': str(e)}
+                if self.controller and not result.get('cached'):
+                    error = result.get('error', '')
+                    self.controller.record(result['response_time'], result['valid'],
+                                           timeout=error == 'timeout', overload=error == 'fd_pressure')
+                finish(proxy, result)
+            finally:
+                queue.task_done()
+
+        async def dispatch():
+            # 与 gather_adaptive 相同：在途验证数达到当前上限时等待任一验证完成
+            running = set()
+            try:
+                while True:
+                    proxy = await queue.get()
+                    limit = self.controller.limit if self.controller else self.workers
+                    while len(running) >= limit:
+                        _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    running.add(asyncio.ensure_future(check(proxy)))
+            finally:
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+
+        tasks = [asyncio.ensure_future(dispatch())]
+        if self.prefilter:
+            tasks += [asyncio.ensure_future(screen()) for _ in range(PROXY_CHECK_CONFIG['prefilter_concurrency'])]
+        try:
+            await asyncio.gather(produce(initial), produce_sources())
+            await pending.join()
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.controller:
+            logger.info(f"自适应并发结束时的并发上限: {self.controller.limit}")
+        logger.info(f"流水线完成: {len(sources)} 个源, 去重后 {len(seen)} 个代理, "
+                    f"有效 {sum(1 for r in results.values() if r['valid'])} 个")
+        return {'sources': sources, 'results': results}
+
+
+class StreamingVerifier:
+    """
+    流水线中的单代理验证，步骤与批量验证一致：
+    prefilter 为 验证缓存 → TCP预筛，__call__ 为 协议探测（仅SOCKS的代理到此为止）→ HTTP检测
+    （探测时已取得检测URL的响应则直接复用，只有探测未收到响应的代理才用更长的时限重新检测）
+    """
+
+    def __init__(self, cache: Optional[VerifyCache] = None, max_concurrent: Optional[int] = None):
+        self.cache = cache
+        self.checker = AsyncProxyChecker(max_concurrent=max_concurrent)
+
+    async def __aenter__(self):
+        await self.checker.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.checker.__aexit__(exc_type, exc_val, exc_tb)
+
+    async def prefilter(self, proxy: str) -> Optional[Dict]:
+        """命中未过期缓存时返回缓存结果（带 cached=True），端口不通时返回失败结果，否则返回 None"""
+        if self.cache:
+            cached = self.cache.get(proxy)
+            if cached:
+                return dict(cached, cached=True)
+        if PROXY_CHECK_CONFIG['tcp_prefilter'] and not await tcp_alive(proxy):
+            return {'proxy': proxy, 'valid': False, 'response_time': 0.0, 'error': 'tcp'}
+        return None
+
+    async def __call__(self, proxy: str) -> Dict:
+        """验证单个代理（已通过 prefilter）"""
+        protocols = []
+        response = None
+        if PROTOCOL_PROBE_CONFIG['enabled']:
+            probe = await detect_protocols(proxy)
+            protocols = probe['protocols']
+            response = probe['http_response']
+            if is_socks_only(protocols):
+                # SOCKS 代理只转发字节，不会添加代理请求头，延迟取握手实测耗时
+                return {'proxy': proxy, 'valid': True, 'response_time': probe['response_time'],
+                        'anonymity': 'high_anonymous', 'protocols': protocols, 'error': ''}
+
+        if response is not None:
+            # 协议探测已经通过代理请求过检测URL，直接用其响应判定，不再重复请求
+            checked = self.checker.evaluate(proxy, **response)
+        else:
+            checked = await self.checker.check(proxy)
+        checked['protocols'] = protocols
+        return checked
+
+
+async def stream_fetch_and_verify(initial: Iterable[str] = (), cache: Optional[VerifyCache] = None,
+                                  fetcher: Optional[OptimizedProxyFetcher] = None,
+                                  on_result: Optional[Callable[[Dict], None]] = None,
+                                  adaptive: bool = True) -> Tuple[Dict[str, List[str]], Dict[str, Dict]]:
+    """
+    抓取所有启用的源并流式验证（连同 initial 中已有的代理），返回 ({源名称: 代理列表}, {代理: 验证结果})
+    adaptive 为 True 时与批量验证一样由AIMD控制器决定验证并发
+    """
+    fetcher = fetcher or OptimizedProxyFetcher()
+    controller = AIMDController() if adaptive else None
+    async with StreamingVerifier(cache, max_concurrent=controller.max_limit if controller else None) as verifier:
+        pipeline = ProxyPipeline(fetcher, verifier, on_result=on_result, prefilter=verifier.prefilter,
+                                 controller=controller)
+        outcome = await pipeline.run(initial)
+    return outcome['sources'], outcome['results']
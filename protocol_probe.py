@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+代理协议探测
+用尽量少的往返判断代理实际支持的协议（http / https CONNECT / socks5 / socks4）：
+- HTTP GET 与 CONNECT 共用同一条TCP连接（代理允许 keep-alive 时）；GET 请求的就是验证用的检测URL，
+  响应（状态码、内容、耗时）随探测结果返回，验证时直接复用，不再通过代理重复请求
+- SOCKS5 握手和连接请求合并成一次写入
+- 三条探测连接并发进行，总耗时约等于最慢的一次往返
+"""
+
+import asyncio
+import logging
+import socket
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from async_checker import default_test_url
+from config import JUDGE_CONFIG, PROTOCOL_PROBE_CONFIG, PROXY_CHECK_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 协议优先级：越靠前越通用
+PROTOCOL_ORDER = ['https', 'http', 'socks5', 'socks4']
+# 探测时读取的响应内容上限（字节）
+MAX_BODY = 65536
+
+
+def _judge_target() -> Tuple[str, int, str]:
+    """返回检测URL的 (主机, 端口, 路径)，与 AsyncProxyChecker 默认使用的检测URL相同"""
+    parts = urlsplit(default_test_url())
+    return parts.hostname, parts.port or 80, (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+
+def _connect_target() -> Tuple[str, int]:
+    """返回 CONNECT / SOCKS 探测使用的目标 (主机, 端口)"""
+    target = PROTOCOL_PROBE_CONFIG['connect_target']
+    if target:
+        host, port = target.rsplit(':', 1)
+        return host, int(port)
+    if JUDGE_CONFIG['url']:
+        host, port, _ = _judge_target()
+        return host, port
+    # 很多代理（如 squid 默认配置）只允许 CONNECT 到 443 端口
+    return 'httpbin.org', 443
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    """读取分块传输的响应内容"""
+    body = bytearray()
+    while True:
+        size = int(((await reader.readline()).split(b';')[0].strip() or b'0'), 16)
+        if size == 0:
+            # 跳过 trailer 直到空行
+            while (await reader.readline()).strip():
+                pass
+            return bytes(body)
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+        if len(body) > MAX_BODY:
+            raise ValueError('response too large')
+
+
+async def _read_to_eof(reader: asyncio.StreamReader) -> bytes:
+    """读取到连接关闭为止（最多 MAX_BODY 字节）"""
+    body = bytearray()
+    while len(body) < MAX_BODY:
+        chunk = await reader.read(MAX_BODY - len(body))
+        if not chunk:
+            break
+        body += chunk
+    return bytes(body)
+
+
+async def _read_http_response(reader: asyncio.StreamReader, timeout: float) -> Tuple[int, bool, bytes]:
+    """读取一个HTTP响应，返回 (状态码, 连接能否复用, 响应内容)"""
+    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=timeout)
+    lines = head.decode('latin-1').split('\r\n')
+    status_parts = lines[0].split(' ')
+    if len(status_parts) < 2 or not status_parts[0].startswith('HTTP/'):
+        return 0, False, b''
+    status = int(status_parts[1])
+
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+
+    keep_alive = 'close' not in headers.get('connection', '') and 'close' not in headers.get('proxy-connection', '')
+    if 'content-length' in headers:
+        body = await asyncio.wait_for(reader.readexactly(int(headers['content-length'])), timeout=timeout)
+    elif 'chunked' in headers.get('transfer-encoding', ''):
+        body = await asyncio.wait_for(_read_chunked(reader), timeout=timeout)
+    else:
+        # 无长度的响应以关闭连接结束，连接无法复用
+        body = await asyncio.wait_for(_read_to_eof(reader), timeout=timeout)
+        keep_alive = False
+    return status, keep_alive, body
+
+
+async def _probe_http(host: str, port: int, timeout: float) -> Tuple[List[str], Optional[Dict]]:
+    """
+    在同一连接上依次探测 HTTP 转发和 CONNECT 隧道
+    返回 (支持的协议, 检测URL的响应 {'status', 'text', 'response_time'})，GET 未收到完整响应时响应为 None
+    """
+    supported = []
+    response = None
+    judge_host, judge_port, judge_path = _judge_target()
+    netloc = judge_host if judge_port == 80 else f'{judge_host}:{judge_port}'
+    connect_host, connect_port = _connect_target()
+    connect_request = (f'CONNECT {connect_host}:{connect_port} HTTP/1.1\r\n'
+                       f'Host: {connect_host}:{connect_port}\r\n\r\n').encode()
+
+    start_time = time.monotonic()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    try:
+        # 不发送 Proxy-Connection 等额外请求头，回显内容与 AsyncProxyChecker 的请求一致，可直接用于识别匿名度
+        writer.write((f'GET http://{netloc}{judge_path} HTTP/1.1\r\n'
+                      f'Host: {netloc}\r\n'
+                      f'Accept: */*\r\n\r\n').encode())
+        await writer.drain()
+        status, keep_alive, body = await _read_http_response(reader, timeout)
+        response = {'status': status, 'text': body.decode('utf-8', errors='ignore'),
+                    'response_time': time.monotonic() - start_time}
+        if status == 200:
+            supported.append('http')
+        if not keep_alive:
+            writer.close()
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+
+        writer.write(connect_request)
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=timeout)
+        status_parts = head.split(b' ', 2)
+        if len(status_parts) >= 2 and status_parts[0].startswith(b'HTTP/') and status_parts[1] == b'200':
+            supported.append('https')
+    except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass
+    finally:
+        writer.close()
+    return supported, response
+
+
+async def _probe_socks5(host: str, port: int, timeout: float) -> bool:
+    """SOCKS5：无认证握手和 CONNECT 请求一次发出"""
+    target_host, target_port = _connect_target()
+    target = target_host.encode()
+    greeting = b'\x05\x01\x00'
+    request = b'\x05\x01\x00\x03' + bytes([len(target)]) + target + struct.pack('>H', target_port)
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    try:
+        writer.write(greeting + request)
+        await writer.drain()
+        method_reply = await asyncio.wait_for(reader.readexactly(2), timeout=timeout)
+        if method_reply != b'\x05\x00':
+            return False
+        connect_reply = await asyncio.wait_for(reader.readexactly(2), timeout=timeout)
+        return connect_reply == b'\x05\x00'
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return False
+    finally:
+        writer.close()
+
+
+async def _probe_socks4(host: str, port: int, timeout: float) -> bool:
+    """SOCKS4a：由代理解析域名，一次往返"""
+    target_host, target_port = _connect_target()
+    try:
+        # 目标本身是IPv4地址时使用标准 SOCKS4
+        address = socket.inet_aton(target_host)
+        suffix = b''
+    except OSError:
+        address = b'\x00\x00\x00\x01'
+        suffix = target_host.encode() + b'\x00'
+    request = b'\x04\x01' + struct.pack('>H', target_port) + address + b'\x00' + suffix
+
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    try:
+        writer.write(request)
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.readexactly(8), timeout=timeout)
+        return reply[0] == 0 and reply[1] == 0x5a
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return False
+    finally:
+        writer.close()
+
+
+async def _timed(probe) -> Tuple[object, float]:
+    """执行探测并记录耗时"""
+    start_time = time.monotonic()
+    result = await probe
+    return result, time.monotonic() - start_time
+
+
+async def detect_protocols(proxy: str, timeout: Optional[float] = None) -> Dict:
+    """
+    探测单个代理支持的协议
+    返回 {'proxy', 'protocols', 'response_time', 'http_response'}，protocols 按 PROTOCOL_ORDER 排序，
+    response_time 为成功探测中最快的一次耗时（无成功探测时为0），
+    http_response 为通过代理请求检测URL的响应（见 _probe_http），可代替一次 AsyncProxyChecker.check
+    """
+    timeout = timeout or PROTOCOL_PROBE_CONFIG['timeout']
+    result = {'proxy': proxy, 'protocols': [], 'response_time': 0.0, 'http_response': None}
+    try:
+        host, port = proxy.strip().rsplit(':', 1)
+        port = int(port)
+    except ValueError:
+        return result
+
+    outcomes = await asyncio.gather(
+        _timed(_probe_http(host, port, timeout)),
+        _timed(_probe_socks5(host, port, timeout)),
+        _timed(_probe_socks4(host, port, timeout)),
+        return_exceptions=True,
+    )
+
+    supported = set()
+    elapsed = []
+    for outcome, protocols in zip(outcomes, (None, ['socks5'], ['socks4'])):
+        if isinstance(outcome, BaseException):
+            continue
+        value, seconds = outcome
+        if protocols is None:
+            found, result['http_response'] = value
+        else:
+            found = protocols if value is True else []
+        if found:
+            supported.update(found)
+            elapsed.append(seconds)
+
+    result['protocols'] = [protocol for protocol in PROTOCOL_ORDER if protocol in supported]
+    if elapsed:
+        result['response_time'] = round(min(elapsed), 3)
+    return result
+
+
+async def async_detect_many(proxies: Iterable[str], max_concurrent: Optional[int] = None) -> Dict[str, Dict]:
+    """批量探测协议，返回 {代理: 探测结果}"""
+    proxies = list(proxies)
+    # 每个代理占用3条连接
+    semaphore = asyncio.Semaphore(max_concurrent or PROTOCOL_PROBE_CONFIG['max_concurrent'])
+
+    async def probe(proxy):
+        async with semaphore:
+            return await detect_protocols(proxy)
+
+    results = await asyncio.gather(*(probe(p) for p in proxies))
+    detected = dict(zip(proxies, results))
+    logger.info(f"协议探测完成，识别出协议: {sum(1 for r in results if r['protocols'])}/{len(proxies)}")
+    return detected
+
+
+def detect_many(proxies: Iterable[str], max_concurrent: Optional[int] = None) -> Dict[str, Dict]:
+    """同步入口：批量探测协议"""
+    return asyncio.run(async_detect_many(proxies, max_concurrent=max_concurrent))
+
+
+def is_socks_only(protocols: List[str]) -> bool:
+    """只支持SOCKS的代理：SOCKS探测已经通过代理连到了目标地址，无需再做HTTP检测"""
+    return bool(protocols) and not {'http', 'https'} & set(protocols)
+
+
+def primary_protocol(protocols: List[str]) -> str:
+    """选出代理的主协议（用于分类），没有识别出协议时返回空字符串"""
+    return protocols[0] if protocols else ''
@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import os
 import re
 import sys
 import json
-from time import sleep
+import time
 
 import github_api
+from async_checker import evaluate_responses, tcp_prefilter, verify_all
 from check_proxy import check_proxy
+from config import PROXY_CHECK_CONFIG, PROTOCOL_PROBE_CONFIG, PROXY_SOURCES, SOURCE_STATS_CONFIG, VERIFY_CACHE_CONFIG
+from optimized_fetcher import OptimizedProxyFetcher
+from pipeline import stream_fetch_and_verify
+from protocol_probe import detect_many, is_socks_only, primary_protocol
+from source_parsers import normalize_proxy
+from verify_cache import VerifyCache
 from webRequest import WebRequest
 
 
@@ -17,8 +25,12 @@ def saveData(text):
         f.write("\n")
 
 
-def generate_json_files(proxy_list):
-    """生成 proxyinfo.json 文件（按代理类型分类）"""
+def generate_json_files(proxy_list, proxy_details=None):
+    """
+    生成 proxyinfo.json 文件（按代理类型和匿名度分类）
+    proxy_details 为 {代理: 验证结果}，提供探测出的 protocols、实测 response_time 和 anonymity；
+    没有探测到协议时按端口粗略判断类型，匿名度未知的代理归入 transparent
+    """
     # 生成 proxyinfo.json
     proxies_by_type = {
         "http_high_anonymous": [],
@@ -29,8 +41,12 @@ def generate_json_files(proxy_list):
         "https_transparent": [],
         "socks5_high_anonymous": [],
         "socks5_anonymous": [],
-        "socks5_transparent": []
+        "socks5_transparent": [],
+        "socks4_high_anonymous": [],
+        "socks4_anonymous": [],
+        "socks4_transparent": []
     }
+    proxy_details = proxy_details or {}
 
     for proxy in proxy_list:
         if not proxy or ':' not in proxy:
@@ -39,47 +55,42 @@ def generate_json_files(proxy_list):
         try:
             host, port = proxy.strip().split(':')
             port = int(port)
+            detail = proxy_details.get(proxy, {})
 
+            protocols = detail.get('protocols') or []
+            if protocols:
+                # 按探测出的实际协议分类
+                proxy_type = primary_protocol(protocols)
             # 简单的类型分类（基于端口）
-            if port in [80, 8080, 8000, 8081, 3128]:
-                proxy_type = "http"
-                anonymity = "high_anonymous"  # 默认高匿名
-                proxies_by_type[f"{proxy_type}_{anonymity}"].append({
-                    "host": host,
-                    "type": proxy_type,
-                    "port": port,
-                    "from": "freeproxylist",
-                    "anonymity": anonymity,
-                    "response_time": round(0.5 + (hash(proxy) % 50) / 100, 2),  # 模拟响应时间
-                    "country": "US"  # 默认国家
-                })
             elif port in [1080, 1081, 9050]:
                 proxy_type = "socks5"
-                anonymity = "high_anonymous"
-                proxies_by_type[f"{proxy_type}_{anonymity}"].append({
-                    "host": host,
-                    "type": proxy_type,
-                    "port": port,
-                    "from": "freeproxylist",
-                    "anonymity": anonymity,
-                    "response_time": round(0.5 + (hash(proxy) % 50) / 100, 2),
-                    "country": "US"
-                })
             else:
-                # 其他端口归类为 http transparent
-                proxies_by_type["http_transparent"].append({
-                    "host": host,
-                    "type": "http",
-                    "port": port,
-                    "from": "freeproxylist",
-                    "anonymity": "transparent",
-                    "response_time": round(0.5 + (hash(proxy) % 50) / 100, 2),
-                    "country": "US"
-                })
+                proxy_type = "http"
+
+            # 未识别匿名度时保守地归入透明代理，避免被当作高匿代理使用
+            anonymity = detail.get('anonymity') or "unknown"
+            category = anonymity if anonymity in ("high_anonymous", "anonymous") else "transparent"
+
+            entry = {
+                "host": host,
+                "type": proxy_type,
+                "port": port,
+                "from": "freeproxylist",
+                "anonymity": anonymity,
+                "response_time": detail.get('response_time') or None,  # 实测响应时间（秒），未测量为 null
+                "country": "unknown"  # 未做IP归属地查询
+            }
+            if protocols:
+                entry["protocols"] = protocols
+            proxies_by_type[f"{proxy_type}_{category}"].append(entry)
         except Exception as e:
             print(f"Warning: Failed to parse proxy {proxy}: {e}")
             continue
 
+    # 每个分类内按响应时间升序排列，未测量的排在最后
+    for proxies in proxies_by_type.values():
+        proxies.sort(key=lambda p: (p["response_time"] is None, p["response_time"] or 0))
+
     # 保存 proxyinfo.json
     with open("proxyinfo.json", "w", encoding='utf-8') as f:
         json.dump(proxies_by_type, f, indent=2, ensure_ascii=False)
@@ -199,7 +210,6 @@ def freeProxy05(page_count=4):
         # print(url + "---->" + str(tree))
         if tree != "":
             proxy_list = tree.xpath('.//table//tr')
-            sleep(1)  # 必须sleep 不然第二条请求不到数据
             for tr in proxy_list[1:]:
                 yield ':'.join(tr.xpath('./td/text()')[0:2])
 
@@ -528,9 +538,82 @@ lproxy_list = []
 final_list = []
 
 
+def verify_batch(candidates, method, verify_cache=None, show_progress=None):
+    """
+    批量验证：验证缓存 → TCP预筛 → 协议探测 → HTTP检测
+    返回 (缓存命中的结果 {代理: 结果}, 本轮实际验证的结果列表)
+    """
+    start_time = time.time()
+    # 复用未过期的验证结果，只有过期或新出现的代理才重新验证
+    cached_results = {}
+    if verify_cache:
+        cached_results, candidates = verify_cache.split(candidates)
+        print(f"验证缓存命中: {len(cached_results)} 个代理 (有效期 {verify_cache.ttl}s)，"
+              f"需要重新验证: {len(candidates)} 个")
+
+    checked_results = []  # 本轮实际验证的结果
+    if PROXY_CHECK_CONFIG['tcp_prefilter']:
+        # TCP预筛：端口不通的代理不再占用HTTP检测
+        reachable = tcp_prefilter(candidates)
+        reachable_set = set(reachable)
+        checked_results.extend({'proxy': p, 'valid': False, 'response_time': 0.0}
+                               for p in candidates if p not in reachable_set)
+        print(f"TCP预筛完成: {len(reachable)}/{len(candidates)} 个代理端口可连通 "
+              f"(耗时 {time.time() - start_time:.1f}s)")
+        candidates = reachable
+
+    probes = {}
+    if PROTOCOL_PROBE_CONFIG['enabled']:
+        # 协议探测：SOCKS探测已经通过代理连到了目标地址，只支持SOCKS的代理无需再做HTTP检测
+        probes = detect_many(candidates)
+        socks_only = {p for p, r in probes.items() if is_socks_only(r['protocols'])}
+        # SOCKS 代理只转发字节，不会添加代理请求头，延迟取握手实测耗时
+        checked_results.extend({'proxy': p, 'valid': True, 'response_time': probes[p]['response_time'],
+                                'anonymity': 'high_anonymous'}
+                               for p in candidates if p in socks_only)
+        print(f"协议探测完成: 识别出协议 {sum(1 for r in probes.values() if r['protocols'])} 个, "
+              f"仅SOCKS {len(socks_only)} 个")
+        candidates = [p for p in candidates if p not in socks_only]
+
+    if method == 'async':
+        # 协议探测已经通过代理请求过检测URL的，直接用其响应判定；只有未收到响应的代理才重新检测
+        responses = {p: probes[p]['http_response'] for p in candidates
+                     if p in probes and probes[p]['http_response'] is not None}
+        if responses:
+            checked_results.extend(evaluate_responses(responses))
+            print(f"复用协议探测的检测响应: {len(responses)} 个代理")
+            candidates = [p for p in candidates if p not in responses]
+        checked_results.extend(verify_all(candidates, progress=show_progress, adaptive=True,
+                                          processes=PROXY_CHECK_CONFIG['processes']))
+    else:
+        valid_count = 0
+        for index, proxy_info in enumerate(candidates, 1):
+            # 显示进度
+            if show_progress:
+                show_progress(index, len(candidates), valid_count)
+
+            # 验证代理
+            try:
+                check_start = time.time()
+                is_valid = check_proxy(proxy_info, method=method)
+                response_time = round(time.time() - check_start, 3) if is_valid else 0.0
+                checked_results.append({'proxy': proxy_info, 'valid': is_valid, 'response_time': response_time})
+                if is_valid:
+                    valid_count += 1
+                    if index <= 10:  # 只显示前10个通过验证的代理
+                        print(f"  ✓ 验证通过: {proxy_info}")
+            except Exception as e:
+                # 验证失败不影响整体流程
+                continue
+
+    for result in checked_results:
+        result['protocols'] = probes.get(result['proxy'], {}).get('protocols', [])
+
+    return cached_results, checked_results
+
+
 def runAllwork():
     global lproxy_list
-    import time
     start_time = time.time()
 
     # 0. get token and arguments
@@ -565,45 +648,76 @@ def runAllwork():
 
     print(f"Loaded {len(lproxy_list)} existing proxies")
     # print(type(lproxy_list))
+
+    # 代理有效性验证（默认启用，确保只提交可用代理）
+    #    ⚠️ 重要：为了确保数据质量，强烈建议启用验证
+    #
+    #    验证方法：
+    #    - 'async': 异步批量检测（推荐，共享连接器 + 有界并发，万级代理分钟级完成）
+    #    - 'fast': 快速检测（5秒/代理）
+    #    - 'basic': 基础检测（8秒/代理）
+    #    - 'multiple': 多URL检测（15秒/代理）
+    #    - 'strict': 严格检测（20秒/代理）
+    #
+    #    使用方式：
+    #    - 命令行: python proxyFetcher.py TOKEN --verify
+    #    - 禁用验证: python proxyFetcher.py TOKEN --no-verify
+    #    - 环境变量: export VERIFY_PROXIES=false
+    #    - 多进程分片: export VERIFY_PROCESSES=16（仅 'async' 方法）
+    #    - GitHub Actions: 默认启用，可通过环境变量禁用
+    #
+    #    'async' 方法单进程验证时与抓取重叠进行（见 pipeline.py）：每个源抓取完成后代理立即进入验证队列
+
+    VERIFICATION_METHOD = 'async'  # 验证方法
+
+    # 默认启用验证，除非明确禁用
+    should_verify = verify_proxies or (
+        '--no-verify' not in sys.argv and
+        os.getenv('VERIFY_PROXIES', '').lower() != 'false'
+    )
+
+    streaming = should_verify and VERIFICATION_METHOD == 'async' and PROXY_CHECK_CONFIG['processes'] <= 1
+    verify_cache = VerifyCache() if should_verify and VERIFY_CACHE_CONFIG['enabled'] else None
+    if streaming:
+        # 流水线的结果以规范化的 ip:port 为键，已有列表先去掉 \r、空白等格式差异，否则验证结果对不上而被丢弃
+        lproxy_list = list(dict.fromkeys(p for p in map(normalize_proxy, lproxy_list) if p))
+
     # 3. request newest data from net
 
-    # 只保留经过验证的可用的代理源（跳过DNS解析失败和超时不可用的网站）
-    # 从实际运行日志中确定：freeProxy03, freeProxy05, freeProxy07 是可用的
-    # 其他很多网站DNS解析失败或连接超时
-    proxy_functions = [
-        ("freeProxy03", freeProxy03),  # 开心代理 - 可用
-        ("freeProxy05", freeProxy05),  # 快代理 - 可用
-        ("freeProxy07", freeProxy07),  # 云代理 - 可用
-        ("freeProxy11", freeProxy11),  # proxy-list.org - 可用
-        ("freeProxy12", freeProxy12),  # proxylistplus - 可用
-        ("freeProxy14", freeProxy14),  # cn-proxy - 可用
-        ("freeProxy15", freeProxy15),  # 齐云代理 - 可用
-        ("freeProxy16", freeProxy16),  # ProxyScrape API - 可用
-    ]
+    # 所有代理源在 config.PROXY_SOURCES 中声明，由 OptimizedProxyFetcher 并发抓取，总耗时取决于最慢的源；
+    # DNS解析失败或连接超时的源由熔断器自动跳过，恢复后自动重新抓取
+    print(f"\n{'='*60}")
+    print(f"Fetching from {sum(1 for s in PROXY_SOURCES.values() if s.get('enabled', True))} sources concurrently...")
+    fetcher = OptimizedProxyFetcher()
+    existing_proxies = set(lproxy_list)
+    streamed_results = None
+    if streaming:
+        print(f"抓取与验证同时进行，已有代理 {len(lproxy_list)} 个一并验证...")
+        streamed_count = 0
+
+        def show_streamed(result):
+            nonlocal streamed_count
+            streamed_count += 1
+            if streamed_count % 500 == 0:
+                print(f"已验证: {streamed_count} (耗时 {time.time() - start_time:.1f}s)")
+
+        source_results, streamed_results = asyncio.run(
+            stream_fetch_and_verify(lproxy_list, cache=verify_cache, fetcher=fetcher, on_result=show_streamed))
+    else:
+        source_results = asyncio.run(fetcher.fetch_sources())
 
     total_new_proxies = 0
-    for func_name, proxys_func in proxy_functions:
-        try:
-            print(f"\n{'='*60}")
-            print(f"Fetching from {func_name}...")
-            func_start = time.time()
-            proxys = proxys_func()
-            proxy_count = 0
-            for oneProxy in proxys:
-                if oneProxy not in lproxy_list:
-                    lproxy_list.append(oneProxy)
-                    print(f"[NEW] {oneProxy}")
-                    proxy_count += 1
-                    total_new_proxies += 1
-
-            func_duration = time.time() - func_start
-            print(f"Completed {func_name}: {proxy_count} new proxies in {func_duration:.2f}s")
-            print(f"Total runtime so far: {time.time() - start_time:.2f}s")
-            print(f"Total new proxies found: {total_new_proxies}")
-
-        except Exception as e:
-            print(f"ERROR in {func_name}: {str(e)}")
-            continue
+    known_proxies = set(lproxy_list)
+    for source_name, proxys in source_results.items():
+        proxy_count = 0
+        for oneProxy in proxys:
+            if oneProxy not in known_proxies:
+                known_proxies.add(oneProxy)
+                lproxy_list.append(oneProxy)
+                print(f"[NEW] {oneProxy}")
+                proxy_count += 1
+                total_new_proxies += 1
+        print(f"Completed {source_name}: {len(proxys)} fetched, {proxy_count} new proxies")
 
     print(f"\n{'='*60}")
     print(f"Fetching completed! Total new proxies: {total_new_proxies}")
@@ -621,72 +735,49 @@ def runAllwork():
         print(f"   - 考虑添加新的代理源")
         print(f"   - 检查现有代理的有效性（运行 proxy_check.py）")
 
-    # 5. 生成 JSON 文件
-    print(f"\n{'='*60}")
-    print(f"Generating JSON files...")
-    generate_json_files(lproxy_list)
-
     print(f"\n⚠️  注意：my-json-server.typicode.com 已不再支持大量数据")
     print(f"   推荐使用以下方式访问数据：")
     print(f"   - GitHub Raw: https://raw.githubusercontent.com/parserpp/ip_ports/main/proxyinfo.txt")
     print(f"   - CDN: https://cdn.jsdelivr.net/gh/parserpp/ip_ports/proxyinfo.txt")
     print(f"   - JSON: https://cdn.jsdelivr.net/gh/parserpp/ip_ports/proxyinfo.json")
 
-    # 4. 代理有效性验证（默认启用，确保只提交可用代理）
-    #    ⚠️ 重要：为了确保数据质量，强烈建议启用验证
-    #
-    #    验证方法：
-    #    - 'fast': 快速检测（推荐，5秒/代理）
-    #    - 'basic': 基础检测（8秒/代理）
-    #    - 'multiple': 多URL检测（15秒/代理）
-    #    - 'strict': 严格检测（20秒/代理）
-    #
-    #    使用方式：
-    #    - 命令行: python proxyFetcher.py TOKEN --verify
-    #    - 禁用验证: python proxyFetcher.py TOKEN --no-verify
-    #    - 环境变量: export VERIFY_PROXIES=false
-    #    - GitHub Actions: 默认启用，可通过环境变量禁用
-
-    VERIFICATION_METHOD = 'fast'  # 验证方法
-
-    # 默认启用验证，除非明确禁用
-    should_verify = verify_proxies or (
-        '--no-verify' not in sys.argv and
-        os.getenv('VERIFY_PROXIES', '').lower() != 'false'
-    )
-
+    # 4. 代理有效性验证
+    proxy_details = {}
     if should_verify:
         print(f"\n{'='*60}")
-        print(f"开始验证代理有效性 (方法: {VERIFICATION_METHOD})...")
+        print(f"开始验证代理有效性 (方法: {VERIFICATION_METHOD}{', 流式' if streaming else ''})...")
         print(f"⚠️  注意：验证会需要较长时间，但能确保代理质量")
         print(f"{'='*60}")
 
-        verified_proxies = []
         total_count = len(lproxy_list)
         start_verify_time = time.time()
 
-        for index, proxy_info in enumerate(lproxy_list, 1):
-            if not proxy_info or ':' not in proxy_info:
-                continue
-
-            # 显示进度
-            if index % 100 == 0 or index == 1:
+        def show_progress(index, total, valid):
+            if index % 100 == 0 or index == 1 or index == total:
                 elapsed = time.time() - start_verify_time
                 rate = index / elapsed if elapsed > 0 else 0
-                eta = (total_count - index) / rate if rate > 0 else 0
-                print(f"进度: {index}/{total_count} ({index/total_count*100:.1f}%) "
-                      f"- 已验证: {len(verified_proxies)} - "
+                eta = (total - index) / rate if rate > 0 else 0
+                print(f"进度: {index}/{total} ({index/total*100:.1f}%) "
+                      f"- 已验证: {valid} - "
                       f"速度: {rate:.1f} 代理/秒 - ETA: {eta/60:.1f} 分钟")
 
-            # 验证代理
-            try:
-                if check_proxy(proxy_info, method=VERIFICATION_METHOD):
-                    verified_proxies.append(proxy_info)
-                    if index <= 10:  # 只显示前10个通过验证的代理
-                        print(f"  ✓ 验证通过: {proxy_info}")
-            except Exception as e:
-                # 验证失败不影响整体流程
-                continue
+        if streamed_results is not None:
+            # 已在抓取时流式验证
+            cached_results = {p: r for p, r in streamed_results.items() if r.get('cached')}
+            checked_results = [r for r in streamed_results.values() if not r.get('cached')]
+        else:
+            candidates = [p for p in lproxy_list if p and ':' in p]
+            cached_results, checked_results = verify_batch(candidates, VERIFICATION_METHOD, verify_cache,
+                                                           show_progress)
+
+        if verify_cache:
+            verify_cache.put_many(checked_results)
+            verify_cache.purge()
+            verify_cache.close()
+
+        proxy_details = dict(cached_results)
+        proxy_details.update((r['proxy'], r) for r in checked_results)
+        verified_proxies = [p for p in lproxy_list if proxy_details.get(p, {}).get('valid')]
 
         verify_duration = time.time() - start_verify_time
         print(f"\n{'='*60}")
@@ -706,6 +797,16 @@ def runAllwork():
         print(f"   - 命令行: python proxyFetcher.py TOKEN --verify")
         print(f"   - 环境变量: export VERIFY_PROXIES=true")
         print(f"\n   ⚠️  注意：不验证会导致提交无效代理，影响数据质量！")
+
+    # 记录各源的产出（新增、验证通过数），用 python source_stats.py 查看汇总
+    if SOURCE_STATS_CONFIG['enabled']:
+        fetcher.stats.attribute(source_results, existing_proxies, proxy_details if should_verify else None)
+        fetcher.stats.save()
+
+    # 5. 生成 JSON 文件（使用验证后的列表和探测出的协议）
+    print(f"\n{'='*60}")
+    print(f"Generating JSON files...")
+    generate_json_files(lproxy_list, proxy_details)
     # 5.update data
     update_data = ""
     for _s in lproxy_list:
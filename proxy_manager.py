@@ -10,9 +10,12 @@ import sys
 from datetime import datetime
 from typing import List
 
-from config import PROXY_POOL_CONFIG, LOG_CONFIG, GITHUB_CONFIG
+from adaptive_concurrency import AIMDController
+from config import PROTOCOL_PROBE_CONFIG, PROXY_POOL_CONFIG, LOG_CONFIG, GITHUB_CONFIG, SOURCE_STATS_CONFIG
 from optimized_fetcher import OptimizedProxyFetcher
-from proxy_pool import ProxyPool
+from pipeline import ProxyPipeline
+from protocol_probe import detect_protocols, is_socks_only
+from proxy_pool import Proxy, ProxyPool
 from github_api import update_content, get_content
 
 
@@ -37,38 +40,72 @@ class ProxyManager:
         self.logger = logging.getLogger(__name__)
 
     async def fetch_and_validate(self) -> int:
-        """获取并验证代理"""
-        self.logger.info("开始获取代理...")
-
-        # 获取代理
-        proxies = await self.fetcher.fetch_all()
-        self.logger.info(f"获取到 {len(proxies)} 个原始代理")
-
-        if not proxies:
+        """获取并验证代理：各源抓取完成后代理立即进入验证队列，验证与抓取重叠进行"""
+        self.logger.info("开始获取并验证代理...")
+
+        async def validate(proxy_key: str) -> dict:
+            ip, port = proxy_key.split(':')
+            proxy = Proxy(ip=ip, port=int(port))
+            # 添加到池中（已禁用的代理不再验证）
+            if not self.pool.add_proxy(proxy):
+                return {'proxy': proxy_key, 'valid': False, 'response_time': 0.0, 'error': 'banned'}
+
+            protocols = []
+            response = None
+            if PROTOCOL_PROBE_CONFIG['enabled']:
+                probe = await detect_protocols(proxy_key)
+                protocols = probe['protocols']
+                response = probe['http_response']
+
+            # 快速验证（实测延迟计入响应时间的移动平均和代理源统计）
+            if is_socks_only(protocols):
+                # SOCKS 代理无法用HTTP请求检测，SOCKS 握手已经通过代理连到了目标地址，延迟取握手实测耗时
+                result = {'proxy': proxy_key, 'valid': True, 'response_time': probe['response_time'], 'error': ''}
+            elif response is not None:
+                # 协议探测已经通过代理请求过检测URL，直接按状态码判定，不再重复请求
+                valid = response['status'] == 200
+                result = {'proxy': proxy_key, 'valid': valid, 'response_time': round(response['response_time'], 3),
+                          'error': '' if valid else 'status'}
+            else:
+                result = await self.pool.check(proxy)
+            result['protocols'] = protocols
+
+            # await 期间代理可能已被淘汰（紧凑存储中的行还可能被复用），按键重新取出；未探测出协议时保留原值
+            pooled = self.pool.proxies.get(proxy_key)
+            if pooled is not None and protocols:
+                pooled.proxy_type = ','.join(protocols)
+            self.pool.record_check(proxy_key, result['valid'])
+            self.pool.update_proxy_score(proxy_key, success=result['valid'],
+                                         response_time=result['response_time'])
+            return result
+
+        # 并发上限与代理池共享会话的连接数上限一致，启用自适应并发时由AIMD控制器在此范围内调整
+        existing = set(self.pool.proxies)
+        connection_limit = PROXY_POOL_CONFIG.get('connection_limit', 100)
+        controller = None
+        if PROXY_POOL_CONFIG.get('adaptive_concurrency', False):
+            controller = AIMDController(max_limit=connection_limit)
+        pipeline = ProxyPipeline(self.fetcher, validate, workers=connection_limit, controller=controller)
+        outcome = await pipeline.run()
+        results = outcome['results']
+
+        if SOURCE_STATS_CONFIG['enabled']:
+            self.fetcher.stats.attribute(outcome['sources'], existing, results)
+            self.fetcher.stats.save()
+
+        if not results:
             self.logger.warning("未获取到任何代理")
             return 0
 
-        # 验证代理
-        self.logger.info("开始验证代理...")
-
-        valid_count = 0
-        for proxy in proxies:
-            # 添加到池中
-            self.pool.add_proxy(proxy)
-
-            # 快速验证
-            is_valid = await self.pool.health_check(proxy)
+        valid_count = sum(1 for r in results.values() if r['valid'])
+        self.logger.info(f"验证完成，有效代理: {valid_count}/{len(results)}")
 
-            if is_valid:
-                self.pool.update_proxy_score(proxy.proxy_url, success=True)
-                valid_count += 1
-            else:
-                self.pool.update_proxy_score(proxy.proxy_url, success=False)
-
-        self.logger.info(f"验证完成，有效代理: {valid_count}/{len(proxies)}")
-
-        # 执行批量健康检查
-        await self.pool.batch_health_check(max_concurrent=30)
+        # 只复检已到期的代理
+        await self.pool.batch_health_check(
+            max_concurrent=30,
+            adaptive=PROXY_POOL_CONFIG.get('adaptive_concurrency', False),
+            only_due=True
+        )
 
         # 保存代理池
         self.pool.save_to_file('proxy_pool.json')
@@ -155,7 +192,7 @@ class ProxyManager:
         print("-" * 80)
 
         for i, proxy in enumerate(best_proxies, 1):
-            print(f"{i:<6} {proxy.proxy_url:<25} {proxy.score:.2f}<8 {proxy.success_rate:.2%}<10 {proxy.response_time:.2f}s<10")
+            print(f"{i:<6} {proxy.proxy_url:<25} {self.pool.current_score(proxy):.2f}<8 {proxy.success_rate:.2%}<10 {proxy.response_time:.2f}s<10")
 
         print("-" * 80)
 
@@ -168,7 +205,10 @@ async def run_once():
     manager.pool.load_from_file('proxy_pool.json')
 
     # 获取并验证代理
-    exported_count = await manager.fetch_and_validate()
+    try:
+        exported_count = await manager.fetch_and_validate()
+    finally:
+        await manager.pool.close()
 
     # 打印统计信息
     manager.print_statistics()
@@ -218,6 +258,8 @@ async def run_continuously(interval_hours: int = 6):
             # 等待1小时后重试
             await asyncio.sleep(3600)
 
+    await manager.pool.close()
+
 
 def main():
     """主函数"""
@@ -5,15 +5,51 @@
 
 import time
 import json
+import heapq
 import logging
-from typing import List, Dict, Optional, Set
-from dataclasses import dataclass, asdict
+import math
+import struct
+from array import array
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timedelta
 import asyncio
 import aiohttp
 
+from adaptive_concurrency import AIMDController, gather_adaptive, is_fd_pressure
+from async_checker import async_tcp_prefilter
+from ban_list import BanList
+from config import PROXY_CHECK_CONFIG
+from weighted_sampler import WeightedSampler
+
 logger = logging.getLogger(__name__)
 
+_FLOAT64 = struct.Struct('<d')
+_INT64 = struct.Struct('<q')
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+
+def _ordered(value: float) -> int:
+    """float 映射为大小顺序相同的64位整数"""
+    bits = _INT64.unpack(_FLOAT64.pack(value))[0]
+    return bits if bits >= 0 else bits ^ 0x7FFFFFFFFFFFFFFF
+
+
+def _heap_entry(value: float, slot: int) -> int:
+    """(值, 行号) 打包为一个整数作为堆条目，排序与元组相同，内存不到元组的一半"""
+    return _ordered(value) << _SLOT_BITS | slot
+
+
+def _rank_entry(decay_key: float, success_rate: float, slot: int) -> int:
+    """排行堆条目：按 (衰减键, 成功率) 降序、行号升序排列（成功率不小于0）"""
+    return -_ordered(decay_key) << 96 | ((1 << 63) - _ordered(success_rate)) << _SLOT_BITS | slot
+
+
+def _live(entry: int, column: array) -> bool:
+    """堆条目中的值是否仍与该行在列中的当前值一致（不一致的是惰性删除留下的过期条目）"""
+    return entry >> _SLOT_BITS == _ordered(column[entry & _SLOT_MASK])
+
 
 @dataclass
 class Proxy:
@@ -25,10 +61,12 @@ class Proxy:
     fail_count: int = 0
     last_success_time: Optional[datetime] = None
     last_fail_time: Optional[datetime] = None
-    response_time: float = 0.0
+    response_time: float = 0.0  # 响应时间的指数加权移动平均（秒）
     country: str = ''
     anonymity: str = ''
     proxy_type: str = 'http'
+    success_ewma: float = 1.0  # 检测成功率的指数加权移动平均
+    scored_at: float = field(default_factory=time.time)  # score 的计算时间（epoch 秒），读取时按此衰减
 
     @property
     def success_rate(self) -> float:
@@ -38,11 +76,21 @@ class Proxy:
             return 0.0
         return self.success_count / total
 
+    @property
+    def checked(self) -> bool:
+        """是否带有检测数据"""
+        return self.success_count + self.fail_count > 0
+
     @property
     def is_valid(self) -> bool:
         """检查代理是否有效"""
         return self.score >= 0.3 and self.success_rate >= 0.5
 
+    @property
+    def protocols(self) -> List[str]:
+        """代理支持的协议列表（proxy_type 以逗号分隔保存探测结果）"""
+        return [p for p in self.proxy_type.split(',') if p]
+
     @property
     def proxy_url(self) -> str:
         """获取代理URL"""
@@ -54,9 +102,60 @@ class ProxyPool:
 
     def __init__(self, config: Dict):
         self.config = config
-        self.proxies: Dict[str, Proxy] = {}
-        self.banned_proxies: Set[str] = set()
+        # ip:port → Proxy；config['store'] 为 'array' 时使用紧凑列式存储（见 proxy_store.py），接口相同
+        self.proxies: Dict[str, Proxy] = self._new_store()
+        # 禁用列表：禁用有期限且按禁用次数指数退避，到期的代理可以重新加入
+        self.banned_proxies = BanList(config)
         self.last_health_check = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 评分随时间按半衰期衰减：所有代理衰减速度相同，索引按与时间无关的
+        # 衰减键 log2(score) + scored_at / half_life 排序，读取时才计算当前评分，无需定期遍历全池
+        self._half_life = config.get('score_half_life', 6 * 3600)
+        self._reset_index()
+
+    def _reset_index(self):
+        """
+        清空调度和评分索引。索引按代理在存储中的行号（proxies.slot_of）保存：每项状态是一个 array 列，
+        抽样集合中只存行号，堆条目是 (值, 行号) 打包成的整数，不再为每个代理保存多份字符串键的字典条目和元组
+        """
+        # 复检调度：下次到期时间（0 为未安排）、连续成功次数，以及按到期时间排序的小顶堆（惰性删除，以列中的值为准）
+        self._next_check = array('d')
+        self._check_streak = array('i')
+        self._recheck_heap: List[int] = []
+        # 评分索引：按衰减键排序的小顶堆（惰性删除，以 _indexed_score 为准，nan 为未索引），淘汰最低分代理为 O(log n)
+        self._indexed_score = array('d')
+        self._score_heap: List[int] = []
+        # 有效代理集合（按当前评分加权抽样）和按 (衰减键, 成功率) 降序排列的排行，随评分变化增量维护；
+        # 抽样权重为 2^(衰减键 - _decay_base / half_life)，与当前评分成正比。
+        # 排行是按 (衰减键, 成功率) 降序排列的堆（见 _rank_entry），另有按衰减键排列的小顶堆用于找出衰减到
+        # min_score 以下的代理，两者都惰性删除（以 _rank_score/_rank_rate 为准，nan 为不在排行中），每次更新为 O(log n)
+        self._valid = WeightedSampler()
+        self._rank_score = array('d')
+        self._rank_rate = array('d')
+        self._ranking: List[int] = []
+        self._valid_heap: List[int] = []
+        self._decay_base = time.time()
+
+    def _index_slot(self, proxy_key: str) -> Optional[int]:
+        """代理的行号（不在池中时为 None），索引列按需扩展到该行"""
+        slot = self.proxies.slot_of(proxy_key)
+        if slot is not None and slot >= len(self._next_check):
+            grow = slot + 1 - len(self._next_check)
+            self._next_check.extend(array('d', [0.0]) * grow)
+            self._check_streak.extend(array('i', [0]) * grow)
+            for column in (self._indexed_score, self._rank_score, self._rank_rate):
+                column.extend(array('d', [math.nan]) * grow)
+        return slot
+
+    def _proxy_at(self, slot: int) -> Proxy:
+        return self.proxies[self.proxies.key_at(slot)]
+
+    def _new_store(self):
+        """按配置创建代理存储"""
+        # proxy_store 依赖本模块的 Proxy，延迟导入避免循环引用
+        from proxy_store import create_store
+        return create_store(self.config.get('store', 'dict'))
 
     def add_proxy(self, proxy: Proxy) -> bool:
         """添加代理到池中"""
@@ -66,14 +165,11 @@ class ProxyPool:
         if proxy_key in self.banned_proxies:
             return False
 
-        # 检查是否超出最大容量
-        if len(self.proxies) >= self.config['max_size']:
-            # 移除评分最低的代理
-            min_score_proxy = min(self.proxies.values(), key=lambda p: p.score)
-            del self.proxies[min_score_proxy.proxy_url]
-
         # 检查是否已存在
         if proxy_key in self.proxies:
+            # 代理源每次运行都会重新列出同一代理，未检测过的新对象不能覆盖已有的检测数据和评分
+            if not proxy.checked:
+                return True
             existing = self.proxies[proxy_key]
             # 更新评分
             existing.success_count = proxy.success_count
@@ -81,15 +177,196 @@ class ProxyPool:
             existing.response_time = proxy.response_time
             existing.last_success_time = proxy.last_success_time
             existing.last_fail_time = proxy.last_fail_time
+            existing.success_ewma = proxy.success_ewma
+            existing.score = proxy.score
+            existing.scored_at = proxy.scored_at
+            self._reindex(proxy_key)
             return True
 
+        # 检查是否超出最大容量
+        if len(self.proxies) >= self.config['max_size']:
+            # 移除评分最低的代理
+            lowest = self._lowest_score_key()
+            if lowest is not None:
+                self.remove_proxy(lowest)
+
+        if not proxy.checked:
+            # 未检测过的代理从先验评分开始，不能排在已实测可用的代理前面
+            proxy.score = self.config.get('initial_score', 0.5)
+            proxy.scored_at = time.time()
         self.proxies[proxy_key] = proxy
+        self._reindex(proxy_key)
+        # 新代理立即到期，下一轮复检时优先验证
+        self.schedule_check(proxy_key, 0)
         return True
 
     def remove_proxy(self, proxy_key: str):
-        """移除代理"""
-        if proxy_key in self.proxies:
-            del self.proxies[proxy_key]
+        """移除代理（行号会被复用，先清空该行的索引状态；堆中的条目留到弹出时跳过）"""
+        slot = self._index_slot(proxy_key)
+        if slot is None:
+            return
+        self._next_check[slot] = 0.0
+        self._check_streak[slot] = 0
+        self._indexed_score[slot] = math.nan
+        self._unrank(slot)
+        del self.proxies[proxy_key]
+
+    def _unrank(self, slot: int):
+        """从有效代理集合和排行中移除"""
+        self._valid.discard(slot)
+        # 堆中的条目留到弹出时跳过
+        self._rank_score[slot] = math.nan
+
+    def _rank(self, slot: int, decay_key: float, success_rate: float):
+        """加入排行（排序键未变时不重复入堆）"""
+        if self._rank_score[slot] == decay_key and self._rank_rate[slot] == success_rate:
+            return
+        self._rank_score[slot] = decay_key
+        self._rank_rate[slot] = success_rate
+        heapq.heappush(self._ranking, _rank_entry(decay_key, success_rate, slot))
+        heapq.heappush(self._valid_heap, _heap_entry(decay_key, slot))
+        # 过期条目太多时重建堆，避免堆无限增长（排行中的代理即有效代理集合）
+        if len(self._ranking) > 2 * len(self._valid) + 64:
+            self._ranking = [self._rank_entry_at(i) for i in self._valid]
+            heapq.heapify(self._ranking)
+        if len(self._valid_heap) > 2 * len(self._valid) + 64:
+            self._valid_heap = [_heap_entry(self._rank_score[i], i) for i in self._valid]
+            heapq.heapify(self._valid_heap)
+
+    def _rank_entry_at(self, slot: int) -> int:
+        """该行当前排序键对应的排行堆条目"""
+        return _rank_entry(self._rank_score[slot], self._rank_rate[slot], slot)
+
+    def _decay_key(self, proxy: Proxy) -> float:
+        """与时间无关的排序键：当前评分 = 2^(键 - 当前时间 / half_life)"""
+        return math.log2(max(proxy.score, 1e-9)) + proxy.scored_at / self._half_life
+
+    def _valid_threshold(self, now: float) -> float:
+        """当前评分不低于 min_score 的代理，其衰减键不低于此值"""
+        return math.log2(self.config.get('min_score', 0.3)) + now / self._half_life
+
+    def current_score(self, proxy: Proxy, now: Optional[float] = None) -> float:
+        """按距上次评分的时间衰减后的当前评分"""
+        now = now or time.time()
+        return proxy.score * 0.5 ** (max(0.0, now - proxy.scored_at) / self._half_life)
+
+    def _reindex(self, proxy_key: str):
+        """代理评分或成功率变化后更新评分索引、有效代理集合和排行（评分索引的旧条目留在堆中，弹出时跳过）"""
+        slot = self._index_slot(proxy_key)
+        proxy = self.proxies[proxy_key]
+        decay_key = self._decay_key(proxy)
+        self._indexed_score[slot] = decay_key
+        heapq.heappush(self._score_heap, _heap_entry(decay_key, slot))
+        # 过期条目太多时重建堆，避免堆无限增长
+        if len(self._score_heap) > 2 * len(self.proxies) + 64:
+            self._score_heap = [_heap_entry(self._indexed_score[i], i) for i in self.proxies.slots()]
+            heapq.heapify(self._score_heap)
+
+        if proxy.is_valid and decay_key >= self._valid_threshold(time.time()):
+            self._valid.set(slot, 2 ** (decay_key - self._decay_base / self._half_life))
+            self._rank(slot, decay_key, proxy.success_rate)
+        else:
+            self._unrank(slot)
+
+    def _rebuild_score_index(self):
+        """按当前评分重建评分索引、有效代理集合和排行"""
+        now = time.time()
+        threshold = self._valid_threshold(now)
+        self._decay_base = now
+        self._valid.clear()
+        self._score_heap = []
+        self._ranking = []
+        self._valid_heap = []
+        for key, proxy in self.proxies.items():
+            slot = self._index_slot(key)
+            decay_key = self._decay_key(proxy)
+            self._indexed_score[slot] = decay_key
+            self._score_heap.append(_heap_entry(decay_key, slot))
+            self._rank_score[slot] = math.nan
+            if proxy.is_valid and decay_key >= threshold:
+                self._valid.set(slot, 2 ** (decay_key - now / self._half_life))
+                self._rank_score[slot] = decay_key
+                self._rank_rate[slot] = proxy.success_rate
+                self._ranking.append(_rank_entry(decay_key, proxy.success_rate, slot))
+                self._valid_heap.append(_heap_entry(decay_key, slot))
+        heapq.heapify(self._score_heap)
+        heapq.heapify(self._ranking)
+        heapq.heapify(self._valid_heap)
+
+    def _prune_decayed(self, now: Optional[float] = None):
+        """把当前评分已衰减到 min_score 以下的代理移出有效集合（按衰减键从小到大弹出，只处理这些代理）"""
+        now = now or time.time()
+        # 抽样权重相对 _decay_base 增长，间隔太久时重新计算避免浮点溢出
+        if now - self._decay_base > 32 * self._half_life:
+            self._rebuild_score_index()
+            return
+        threshold = self._valid_threshold(now)
+        threshold = _ordered(threshold)
+        while self._valid_heap and self._valid_heap[0] >> _SLOT_BITS < threshold:
+            entry = heapq.heappop(self._valid_heap)
+            if _live(entry, self._rank_score):
+                self._unrank(entry & _SLOT_MASK)
+
+    def _lowest_score_key(self) -> Optional[str]:
+        """评分最低的代理，池为空时返回 None"""
+        while self._score_heap:
+            entry = self._score_heap[0]
+            if _live(entry, self._indexed_score):
+                return self.proxies.key_at(entry & _SLOT_MASK)
+            # 跳过已移除或评分已变化的过期条目
+            heapq.heappop(self._score_heap)
+        return None
+
+    def schedule_check(self, proxy_key: str, delay: float):
+        """安排代理在 delay 秒后复检"""
+        slot = self._index_slot(proxy_key)
+        if slot is None:
+            return
+        due = time.time() + delay
+        self._next_check[slot] = due
+        heapq.heappush(self._recheck_heap, _heap_entry(due, slot))
+        # 过期条目太多时重建堆，避免堆无限增长（每个代理最多一个有效条目）
+        if len(self._recheck_heap) > 2 * len(self.proxies) + 64:
+            self._recheck_heap = [_heap_entry(self._next_check[i], i) for i in self.proxies.slots() if self._next_check[i]]
+            heapq.heapify(self._recheck_heap)
+
+    def recheck_interval(self, proxy_key: str) -> float:
+        """
+        计算复检间隔：刚失败或不稳定的代理尽快复检，
+        连续成功的代理间隔按指数增长，上限为 max_check_interval
+        """
+        base = self.config.get('health_check_interval', 300)
+        slot = self._index_slot(proxy_key)
+        streak = self._check_streak[slot] if slot is not None else 0
+        if streak <= 0:
+            return base / 4
+        proxy = self.proxies.get(proxy_key)
+        if proxy is not None and proxy.fail_count and proxy.success_rate < 0.8:
+            return base / 2
+        return min(base * 2 ** (streak - 1), self.config.get('max_check_interval', base * 8))
+
+    def record_check(self, proxy_key: str, success: bool):
+        """记录一次复检结果，并据此安排下次复检"""
+        slot = self._index_slot(proxy_key)
+        if slot is None:
+            return
+        self._check_streak[slot] = self._check_streak[slot] + 1 if success else 0
+        self.schedule_check(proxy_key, self.recheck_interval(proxy_key))
+
+    def pop_due_proxies(self, now: Optional[float] = None) -> List[Proxy]:
+        """弹出所有已到期的代理"""
+        now = now or time.time()
+        due_proxies = []
+        limit = _ordered(now)
+        while self._recheck_heap and self._recheck_heap[0] >> _SLOT_BITS <= limit:
+            entry = heapq.heappop(self._recheck_heap)
+            # 跳过已移除或已被重新安排的过期条目
+            if not _live(entry, self._next_check):
+                continue
+            slot = entry & _SLOT_MASK
+            self._next_check[slot] = 0.0
+            due_proxies.append(self._proxy_at(slot))
+        return due_proxies
 
     def update_proxy_score(self, proxy_key: str, success: bool, response_time: float = 0):
         """更新代理评分"""
@@ -98,18 +375,29 @@ class ProxyPool:
 
         proxy = self.proxies[proxy_key]
         now = datetime.now()
+        alpha = self.config.get('ewma_alpha', 0.3)
+        # 第一次检测结果直接作为初始值，不与先验值混合
+        first_check = not proxy.checked
 
         if success:
             proxy.success_count += 1
             proxy.last_success_time = now
-            proxy.response_time = response_time
-            # 成功时增加评分
-            proxy.score = min(1.0, proxy.score + 0.1)
+            if response_time > 0:
+                # 第一次测得的延迟直接作为初始值
+                proxy.response_time = (response_time if proxy.response_time <= 0
+                                       else (1 - alpha) * proxy.response_time + alpha * response_time)
         else:
             proxy.fail_count += 1
             proxy.last_fail_time = now
-            # 失败时减少评分
-            proxy.score = max(0.0, proxy.score - 0.2)
+        outcome = 1.0 if success else 0.0
+        proxy.success_ewma = outcome if first_check else (1 - alpha) * proxy.success_ewma + alpha * outcome
+
+        # 评分 = 成功率EWMA × 延迟系数，延迟系数最低为 1 - latency_weight（延迟未知时为1）
+        latency_ref = self.config.get('latency_ref', 2.0)
+        latency_penalty = proxy.response_time / (proxy.response_time + latency_ref) if proxy.response_time > 0 else 0.0
+        proxy.score = proxy.success_ewma * (1 - self.config.get('latency_weight', 0.5) * latency_penalty)
+        proxy.scored_at = now.timestamp()
+        self._reindex(proxy_key)
 
         # 检查是否需要禁用
         if proxy.fail_count >= self.config['ban_threshold']:
@@ -117,96 +405,202 @@ class ProxyPool:
 
     def ban_proxy(self, proxy_key: str):
         """禁用代理"""
-        self.banned_proxies.add(proxy_key)
+        ttl = self.banned_proxies.ban(proxy_key)
         self.remove_proxy(proxy_key)
-        logger.warning(f"代理已禁用: {proxy_key}")
+        logger.warning(f"代理已禁用: {proxy_key}，{ttl / 60:.0f} 分钟后解禁")
 
     def decay_scores(self):
-        """评分衰减"""
-        decay_factor = self.config['score_decay']
-        for proxy in self.proxies.values():
-            proxy.score *= decay_factor
+        """
+        评分衰减：评分按 score_half_life 随时间衰减，读取时计算（见 current_score），
+        这里只把已衰减到阈值以下的代理移出有效集合，开销与移出的代理数成正比
+        """
+        self._prune_decayed()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取代理池共享的会话（同一事件循环内复用连接器和DNS缓存）"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.get('connection_limit', 100),
+                ttl_dns_cache=self.config.get('dns_cache_ttl', 300),
+                # 每个代理都是不同的主机，连接无法复用，强制关闭避免占用文件描述符
+                force_close=True,
+                ssl=False,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        """关闭共享会话"""
+        if self._session and not self._session.closed and self._session_loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def _probe(self, proxy: Proxy) -> Tuple[bool, Optional[BaseException]]:
+        """检测代理，返回 (是否可用, 最后一次异常)"""
+        test_urls = self.config.get('test_urls', PROXY_CHECK_CONFIG['test_urls'][:1])
+        timeout = aiohttp.ClientTimeout(total=self.config.get('check_timeout', PROXY_CHECK_CONFIG['timeout']))
+        # await 之前取出键：紧凑存储中的视图在代理被删除、行被复用后会指向其他代理
+        proxy_key = proxy.proxy_url
+        session = await self.get_session()
+        last_error = None
+
+        for test_url in test_urls:
+            try:
+                async with session.get(test_url, proxy=f"http://{proxy_key}", timeout=timeout) as response:
+                    if response.status == 200:
+                        self._mark_checked(proxy_key, proxy, True)
+                        return True, None
+            except Exception as e:
+                last_error = e
+                continue
+
+        self._mark_checked(proxy_key, proxy, False)
+        return False, last_error
+
+    def _mark_checked(self, proxy_key: str, proxy: Proxy, success: bool):
+        """记录检测时间：按键重新取出池中的代理；不在池中时只写入调用方传入的普通 Proxy 对象（不写失效的视图）"""
+        target = self.proxies.get(proxy_key)
+        if target is None and type(proxy) is Proxy:
+            target = proxy
+        if target is None:
+            return
+        if success:
+            target.last_success_time = datetime.now()
+        else:
+            target.last_fail_time = datetime.now()
 
     async def health_check(self, proxy: Proxy) -> bool:
         """健康检查"""
-        test_urls = self.config.get('test_urls', ['http://httpbin.org/ip'])
-
-        async with aiohttp.ClientSession() as session:
-            for test_url in test_urls:
-                try:
-                    proxy_url = f"http://{proxy.ip}:{proxy.port}"
-                    async with session.get(
-                        test_url,
-                        proxy=proxy_url,
-                        timeout=aiohttp.ClientTimeout(total=5),
-                        ssl=False
-                    ) as response:
-                        if response.status == 200:
-                            proxy.last_success_time = datetime.now()
-                            return True
-                except:
-                    continue
-
-        proxy.last_fail_time = datetime.now()
-        return False
-
-    async def batch_health_check(self, max_concurrent: int = 20):
-        """批量健康检查"""
+        is_valid, _ = await self._probe(proxy)
+        return is_valid
+
+    async def check(self, proxy: Proxy) -> Dict:
+        """健康检查并返回详细结果 {'proxy', 'valid', 'response_time', 'error'}，格式与 AsyncProxyChecker.check 一致"""
+        start_time = time.monotonic()
+        is_valid, error = await self._probe(proxy)
+        result = {'proxy': proxy.proxy_url, 'valid': is_valid,
+                  'response_time': round(time.monotonic() - start_time, 3), 'error': ''}
+        if not is_valid:
+            if isinstance(error, asyncio.TimeoutError):
+                result['error'] = 'timeout'
+            elif error is not None:
+                result['error'] = 'fd_pressure' if is_fd_pressure(error) else type(error).__name__
+            else:
+                result['error'] = 'status'
+        return result
+
+    async def batch_health_check(self, max_concurrent: int = 20, prefilter: Optional[bool] = None,
+                                 adaptive: bool = False, only_due: bool = False):
+        """
+        批量健康检查
+        prefilter 为 True 时只对TCP可连通的代理做HTTP检查；
+        adaptive 为 True 时以 max_concurrent 为初始值，由AIMD控制器自动调整并发；
+        only_due 为 True 时只复检已到期的代理，每轮开销与代理变化量成正比而不是与池大小成正比
+        """
         if not self.proxies:
             return
 
-        logger.info(f"开始批量健康检查，共 {len(self.proxies)} 个代理")
+        # 只保留键：检测期间代理可能被移除（紧凑存储中的行还可能被新代理复用），await 之后按键重新取出代理
+        due = self.pop_due_proxies() if only_due else self.proxies.values()
+        checked = [proxy.proxy_url for proxy in due]
+        self.last_health_check = time.time()
+        if not checked:
+            logger.info("没有到期需要复检的代理")
+            return
+
+        logger.info(f"开始批量健康检查，共 {len(checked)}/{len(self.proxies)} 个代理")
+        keys = checked
+        if prefilter is None:
+            prefilter = self.config.get('tcp_prefilter', PROXY_CHECK_CONFIG['tcp_prefilter'])
+        if prefilter:
+            reachable = set(await async_tcp_prefilter(keys))
+            now = datetime.now()
+            for proxy_key in keys:
+                if proxy_key not in reachable and proxy_key in self.proxies:
+                    self.proxies[proxy_key].last_fail_time = now
+            keys = [k for k in keys if k in reachable]
+
+        if adaptive:
+            # 共享连接器的连接数上限即为自适应并发的上限
+            controller = AIMDController(initial=max_concurrent, max_limit=self.config.get('connection_limit', 100))
+            timeout_threshold = self.config.get('check_timeout', PROXY_CHECK_CONFIG['timeout']) * 0.95
+
+            async def adaptive_wrapper(proxy_key):
+                proxy = self.proxies.get(proxy_key)
+                if proxy is None:
+                    return False
+                start_time = time.monotonic()
+                is_valid, error = await self._probe(proxy)
+                elapsed = time.monotonic() - start_time
+                controller.record(elapsed, is_valid,
+                                  timeout=not is_valid and elapsed >= timeout_threshold,
+                                  overload=error is not None and is_fd_pressure(error))
+                return is_valid
+
+            results = await gather_adaptive(controller, keys, adaptive_wrapper)
+            logger.info(f"自适应并发结束时的并发上限: {controller.limit}")
+        else:
+            semaphore = asyncio.Semaphore(max_concurrent)
 
-        semaphore = asyncio.Semaphore(max_concurrent)
+            async def check_proxy_wrapper(proxy_key):
+                async with semaphore:
+                    proxy = self.proxies.get(proxy_key)
+                    return await self.health_check(proxy) if proxy is not None else False
 
-        async def check_proxy_wrapper(proxy):
-            async with semaphore:
-                return await self.health_check(proxy)
+            tasks = [check_proxy_wrapper(proxy_key) for proxy_key in keys]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
 
-        tasks = [check_proxy_wrapper(proxy) for proxy in self.proxies.values()]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        passed = {proxy_key for proxy_key, r in zip(keys, results) if r is True}
+        for proxy_key in checked:
+            self.record_check(proxy_key, proxy_key in passed)
 
-        valid_count = sum(1 for r in results if r is True)
-        logger.info(f"健康检查完成，有效代理: {valid_count}/{len(self.proxies)}")
+        logger.info(f"健康检查完成，有效代理: {len(passed)}/{len(checked)}")
 
     def get_best_proxies(self, count: int = 10) -> List[Proxy]:
-        """获取最佳代理列表"""
-        valid_proxies = [p for p in self.proxies.values() if p.is_valid]
-        # 按评分和成功率排序
-        sorted_proxies = sorted(
-            valid_proxies,
-            key=lambda p: (p.score, p.success_rate),
-            reverse=True
-        )
-        return sorted_proxies[:count]
-
-    def get_random_proxy(self) -> Optional[Proxy]:
-        """随机获取一个有效代理"""
-        valid_proxies = [p for p in self.proxies.values() if p.is_valid]
-        if not valid_proxies:
-            return None
-        import random
-        return random.choice(valid_proxies)
+        """获取最佳代理列表（按当前评分和成功率排序）"""
+        self._prune_decayed()
+        # 依次弹出排行最前的有效条目（顺带丢弃过期条目），取完后放回，为 O(count log n)
+        best = []
+        while self._ranking and len(best) < count:
+            entry = heapq.heappop(self._ranking)
+            # 同一行可能有排序键相同的重复条目，只保留一个
+            if entry == self._rank_entry_at(entry & _SLOT_MASK) and (not best or best[-1] != entry):
+                best.append(entry)
+        for entry in best:
+            heapq.heappush(self._ranking, entry)
+        return [self._proxy_at(entry & _SLOT_MASK) for entry in best]
+
+    def get_random_proxy(self, weighted: bool = False) -> Optional[Proxy]:
+        """随机获取一个有效代理；weighted 为 True 时按当前评分加权"""
+        self._prune_decayed()
+        slot = self._valid.sample() if weighted else self._valid.choice()
+        return self._proxy_at(slot) if slot is not None else None
 
     def get_statistics(self) -> Dict:
         """获取统计信息"""
+        self._prune_decayed()
         total = len(self.proxies)
-        valid = sum(1 for p in self.proxies.values() if p.is_valid)
+        valid = len(self._valid)
         banned = len(self.banned_proxies)
 
         return {
             'total_proxies': total,
             'valid_proxies': valid,
             'banned_proxies': banned,
-            'success_rate': sum(p.success_rate for p in self.proxies.values()) / max(total, 1),
-            'avg_score': sum(p.score for p in self.proxies.values()) / max(total, 1),
+            'success_rate': self.proxies.mean_success_rate(),
+            'avg_score': self.proxies.mean_score(time.time(), self._half_life),
         }
 
     def save_to_file(self, filename: str = 'proxy_pool.json'):
         """保存代理池到文件"""
         data = {
             'proxies': {k: asdict(v) for k, v in self.proxies.items()},
+            # 旧版本只读取当前禁用的代理列表，完整的禁用记录保存在 ban_list
             'banned_proxies': list(self.banned_proxies),
+            'ban_list': self.banned_proxies.to_dict(),
             'timestamp': datetime.now().isoformat(),
         }
 
@@ -235,11 +629,25 @@ class ProxyPool:
                 if proxy_data['last_fail_time']:
                     proxy_data['last_fail_time'] = datetime.fromisoformat(proxy_data['last_fail_time'])
 
-            self.proxies = {}
+            self.proxies = self._new_store()
+            self._reset_index()
             for k, v in data.get('proxies', {}).items():
-                self.proxies[k] = Proxy(**v)
-
-            self.banned_proxies = set(data.get('banned_proxies', []))
+                proxy = Proxy(**v)
+                self.proxies[k] = proxy
+                # 根据最近一次检测结果恢复复检计划
+                last_success = proxy.last_success_time.timestamp() if proxy.last_success_time else 0
+                last_fail = proxy.last_fail_time.timestamp() if proxy.last_fail_time else 0
+                if not last_success and not last_fail:
+                    self.schedule_check(k, 0)
+                    continue
+                self._check_streak[self._index_slot(k)] = 1 if last_success > last_fail else 0
+                elapsed = time.time() - max(last_success, last_fail)
+                self.schedule_check(k, max(0.0, self.recheck_interval(k) - elapsed))
+            self._rebuild_score_index()
+
+            # 旧版本文件只有永久禁用的代理列表，按首次禁用处理
+            self.banned_proxies = BanList(self.config)
+            self.banned_proxies.load(data.get('ban_list'), data.get('banned_proxies', []))
 
             logger.info(f"已从文件加载代理池: {len(self.proxies)} 个代理")
             return True
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+代理池的紧凑列式存储
+每个字段一个 array：IPv4 打包为 uint32、端口 uint16、评分/延迟 float32、计数 uint32、时间为 epoch 秒，
+国家/匿名度/协议等重复值多的字符串存为字典编码；ip:port 到行号的索引为数组实现的开放寻址哈希表。
+列数据每个代理约占 70 字节（Proxy 对象连同字典条目约 500 字节）。注意这只是存储本身：ProxyPool 的复检调度、
+评分索引、排行和抽样集合按行号另存，每个代理还需约 600 字节，整个代理池每个代理约 0.7KB
+（20万代理约 130MB，dict 存储约 220MB），百万级代理约需 700MB。
+
+ArrayProxyStore 提供与 Dict[str, Proxy] 相同的映射接口，取出的是直接读写数组的 StoredProxy 视图，
+ProxyPool 的其余代码无需区分存储方式（PROXY_POOL_CONFIG['store'] = 'array' 启用）。
+两种存储都给每个代理分配可复用的行号（slot_of/key_at/slots），代理池的索引按行号保存
+"""
+
+import socket
+import struct
+from array import array
+from collections.abc import MutableMapping
+from dataclasses import fields
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from proxy_pool import Proxy
+
+# 列名 → array 类型码
+NUMERIC_COLUMNS = {
+    'ip': 'I',
+    'port': 'H',
+    'score': 'f',
+    'success_count': 'I',
+    'fail_count': 'I',
+    'response_time': 'f',
+    'last_success_time': 'd',
+    'last_fail_time': 'd',
+    'success_ewma': 'f',
+    'scored_at': 'd',
+}
+# 字典编码的字符串列
+CATEGORY_COLUMNS = ('country', 'anonymity', 'proxy_type')
+TIME_COLUMNS = ('last_success_time', 'last_fail_time')
+
+_EMPTY = 0
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+def pack_ip(ip: str) -> int:
+    """IPv4 地址打包为 uint32"""
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def unpack_ip(value: int) -> str:
+    """uint32 还原为 IPv4 地址"""
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def _packed_key(proxy_key: str) -> int:
+    ip, port = proxy_key.rsplit(':', 1)
+    return pack_ip(ip) << 16 | int(port)
+
+
+class StoredProxy(Proxy):
+    """ArrayProxyStore 中一行的视图，读写属性直接访问列数组（行被删除后视图失效）"""
+
+    def __init__(self, store: 'ArrayProxyStore', slot: int):
+        self._store = store
+        self._slot = slot
+
+    def detach(self) -> Proxy:
+        """复制为普通 Proxy 对象"""
+        return Proxy(**{name: getattr(self, name) for name in _FIELD_NAMES})
+
+
+def _column_property(name: str) -> property:
+    return property(lambda self: self._store.get_field(self._slot, name),
+                    lambda self, value: self._store.set_field(self._slot, name, value))
+
+
+_FIELD_NAMES = tuple(f.name for f in fields(Proxy))
+for _name in _FIELD_NAMES:
+    setattr(StoredProxy, _name, _column_property(_name))
+
+
+class ArrayProxyStore(MutableMapping):
+    """列式代理存储：ip:port → StoredProxy"""
+
+    def __init__(self):
+        self._columns: Dict[str, array] = {name: array(code) for name, code in NUMERIC_COLUMNS.items()}
+        for name in CATEGORY_COLUMNS:
+            self._columns[name] = array('H')
+        self._categories: Dict[str, List[str]] = {name: [''] for name in CATEGORY_COLUMNS}
+        self._category_codes: Dict[str, Dict[str, int]] = {name: {'': 0} for name in CATEGORY_COLUMNS}
+        self._live = array('B')
+        self._free: List[int] = []
+        self._count = 0
+        # 开放寻址哈希表（线性探测），保存 行号 + 1，0 表示空位
+        self._table = array('i', [_EMPTY]) * 8
+        self._bits = 3
+
+    # ---- 哈希索引 ----
+
+    def _home(self, packed: int) -> int:
+        return ((packed * _HASH_MULTIPLIER) & _MASK64) >> (64 - self._bits)
+
+    def _packed_at(self, slot: int) -> int:
+        return self._columns['ip'][slot] << 16 | self._columns['port'][slot]
+
+    def _find(self, packed: int) -> int:
+        """返回哈希表中该键的位置，或应插入的空位"""
+        mask = len(self._table) - 1
+        index = self._home(packed)
+        while True:
+            entry = self._table[index]
+            if entry == _EMPTY or self._packed_at(entry - 1) == packed:
+                return index
+            index = (index + 1) & mask
+
+    def _resize(self, bits: int):
+        self._bits = bits
+        self._table = array('i', [_EMPTY]) * (1 << bits)
+        mask = len(self._table) - 1
+        for slot, live in enumerate(self._live):
+            if live:
+                index = self._home(self._packed_at(slot))
+                while self._table[index] != _EMPTY:
+                    index = (index + 1) & mask
+                self._table[index] = slot + 1
+
+    def _unlink(self, index: int):
+        """删除哈希表位置 index 上的条目，并把后面同一探测链上的条目前移（不使用墓碑）"""
+        mask = len(self._table) - 1
+        self._table[index] = _EMPTY
+        hole = index
+        probe = index
+        while True:
+            probe = (probe + 1) & mask
+            entry = self._table[probe]
+            if entry == _EMPTY:
+                return
+            home = self._home(self._packed_at(entry - 1))
+            # home 位于 (hole, probe] 之间（环形）时条目无需移动
+            if (hole < probe and hole < home <= probe) or (hole > probe and (home > hole or home <= probe)):
+                continue
+            self._table[hole] = entry
+            self._table[probe] = _EMPTY
+            hole = probe
+
+    def slot_of(self, proxy_key: str) -> Optional[int]:
+        """代理所在的行号，不存在时返回 None"""
+        try:
+            packed = _packed_key(proxy_key)
+        except (ValueError, OSError):
+            return None
+        entry = self._table[self._find(packed)]
+        return None if entry == _EMPTY else entry - 1
+
+    # ---- 字段读写 ----
+
+    def get_field(self, slot: int, name: str):
+        value = self._columns[name][slot]
+        if name == 'ip':
+            return unpack_ip(value)
+        if name in TIME_COLUMNS:
+            return datetime.fromtimestamp(value) if value else None
+        if name in self._categories:
+            return self._categories[name][value]
+        return value
+
+    def set_field(self, slot: int, name: str, value):
+        if name in ('ip', 'port'):
+            raise AttributeError('ip/port 是存储的键，不能修改')
+        if name in TIME_COLUMNS:
+            value = value.timestamp() if value else 0.0
+        elif name in self._categories:
+            codes = self._category_codes[name]
+            value = value or ''
+            if value not in codes:
+                codes[value] = len(self._categories[name])
+                self._categories[name].append(value)
+            value = codes[value]
+        self._columns[name][slot] = value
+
+    # ---- 映射接口 ----
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, proxy_key) -> bool:
+        return isinstance(proxy_key, str) and self.slot_of(proxy_key) is not None
+
+    def __getitem__(self, proxy_key: str) -> StoredProxy:
+        slot = self.slot_of(proxy_key)
+        if slot is None:
+            raise KeyError(proxy_key)
+        return StoredProxy(self, slot)
+
+    def __setitem__(self, proxy_key: str, proxy: Proxy):
+        slot = self.slot_of(proxy_key)
+        if slot is None:
+            packed = _packed_key(proxy_key)
+            if self._free:
+                slot = self._free.pop()
+                self._live[slot] = 1
+            else:
+                slot = len(self._live)
+                for column in self._columns.values():
+                    column.append(0)
+                self._live.append(1)
+            self._columns['ip'][slot] = packed >> 16
+            self._columns['port'][slot] = packed & 0xFFFF
+            self._table[self._find(packed)] = slot + 1
+            self._count += 1
+            # 装载率超过一半时扩容
+            if self._count * 2 > len(self._table):
+                self._resize(self._bits + 1)
+        for name in _FIELD_NAMES[2:]:
+            self.set_field(slot, name, getattr(proxy, name))
+
+    def __delitem__(self, proxy_key: str):
+        try:
+            packed = _packed_key(proxy_key)
+        except (ValueError, OSError):
+            raise KeyError(proxy_key)
+        index = self._find(packed)
+        entry = self._table[index]
+        if entry == _EMPTY:
+            raise KeyError(proxy_key)
+        self._unlink(index)
+        slot = entry - 1
+        # 空闲行清零，汇总统计可以直接对整列求和
+        for column in self._columns.values():
+            column[slot] = 0
+        self._live[slot] = 0
+        self._free.append(slot)
+        self._count -= 1
+
+    def slots(self) -> Iterator[int]:
+        """所有代理的行号"""
+        return (slot for slot, live in enumerate(self._live) if live)
+
+    def key_at(self, slot: int) -> str:
+        """行号对应的 ip:port"""
+        return f"{unpack_ip(self._columns['ip'][slot])}:{self._columns['port'][slot]}"
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.key_at(slot) for slot in self.slots())
+
+    def values(self) -> Iterator[StoredProxy]:
+        return (StoredProxy(self, slot) for slot in self.slots())
+
+    def items(self) -> Iterator:
+        return ((proxy.proxy_url, proxy) for proxy in self.values())
+
+    # ---- 汇总统计（按列计算，不创建代理对象）----
+
+    def mean_score(self, now: Optional[float] = None, half_life: Optional[float] = None) -> float:
+        """平均评分，给出 half_life 时为衰减到 now 的当前评分（空闲行为0，不影响总和）"""
+        if not half_life:
+            return sum(self._columns['score']) / max(self._count, 1)
+        total = sum(score * 0.5 ** (max(0.0, now - scored_at) / half_life)
+                    for score, scored_at in zip(self._columns['score'], self._columns['scored_at']))
+        return total / max(self._count, 1)
+
+    def mean_success_rate(self) -> float:
+        """平均成功率（未检测过的代理按0计）"""
+        total = sum(s / (s + f) for s, f in zip(self._columns['success_count'], self._columns['fail_count']) if s + f)
+        return total / max(self._count, 1)
+
+    def memory_bytes(self) -> int:
+        """列数组和哈希表占用的字节数"""
+        columns = sum(len(c) * c.itemsize for c in self._columns.values())
+        return columns + len(self._live) + len(self._table) * self._table.itemsize
+
+
+class DictProxyStore(dict):
+    """默认存储：ip:port → Proxy 对象；与 ArrayProxyStore 一样给每个代理分配可复用的行号"""
+
+    def __init__(self):
+        super().__init__()
+        self._slots: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = []
+        self._free: List[int] = []
+
+    def __setitem__(self, proxy_key: str, proxy: Proxy):
+        if proxy_key not in self._slots:
+            if self._free:
+                slot = self._free.pop()
+                self._keys[slot] = proxy_key
+            else:
+                slot = len(self._keys)
+                self._keys.append(proxy_key)
+            self._slots[proxy_key] = slot
+        super().__setitem__(proxy_key, proxy)
+
+    def __delitem__(self, proxy_key: str):
+        super().__delitem__(proxy_key)
+        slot = self._slots.pop(proxy_key)
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def slot_of(self, proxy_key: str) -> Optional[int]:
+        """代理的行号，不存在时返回 None"""
+        return self._slots.get(proxy_key)
+
+    def slots(self) -> Iterator[int]:
+        """所有代理的行号"""
+        return iter(self._slots.values())
+
+    def key_at(self, slot: int) -> str:
+        """行号对应的 ip:port"""
+        return self._keys[slot]
+
+    def mean_score(self, now: Optional[float] = None, half_life: Optional[float] = None) -> float:
+        """平均评分，给出 half_life 时为衰减到 now 的当前评分"""
+        if not half_life:
+            return sum(p.score for p in self.values()) / max(len(self), 1)
+        total = sum(p.score * 0.5 ** (max(0.0, now - p.scored_at) / half_life) for p in self.values())
+        return total / max(len(self), 1)
+
+    def mean_success_rate(self) -> float:
+        """平均成功率"""
+        return sum(p.success_rate for p in self.values()) / max(len(self), 1)
+
+
+def create_store(kind: str = 'dict'):
+    """按配置创建代理存储：'dict'（默认）或 'array'"""
+    if kind == 'array':
+        return ArrayProxyStore()
+    if kind == 'dict':
+        return DictProxyStore()
+    raise ValueError(f"未知的代理存储类型: {kind}")
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+按站点限速
+每个域名一个令牌桶（每秒请求数）和一个并发上限，另有全局并发上限；
+不同站点互不影响，不再需要全局 sleep
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from asyncio_throttle import Throttler
+
+from config import REQUEST_CONFIG
+
+
+def host_of(url: str) -> str:
+    """URL 对应的站点（域名，不含端口）"""
+    return (urlsplit(url).hostname or '').lower()
+
+
+def host_limit(host: str) -> Dict[str, float]:
+    """站点的限速配置：{'rate_limit': 每秒请求数, 'max_concurrent': 同时请求数}"""
+    limits = {
+        'rate_limit': REQUEST_CONFIG['rate_limit'],
+        'max_concurrent': REQUEST_CONFIG['host_concurrent'],
+    }
+    limits.update(REQUEST_CONFIG['host_limits'].get(host, {}))
+    return limits
+
+
+class HostLimiter:
+    """异步按站点限速器（需在同一个事件循环中使用）"""
+
+    def __init__(self, max_concurrent: Optional[int] = None):
+        self._global = asyncio.Semaphore(max_concurrent or REQUEST_CONFIG['max_concurrent'])
+        self._throttlers: Dict[str, Throttler] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_state(self, host: str):
+        if host not in self._throttlers:
+            limits = host_limit(host)
+            self._throttlers[host] = Throttler(rate_limit=limits['rate_limit'], period=1.0)
+            self._semaphores[host] = asyncio.Semaphore(limits['max_concurrent'])
+        return self._throttlers[host], self._semaphores[host]
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        """在站点并发上限内、拿到令牌后执行请求"""
+        throttler, semaphore = self._host_state(host_of(url))
+        async with semaphore:
+            # 先拿令牌再占全局名额，等待限速时不挤占其他站点的并发
+            await throttler.acquire()
+            async with self._global:
+                yield
+
+
+class SyncHostLimiter:
+    """同步按站点限速器（线程安全），按每秒请求数限制同一站点两次请求的最小间隔"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def wait(self, url: str):
+        """阻塞到该站点的下一个可用时间点"""
+        host = host_of(url)
+        interval = 1.0 / host_limit(host)['rate_limit']
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+sync_limiter = SyncHostLimiter()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+代理源健康状态与熔断
+每次抓取后记录各源是否可达，状态保存在 JSON 文件中跨运行生效：
+- closed: 正常抓取
+- open: 连续失败达到阈值后熔断，在 retry_at 之前直接跳过
+- half_open: 到达 retry_at 后先试探第一页，成功则恢复，失败则按指数退避再次熔断
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+from typing import Dict, Optional
+
+from config import SOURCE_BREAKER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_dns_error(error: Optional[BaseException]) -> bool:
+    """判断异常是否由域名解析失败引起（重试也无法恢复）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, socket.gaierror) or isinstance(getattr(error, 'os_error', None), socket.gaierror):
+            return True
+        error = error.__cause__ or error.__context__ or getattr(error, 'reason', None)
+    return False
+
+
+class SourceHealth:
+    """代理源熔断器"""
+
+    def __init__(self, filename: Optional[str] = None):
+        self.filename = filename or SOURCE_BREAKER_CONFIG['file']
+        self.failure_threshold = SOURCE_BREAKER_CONFIG['failure_threshold']
+        self.base_backoff = SOURCE_BREAKER_CONFIG['base_backoff']
+        self.max_backoff = SOURCE_BREAKER_CONFIG['max_backoff']
+        self.sources: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        """从文件加载各源状态"""
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                self.sources = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载代理源健康状态失败: {e}")
+            self.sources = {}
+
+    def save(self):
+        """保存各源状态"""
+        try:
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(self.sources, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"保存代理源健康状态失败: {e}")
+
+    def _entry(self, name: str) -> Dict:
+        return self.sources.setdefault(name, {
+            'state': CLOSED,
+            'failures': 0,
+            'backoff': 0,
+            'retry_at': 0,
+            'last_success': 0,
+            'last_error': '',
+        })
+
+    def state(self, name: str) -> str:
+        """源的当前状态"""
+        return self._entry(name)['state']
+
+    def allow(self, name: str) -> bool:
+        """本次是否抓取该源；熔断到期时转为半开状态并放行一次试探"""
+        entry = self._entry(name)
+        if entry['state'] == OPEN:
+            if time.time() < entry['retry_at']:
+                return False
+            entry['state'] = HALF_OPEN
+        return True
+
+    def record_success(self, name: str):
+        """记录一次成功抓取，熔断恢复"""
+        entry = self._entry(name)
+        if entry['state'] != CLOSED:
+            logger.info(f"代理源 {name} 已恢复")
+        entry.update(state=CLOSED, failures=0, backoff=0, retry_at=0, last_success=time.time(), last_error='')
+
+    def record_failure(self, name: str, error: str = ''):
+        """记录一次失败抓取，连续失败达到阈值或半开试探失败时熔断"""
+        entry = self._entry(name)
+        entry['failures'] += 1
+        entry['last_error'] = error[:200]
+        if entry['state'] == HALF_OPEN:
+            entry['backoff'] = min(self.max_backoff, max(self.base_backoff, entry['backoff'] * 2))
+        elif entry['failures'] >= self.failure_threshold:
+            entry['backoff'] = self.base_backoff
+        else:
+            return
+        entry['state'] = OPEN
+        entry['retry_at'] = time.time() + entry['backoff']
+        logger.info(f"代理源 {name} 熔断，{entry['backoff'] / 3600:.1f} 小时后试探: {entry['last_error']}")
+
+    def record(self, name: str, ok: bool, error: str = ''):
+        """记录一次抓取结果"""
+        if ok:
+            self.record_success(name)
+        else:
+            self.record_failure(name, error)
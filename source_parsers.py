@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+代理源页面解析器
+根据 config.PROXY_SOURCES 中每个源的 parser 配置，从抓取结果中提取 ip:port 列表
+"""
+
+import base64
+import binascii
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROXY_PATTERN = re.compile(r'^(\d{1,3}(?:\.\d{1,3}){3}):(\d{1,5})$')
+
+
+def normalize_proxy(ip: Any, port: Any = None) -> Optional[str]:
+    """规范化为 ip:port，格式不合法时返回 None"""
+    text = str(ip).strip() if port is None else f"{str(ip).strip()}:{str(port).strip()}"
+    match = PROXY_PATTERN.match(text)
+    if not match or not 0 < int(match.group(2)) < 65536:
+        return None
+    return text
+
+
+# 相邻的 IP 单元格和端口单元格（单元格内允许有 <a>/<span> 等标签和空白）
+_CELL_OPEN = rb'<td[^>]*>\s*(?:<[^>]+>\s*)*'
+_CELL_CLOSE = rb'\s*(?:<[^>]+>\s*)*</td>'
+TABLE_CELLS_PATTERN = re.compile(
+    _CELL_OPEN + rb'(\d{1,3}(?:\.\d{1,3}){3})' + _CELL_CLOSE + rb'\s*' +
+    _CELL_OPEN + rb'(\d{1,5})' + _CELL_CLOSE,
+    re.IGNORECASE,
+)
+
+
+def parse_table(result: Dict, spec: Dict) -> List[str]:
+    """
+    表格快速提取：直接在原始字节上用预编译正则匹配相邻的 IP、端口单元格，
+    不解码文本、不构建DOM，适用于 IP 和端口位于相邻两列的表格
+    """
+    content = result.get('content')
+    if not content:
+        content = result.get('text', '').encode()
+    return [f"{ip.decode()}:{port.decode()}" for ip, port in TABLE_CELLS_PATTERN.findall(content)]
+
+
+def parse_xpath(result: Dict, spec: Dict) -> List[str]:
+    """
+    按行解析表格/列表：rows 定位行，ip/port 为行内的相对 xpath
+    spec 中 fast 为 True 时先用 parse_table 快速提取，提取不到再构建DOM按 xpath 解析
+    """
+    if spec.get('fast'):
+        proxies = parse_table(result, spec)
+        if proxies:
+            return proxies
+
+    tree = result.get('tree')
+    if tree is None:
+        return []
+    proxies = []
+    for row in tree.xpath(spec['rows'])[spec.get('skip', 0):]:
+        ip = ''.join(row.xpath(spec['ip'])).strip()
+        port = ''.join(row.xpath(spec['port'])).strip()
+        if ip and port:
+            proxies.append(f"{ip}:{port}")
+    return proxies
+
+
+def parse_regex(result: Dict, spec: Dict) -> List[str]:
+    """正则提取：一个分组为完整的 ip:port，两个分组分别为 ip 和 port"""
+    proxies = []
+    for match in re.findall(spec['pattern'], result.get('text', '')):
+        proxies.append(':'.join(match) if isinstance(match, tuple) else match)
+    return proxies
+
+
+def parse_json(result: Dict, spec: Dict) -> List[str]:
+    """JSON接口：items 为列表所在的键（为空表示根节点即列表），ip/port 为元素中的字段名"""
+    data = result.get('json')
+    items = data.get(spec['items'], []) if spec.get('items') and isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return []
+    return [f"{item.get(spec['ip'], '')}:{item.get(spec['port'], '')}"
+            for item in items if isinstance(item, dict)]
+
+
+def parse_text(result: Dict, spec: Dict) -> List[str]:
+    """纯文本列表：每行第一列为 ip:port，# 开头的行为注释"""
+    proxies = []
+    for line in result.get('text', '').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        token = line.split()[0]
+        if ':' in token:
+            proxies.append(token)
+    return proxies
+
+
+def parse_base64(result: Dict, spec: Dict) -> List[str]:
+    """页面中以 Base64 编码的代理：pattern 的第一个分组为编码后的 ip:port"""
+    proxies = []
+    for encoded in re.findall(spec['pattern'], result.get('text', '')):
+        try:
+            proxies.append(base64.b64decode(encoded).decode())
+        except (binascii.Error, UnicodeDecodeError):
+            continue
+    return proxies
+
+
+PARSERS: Dict[str, Callable[[Dict, Dict], List[str]]] = {
+    'xpath': parse_xpath,
+    'table': parse_table,
+    'regex': parse_regex,
+    'json': parse_json,
+    'text': parse_text,
+    'base64': parse_base64,
+}
+
+
+def parse_result(result: Dict, spec: Dict) -> List[str]:
+    """按 spec['kind'] 解析一个抓取结果，返回规范化后的代理列表（保持页面中的顺序）"""
+    parser = PARSERS.get(spec['kind'])
+    if parser is None:
+        raise ValueError(f"未知的解析方式: {spec['kind']}")
+    proxies = []
+    for raw in parser(result, spec):
+        proxy = normalize_proxy(raw)
+        if proxy:
+            proxies.append(proxy)
+    return proxies
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+代理源产出统计
+每次运行记录各源的抓取页数、字节数、抓取/解析耗时、原始/去重/新增/验证通过的代理数和有效代理延迟，
+每次运行追加一行到 JSONL 历史文件，用于找出单位抓取时间内有效代理产出最高的源
+
+用法:
+    python source_stats.py                  # 汇总最近的运行
+    python source_stats.py --runs 20 --sort new
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from config import SOURCE_STATS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_entry() -> Dict:
+    return {
+        'ok': False,
+        'skipped': False,
+        'pages': 0,
+        'not_modified': 0,
+        'bytes': 0,
+        'fetch_time': 0.0,
+        'parse_time': 0.0,
+        'raw': 0,
+        'unique': 0,
+        'new': None,
+        'verified': None,
+        'latency': None,
+    }
+
+
+class SourceStats:
+    """一次运行中各源的统计"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.sources: Dict[str, Dict] = {}
+
+    def record_fetch(self, name: str, **fields):
+        """记录源的抓取统计（ok/skipped/pages/not_modified/bytes/fetch_time/parse_time/raw/unique）"""
+        self.sources.setdefault(name, _empty_entry()).update(fields)
+
+    def attribute(self, source_results: Dict[str, List[str]], known: Set[str],
+                  details: Optional[Dict[str, Dict]] = None):
+        """
+        统计各源的新增和验证通过数：known 为本次抓取前已有的代理，
+        details 为 {代理: 验证结果}，未验证时为 None；同一代理出现在多个源时每个源都计入
+        """
+        for name, proxies in source_results.items():
+            entry = self.sources.setdefault(name, _empty_entry())
+            entry['new'] = sum(1 for proxy in proxies if proxy not in known)
+            if details is None:
+                continue
+            latencies = [details[proxy].get('response_time') or 0.0
+                         for proxy in proxies if details.get(proxy, {}).get('valid')]
+            entry['verified'] = len(latencies)
+            entry['latency'] = round(statistics.median(latencies), 3) if latencies else None
+
+    def save(self, filename: Optional[str] = None):
+        """追加本次运行的统计到历史文件，超过 max_runs 时只保留最近的记录"""
+        filename = filename or SOURCE_STATS_CONFIG['file']
+        record = {'time': round(self.started_at), 'sources': self.sources}
+        try:
+            with open(filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            with open(filename, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            if len(lines) > SOURCE_STATS_CONFIG['max_runs']:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.writelines(lines[-SOURCE_STATS_CONFIG['max_runs']:])
+        except OSError as e:
+            logger.warning(f"保存代理源统计失败: {e}")
+
+
+def load_history(filename: Optional[str] = None, runs: Optional[int] = None) -> List[Dict]:
+    """读取历史记录（最近 runs 次，默认全部），跳过损坏的行"""
+    filename = filename or SOURCE_STATS_CONFIG['file']
+    if not os.path.exists(filename):
+        return []
+    history = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                history.append(json.loads(line))
+            except ValueError:
+                continue
+    return history[-runs:] if runs else history
+
+
+def summarize(history: Iterable[Dict]) -> List[Dict]:
+    """按源汇总历史记录，按每秒抓取时间产出的有效代理数（yield）从高到低排序"""
+    totals: Dict[str, Dict] = {}
+    for run in history:
+        for name, entry in run.get('sources', {}).items():
+            total = totals.setdefault(name, {
+                'source': name, 'runs': 0, 'ok': 0, 'skipped': 0, 'pages': 0, 'not_modified': 0,
+                'bytes': 0, 'fetch_time': 0.0, 'parse_time': 0.0, 'raw': 0, 'unique': 0,
+                'new': 0, 'verified': 0, 'verified_runs': 0, 'latencies': [],
+            })
+            total['runs'] += 1
+            total['ok'] += bool(entry.get('ok'))
+            total['skipped'] += bool(entry.get('skipped'))
+            for key in ('pages', 'not_modified', 'bytes', 'fetch_time', 'parse_time', 'raw', 'unique'):
+                total[key] += entry.get(key) or 0
+            total['new'] += entry.get('new') or 0
+            if entry.get('verified') is not None:
+                total['verified'] += entry['verified']
+                total['verified_runs'] += 1
+            if entry.get('latency') is not None:
+                total['latencies'].append(entry['latency'])
+
+    rows = []
+    for total in totals.values():
+        latencies = total.pop('latencies')
+        total['latency'] = round(statistics.median(latencies), 3) if latencies else None
+        total['yield'] = total['verified'] / total['fetch_time'] if total['fetch_time'] else 0.0
+        rows.append(total)
+    rows.sort(key=lambda row: row['yield'], reverse=True)
+    return rows
+
+
+def print_report(rows: List[Dict], runs: int):
+    """打印汇总表（数量为每次运行的平均值）"""
+    print(f"最近 {runs} 次运行的代理源产出（数量为每次平均，有效/s 为每秒抓取时间产出的有效代理数）")
+    print(f"{'源':<22}{'成功/次数':>10}{'熔断':>6}{'页数':>7}{'KB':>9}{'抓取s':>8}{'解析ms':>9}"
+          f"{'原始':>8}{'去重':>8}{'新增':>8}{'有效':>8}{'有效/s':>9}{'延迟s':>8}")
+    for row in rows:
+        n = row['runs']
+        verified = f"{row['verified'] / row['verified_runs']:.1f}" if row['verified_runs'] else '-'
+        latency = f"{row['latency']:.2f}" if row['latency'] is not None else '-'
+        print(f"{row['source']:<22}{row['ok']:>5}/{n:<4}{row['skipped']:>6}{row['pages'] / n:>7.1f}"
+              f"{row['bytes'] / n / 1024:>9.1f}{row['fetch_time'] / n:>8.2f}{row['parse_time'] / n * 1000:>9.1f}"
+              f"{row['raw'] / n:>8.1f}{row['unique'] / n:>8.1f}{row['new'] / n:>8.1f}{verified:>8}"
+              f"{row['yield']:>9.2f}{latency:>8}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='代理源产出统计')
+    parser.add_argument('--file', default=SOURCE_STATS_CONFIG['file'])
+    parser.add_argument('--runs', type=int, default=0, help='只统计最近的运行次数（默认全部）')
+    parser.add_argument('--sort', default='yield',
+                        choices=['yield', 'verified', 'new', 'unique', 'fetch_time', 'latency'])
+    args = parser.parse_args()
+
+    history = load_history(args.file, args.runs or None)
+    if not history:
+        print(f"没有统计记录: {args.file}")
+        return
+    rows = summarize(history)
+    if args.sort == 'latency':
+        rows.sort(key=lambda row: (row['latency'] is None, row['latency'] or 0))
+    elif args.sort != 'yield':
+        rows.sort(key=lambda row: row[args.sort], reverse=args.sort != 'fetch_time')
+    print_report(rows, len(history))
+
+
+if __name__ == '__main__':
+    main()
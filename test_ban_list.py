@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+测试会过期的代理禁用列表（ban_list.py）
+
+用法:
+    python -m unittest test_ban_list
+"""
+
+import unittest
+from unittest import mock
+
+from ban_list import BanList, BloomFilter
+
+CONFIG = {
+    'ban_ttl': 10,
+    'max_ban_ttl': 40,
+    'ban_memory': 100,
+    'ban_bloom': False,
+    'bloom_strikes': 3,
+    'bloom_capacity': 1000,
+    'bloom_error_rate': 0.001,
+}
+
+
+class FakeClock:
+    """替代 time.time 的可控时钟"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class BanListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('ban_list.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_backoff_doubles_up_to_cap(self):
+        bans = BanList(CONFIG)
+        ttls = []
+        for _ in range(5):
+            ttls.append(bans.ban('1.1.1.1:80'))
+            # 等当前禁用到期后再次禁用
+            self.clock.now += ttls[-1] + 1
+        self.assertEqual(ttls, [10, 20, 40, 40, 40])
+
+    def test_ban_expires_and_proxy_is_readmitted(self):
+        bans = BanList(CONFIG)
+        bans.ban('1.1.1.1:80')
+        self.assertIn('1.1.1.1:80', bans)
+        self.assertEqual(len(bans), 1)
+        self.assertEqual(list(bans), ['1.1.1.1:80'])
+
+        self.clock.now += 9
+        self.assertIn('1.1.1.1:80', bans)
+        self.clock.now += 1
+        self.assertNotIn('1.1.1.1:80', bans)
+        self.assertEqual(bans.expire(), ['1.1.1.1:80'])
+        self.assertEqual(len(bans), 0)
+        self.assertEqual(list(bans), [])
+
+    def test_strikes_are_forgotten_after_memory(self):
+        bans = BanList(CONFIG)
+        bans.ban('1.1.1.1:80')
+        # 禁用到期后 ban_memory 秒内仍记得禁用次数
+        self.clock.now += 10 + 99
+        self.assertEqual(bans.ban('1.1.1.1:80'), 20)
+        # 遗忘后从列表中删除，再次禁用按首次处理
+        self.clock.now += 20 + 100
+        bans.expire()
+        self.assertEqual(bans._entries, {})
+        self.assertEqual(bans.ban('1.1.1.1:80'), 10)
+
+    def test_zero_memory_forgets_when_ban_ends(self):
+        bans = BanList(dict(CONFIG, ban_memory=0, ban_ttl=1))
+        bans.ban('1.1.1.1:80', now=1000)
+        self.assertEqual(bans.expire(now=2000), ['1.1.1.1:80'])
+        self.assertEqual(bans._entries, {})
+        self.assertEqual(bans._heap, [])
+        self.assertEqual(bans._active, 0)
+        self.assertEqual(bans.ban('1.1.1.1:80', now=2001), 1)
+
+    def test_negative_memory_is_rejected(self):
+        with self.assertRaises(ValueError):
+            BanList(dict(CONFIG, ban_memory=-1))
+
+    def test_reban_while_active_keeps_count(self):
+        bans = BanList(CONFIG)
+        bans.ban('1.1.1.1:80')
+        self.assertEqual(bans.ban('1.1.1.1:80'), 20)
+        self.assertEqual(len(bans), 1)
+        # 旧的到期时间留在堆中，不能提前解禁
+        self.clock.now += 15
+        self.assertIn('1.1.1.1:80', bans)
+        self.assertEqual(len(bans), 1)
+
+    def test_heap_stays_bounded(self):
+        bans = BanList(CONFIG)
+        for _ in range(1000):
+            bans.ban('1.1.1.1:80')
+        self.assertLessEqual(len(bans._heap), 2 * len(bans._entries) + 64)
+
+    def test_bloom_tier_keeps_repeat_offenders(self):
+        bans = BanList(dict(CONFIG, ban_bloom=True))
+        for _ in range(3):
+            self.clock.now += bans.ban('1.1.1.1:80') + 1
+        bans.ban('2.2.2.2:80')
+        self.clock.now += 1000
+        bans.expire()
+        self.assertEqual(bans._entries, {})
+        # 禁用次数达到 bloom_strikes 的代理永久禁用，其余的遗忘后即可重新加入
+        self.assertIn('1.1.1.1:80', bans)
+        self.assertNotIn('2.2.2.2:80', bans)
+
+    def test_roundtrip_and_legacy_list(self):
+        bans = BanList(dict(CONFIG, ban_bloom=True))
+        bans.ban('1.1.1.1:80')
+        bans.bloom.add('3.3.3.3:80')
+        data = bans.to_dict()
+
+        restored = BanList(dict(CONFIG, ban_bloom=True))
+        restored.load(data, ['1.1.1.1:80', '2.2.2.2:80'])
+        self.assertIn('1.1.1.1:80', restored)
+        self.assertIn('3.3.3.3:80', restored)
+        # 旧版本的永久禁用列表按首次禁用处理
+        self.assertIn('2.2.2.2:80', restored)
+        self.assertEqual(restored._entries['2.2.2.2:80'][1], 1)
+        self.assertEqual(len(restored), 2)
+        self.clock.now += 10
+        self.assertEqual(len(restored), 0)
+        self.assertIn('3.3.3.3:80', restored)
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives_and_low_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        added = [f"10.0.{i >> 8}.{i & 255}:80" for i in range(1000)]
+        for key in added:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in added))
+        false_positives = sum(f"11.0.{i >> 8}.{i & 255}:80" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
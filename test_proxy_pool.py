@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+测试代理池的评分与索引维护（proxy_pool.py）
+
+用法:
+    python -m unittest test_proxy_pool
+"""
+
+import random
+import time
+import unittest
+from unittest import mock
+
+from config import PROXY_POOL_CONFIG
+from proxy_pool import Proxy, ProxyPool, _heap_entry, _rank_entry
+
+
+class ProxyPoolScoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ProxyPool(dict(PROXY_POOL_CONFIG, store='dict', ban_threshold=3))
+
+    def test_readd_keeps_existing_scores(self):
+        pool = self.pool
+        pool.add_proxy(Proxy('1.2.3.4', 80))
+        pool.update_proxy_score('1.2.3.4:80', True, 1.0)
+        pool.update_proxy_score('1.2.3.4:80', False)
+        proxy = pool.proxies['1.2.3.4:80']
+        before = (proxy.success_count, proxy.fail_count, proxy.response_time, proxy.success_ewma)
+
+        # 代理源每次运行都会重新列出同一代理
+        self.assertTrue(pool.add_proxy(Proxy('1.2.3.4', 80)))
+        proxy = pool.proxies['1.2.3.4:80']
+        self.assertEqual((proxy.success_count, proxy.fail_count, proxy.response_time, proxy.success_ewma), before)
+
+        # 下一次检测与已有的 EWMA 混合，而不是从头开始
+        pool.update_proxy_score('1.2.3.4:80', True, 1.0)
+        alpha = pool.config['ewma_alpha']
+        self.assertAlmostEqual(proxy.success_ewma, alpha + (1 - alpha) * before[3])
+        self.assertEqual(proxy.success_count, 2)
+
+    def test_failures_accumulate_across_readds(self):
+        pool = self.pool
+        for _ in range(3):
+            pool.add_proxy(Proxy('1.2.3.4', 80))
+            pool.update_proxy_score('1.2.3.4:80', False)
+        self.assertNotIn('1.2.3.4:80', pool.proxies)
+        self.assertIn('1.2.3.4:80', pool.banned_proxies)
+
+    def test_readd_with_check_data_merges(self):
+        pool = self.pool
+        pool.add_proxy(Proxy('1.2.3.4', 80))
+        pool.add_proxy(Proxy('1.2.3.4', 80, success_count=5, fail_count=1, response_time=0.5, success_ewma=0.9))
+        proxy = pool.proxies['1.2.3.4:80']
+        self.assertEqual((proxy.success_count, proxy.fail_count, proxy.response_time), (5, 1, 0.5))
+        self.assertEqual(proxy.success_ewma, 0.9)
+
+
+class ProxyPoolRankingTest(unittest.TestCase):
+    """随机更新评分，排行和有效代理集合与逐项排序的参照结果一致"""
+
+    def expected_ranking(self, pool: ProxyPool, now: float):
+        threshold = pool._valid_threshold(now)
+        # 排序键相同时按行号排列
+        ranked = [(-pool._decay_key(proxy), -proxy.success_rate, pool.proxies.slot_of(key), key)
+                  for key, proxy in pool.proxies.items()
+                  if proxy.is_valid and pool._decay_key(proxy) >= threshold]
+        return [key for *_, key in sorted(ranked)]
+
+    def valid_keys(self, pool: ProxyPool):
+        return {pool.proxies.key_at(slot) for slot in pool._valid}
+
+    def test_random_updates_match_sorted_reference(self):
+        for store in ('dict', 'array'):
+            with self.subTest(store=store):
+                self.run_random_updates(store)
+
+    def run_random_updates(self, store: str):
+        rng = random.Random(5)
+        pool = ProxyPool(dict(PROXY_POOL_CONFIG, store=store, ban_threshold=10 ** 9, score_half_life=100))
+        now = time.time()
+        with mock.patch('proxy_pool.time.time', lambda: now):
+            for step in range(3000):
+                key = f"10.0.0.{rng.randrange(150)}:80"
+                ip, port = key.split(':')
+                action = rng.random()
+                if action < 0.1:
+                    pool.remove_proxy(key)
+                elif pool.add_proxy(Proxy(ip, int(port))):
+                    pool.update_proxy_score(key, rng.random() < 0.7, rng.random() * 3)
+                    pool.proxies[key].scored_at = now - rng.randrange(200)
+                    pool._reindex(key)
+                if step % 300 == 0:
+                    expected = self.expected_ranking(pool, now)
+                    best = [proxy.proxy_url for proxy in pool.get_best_proxies(len(expected) + 5)]
+                    self.assertEqual(best, expected)
+                    self.assertEqual(self.valid_keys(pool), set(expected))
+                    self.assertEqual([p.proxy_url for p in pool.get_best_proxies(5)], expected[:5])
+            # 时间推移后衰减到 min_score 以下的代理移出排行
+            now += 150
+            expected = self.expected_ranking(pool, now)
+            self.assertEqual([proxy.proxy_url for proxy in pool.get_best_proxies(1000)], expected)
+            self.assertEqual(self.valid_keys(pool), set(expected))
+            self.assertLessEqual(len(pool._ranking), 2 * len(pool._valid) + 64)
+
+
+class HeapEntryTest(unittest.TestCase):
+    """打包成整数的堆条目与元组排序一致"""
+
+    def test_order_matches_tuples(self):
+        rng = random.Random(9)
+        values = [0.0, -0.5, 1e-300, -1e300, 3.5, 1.7e9] + [rng.uniform(-1e6, 1e6) for _ in range(200)]
+        pairs = [(rng.choice(values), rng.randrange(1 << 20)) for _ in range(500)]
+        self.assertEqual(sorted(pairs), sorted(pairs, key=lambda p: _heap_entry(*p)))
+
+        triples = [(rng.choice(values), rng.choice((0.0, 0.25, 0.5, 1.0)), rng.randrange(50)) for _ in range(500)]
+        expected = sorted(triples, key=lambda t: (-t[0], -t[1], t[2]))
+        self.assertEqual(sorted(triples, key=lambda t: _rank_entry(*t)), expected)
+
+
+class ProxyPoolRecheckTest(unittest.TestCase):
+
+    def test_removed_slot_is_reused_without_stale_schedule(self):
+        for store in ('dict', 'array'):
+            with self.subTest(store=store):
+                pool = ProxyPool(dict(PROXY_POOL_CONFIG, store=store))
+                pool.add_proxy(Proxy('1.1.1.1', 80))
+                pool.record_check('1.1.1.1:80', True)
+                slot = pool.proxies.slot_of('1.1.1.1:80')
+                pool.remove_proxy('1.1.1.1:80')
+                # 新代理复用同一行，不能继承旧代理的复检计划和连续成功次数
+                pool.add_proxy(Proxy('2.2.2.2', 80))
+                self.assertEqual(pool.proxies.slot_of('2.2.2.2:80'), slot)
+                self.assertEqual(pool._check_streak[slot], 0)
+                self.assertEqual([p.proxy_url for p in pool.pop_due_proxies()], ['2.2.2.2:80'])
+                self.assertEqual(pool.pop_due_proxies(time.time() + 10 ** 6), [])
+
+    def test_recheck_heap_stays_bounded(self):
+        pool = ProxyPool(dict(PROXY_POOL_CONFIG, store='dict'))
+        pool.add_proxy(Proxy('1.1.1.1', 80))
+        for _ in range(1000):
+            pool.record_check('1.1.1.1:80', True)
+        self.assertLessEqual(len(pool._recheck_heap), 2 * len(pool.proxies) + 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+测试紧凑列式代理存储（proxy_store.py）
+
+用法:
+    python -m unittest test_proxy_store
+"""
+
+import random
+import unittest
+from datetime import datetime
+
+from proxy_pool import Proxy
+from proxy_store import ArrayProxyStore, DictProxyStore, StoredProxy, pack_ip, unpack_ip
+
+
+def random_proxy(rng: random.Random) -> Proxy:
+    # 地址范围较小，保证有重复插入、更新和哈希冲突
+    return Proxy(
+        ip=f"10.{rng.randrange(2)}.{rng.randrange(4)}.{rng.randrange(64)}",
+        port=rng.choice((80, 3128, 8080)),
+        score=round(rng.random(), 2),
+        success_count=rng.randrange(100),
+        fail_count=rng.randrange(100),
+        last_success_time=datetime(2024, 1, 1, 12, rng.randrange(60)) if rng.random() < 0.5 else None,
+        response_time=round(rng.random() * 5, 2),
+        country=rng.choice(('', 'CN', 'US')),
+        anonymity=rng.choice(('', 'anonymous', 'high_anonymous')),
+        proxy_type=rng.choice(('http', 'https,http', 'socks5')),
+        success_ewma=round(rng.random(), 2),
+        scored_at=float(rng.randrange(10 ** 9)),
+    )
+
+
+class ArrayProxyStoreTest(unittest.TestCase):
+    """随机增删改查，与 dict 参照实现对比"""
+
+    def assert_same_proxy(self, stored: StoredProxy, proxy: Proxy):
+        detached = stored.detach()
+        # float32 列只保留约7位有效数字
+        for name in ('score', 'response_time', 'success_ewma'):
+            self.assertAlmostEqual(getattr(detached, name), getattr(proxy, name), places=5)
+            setattr(detached, name, getattr(proxy, name))
+        self.assertEqual(detached, proxy)
+
+    def assert_matches(self, store: ArrayProxyStore, expected: dict):
+        self.assertEqual(len(store), len(expected))
+        self.assertEqual(set(store), set(expected))
+        for key, proxy in expected.items():
+            self.assertIn(key, store)
+            self.assert_same_proxy(store[key], proxy)
+
+    def test_random_operations_match_dict(self):
+        rng = random.Random(11)
+        store = ArrayProxyStore()
+        expected = {}
+        for step in range(5000):
+            proxy = random_proxy(rng)
+            key = proxy.proxy_url
+            action = rng.random()
+            if action < 0.5:
+                store[key] = proxy
+                expected[key] = proxy
+            elif action < 0.8:
+                if key in expected:
+                    del store[key]
+                    del expected[key]
+                else:
+                    with self.assertRaises(KeyError):
+                        del store[key]
+            else:
+                self.assertEqual(key in store, key in expected)
+                if key in expected:
+                    self.assert_same_proxy(store[key], expected[key])
+                else:
+                    with self.assertRaises(KeyError):
+                        store[key]
+            if step % 500 == 0:
+                self.assert_matches(store, expected)
+        self.assert_matches(store, expected)
+
+        # 全部删除后哈希表中不能残留条目
+        for key in list(expected):
+            del store[key]
+        self.assert_matches(store, {})
+        self.assertTrue(all(entry == 0 for entry in store._table))
+
+    def test_view_writes_through(self):
+        store = ArrayProxyStore()
+        store['1.2.3.4:80'] = Proxy('1.2.3.4', 80)
+        view = store['1.2.3.4:80']
+        view.score = 0.25
+        view.success_count += 3
+        view.country = 'CN'
+        view.last_fail_time = datetime(2024, 5, 1)
+        fresh = store['1.2.3.4:80']
+        self.assertEqual((fresh.score, fresh.success_count, fresh.country), (0.25, 3, 'CN'))
+        self.assertEqual(fresh.last_fail_time, datetime(2024, 5, 1))
+        with self.assertRaises(AttributeError):
+            view.port = 81
+
+    def test_invalid_keys(self):
+        store = ArrayProxyStore()
+        self.assertNotIn('not-a-proxy', store)
+        self.assertNotIn(12345, store)
+        with self.assertRaises(KeyError):
+            store['not-a-proxy']
+
+    def test_slots_are_stable_and_reused(self):
+        for store in (ArrayProxyStore(), DictProxyStore()):
+            with self.subTest(store=type(store).__name__):
+                store['1.1.1.1:80'] = Proxy('1.1.1.1', 80)
+                store['2.2.2.2:80'] = Proxy('2.2.2.2', 80)
+                slot = store.slot_of('1.1.1.1:80')
+                self.assertEqual(store.key_at(slot), '1.1.1.1:80')
+                store['1.1.1.1:80'] = Proxy('1.1.1.1', 80, score=0.5)
+                self.assertEqual(store.slot_of('1.1.1.1:80'), slot)
+                del store['1.1.1.1:80']
+                self.assertIsNone(store.slot_of('1.1.1.1:80'))
+                store['3.3.3.3:80'] = Proxy('3.3.3.3', 80)
+                self.assertEqual(store.slot_of('3.3.3.3:80'), slot)
+                self.assertEqual(sorted(store.key_at(i) for i in store.slots()), ['2.2.2.2:80', '3.3.3.3:80'])
+
+    def test_pack_ip_roundtrip(self):
+        for ip in ('0.0.0.0', '1.2.3.4', '255.255.255.255'):
+            self.assertEqual(unpack_ip(pack_ip(ip)), ip)
+
+
+if __name__ == '__main__':
+    unittest.main()
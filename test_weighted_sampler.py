@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+测试按权重随机抽样（weighted_sampler.py）
+
+用法:
+    python -m unittest test_weighted_sampler
+"""
+
+import random
+import unittest
+from collections import Counter
+
+from weighted_sampler import WEIGHT_SCALE, WeightedSampler
+
+
+class WeightedSamplerTest(unittest.TestCase):
+    """与逐项求和的参照实现对比"""
+
+    def assert_consistent(self, sampler: WeightedSampler, expected: dict):
+        """树状数组的每个前缀和、总权重、成员都与参照字典一致"""
+        self.assertEqual(len(sampler), len(expected))
+        self.assertEqual(set(sampler), set(expected))
+        weights = [int(round(expected[key] * WEIGHT_SCALE)) for key in sampler._keys]
+        self.assertEqual(sampler._weights, weights)
+        for index in range(len(weights) + 1):
+            self.assertEqual(sampler._prefix(index), sum(weights[:index]))
+        self.assertEqual(sampler.total, sum(weights))
+
+    def test_random_operations_match_reference(self):
+        rng = random.Random(7)
+        sampler = WeightedSampler(random.Random(1))
+        expected = {}
+        for _ in range(2000):
+            key = rng.randrange(200)
+            if rng.random() < 0.3:
+                sampler.discard(key)
+                expected.pop(key, None)
+            else:
+                weight = round(rng.random(), 4)
+                sampler.set(key, weight)
+                expected[key] = weight
+        self.assert_consistent(sampler, expected)
+
+        for key in list(expected):
+            sampler.discard(key)
+            del expected[key]
+        self.assert_consistent(sampler, expected)
+        self.assertIsNone(sampler.sample())
+        self.assertIsNone(sampler.choice())
+
+    def test_sample_follows_weights(self):
+        sampler = WeightedSampler(random.Random(3))
+        weights = {'a': 0.1, 'b': 0.3, 'c': 0.6, 'd': 0.0}
+        for key, weight in weights.items():
+            sampler.set(key, weight)
+        counts = Counter(sampler.sample() for _ in range(20000))
+        self.assertEqual(counts['d'], 0)
+        for key in ('a', 'b', 'c'):
+            self.assertAlmostEqual(counts[key] / 20000, weights[key], delta=0.02)
+
+    def test_zero_total_falls_back_to_uniform(self):
+        sampler = WeightedSampler(random.Random(5))
+        for key in 'xyz':
+            sampler.set(key, 0)
+        counts = Counter(sampler.sample() for _ in range(3000))
+        self.assertEqual(set(counts), set('xyz'))
+
+    def test_clear(self):
+        sampler = WeightedSampler()
+        sampler.set('a', 1.0)
+        sampler.clear()
+        self.assert_consistent(sampler, {})
+        sampler.set('b', 0.5)
+        self.assert_consistent(sampler, {'b': 0.5})
+
+
+if __name__ == '__main__':
+    unittest.main()
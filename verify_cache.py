@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+代理验证结果缓存
+以 ip:port 为键，把最近一次的验证结果、延迟、协议、匿名度和时间保存在 SQLite 中，
+定时任务重复运行时，未过期的结果直接复用，只有过期或新出现的代理才重新验证
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import VERIFY_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class VerifyCache:
+    """验证结果缓存"""
+
+    def __init__(self, filename: Optional[str] = None, ttl: Optional[float] = None):
+        self.filename = filename or VERIFY_CACHE_CONFIG['file']
+        self.ttl = ttl if ttl is not None else VERIFY_CACHE_CONFIG['ttl']
+        self.conn = sqlite3.connect(self.filename)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS verify_cache ('
+            ' proxy TEXT PRIMARY KEY,'
+            ' valid INTEGER NOT NULL,'
+            ' response_time REAL NOT NULL DEFAULT 0,'
+            ' checked_at REAL NOT NULL)'
+        )
+        self._add_column('protocols', "TEXT NOT NULL DEFAULT ''")
+        self._add_column('anonymity', "TEXT NOT NULL DEFAULT ''")
+        self.conn.commit()
+
+    def _add_column(self, name: str, definition: str):
+        """为旧版本创建的缓存文件补充新列"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(verify_cache)')}
+        if name not in columns:
+            self.conn.execute(f'ALTER TABLE verify_cache ADD COLUMN {name} {definition}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def get(self, proxy: str) -> Optional[Dict]:
+        """获取未过期的缓存结果，没有则返回 None"""
+        return self.get_many([proxy]).get(proxy)
+
+    def get_many(self, proxies: Iterable[str]) -> Dict[str, Dict]:
+        """批量获取未过期的缓存结果"""
+        expire_before = time.time() - self.ttl
+        found = {}
+        proxies = list(proxies)
+        # SQLite 单条语句的参数个数有限，分批查询
+        for start in range(0, len(proxies), 500):
+            batch = proxies[start:start + 500]
+            rows = self.conn.execute(
+                'SELECT proxy, valid, response_time, checked_at, protocols, anonymity FROM verify_cache'
+                f' WHERE checked_at >= ? AND proxy IN ({",".join("?" * len(batch))})',
+                [expire_before, *batch]
+            )
+            for proxy, valid, response_time, checked_at, protocols, anonymity in rows:
+                found[proxy] = {
+                    'proxy': proxy,
+                    'valid': bool(valid),
+                    'response_time': response_time,
+                    'checked_at': checked_at,
+                    'protocols': [p for p in protocols.split(',') if p],
+                    'anonymity': anonymity,
+                }
+        return found
+
+    def put(self, proxy: str, valid: bool, response_time: float = 0.0, protocols: Optional[List[str]] = None,
+            anonymity: str = ''):
+        """写入一条验证结果"""
+        self.put_many([{'proxy': proxy, 'valid': valid, 'response_time': response_time,
+                        'protocols': protocols or [], 'anonymity': anonymity}])
+
+    def put_many(self, results: Iterable[Dict]):
+        """批量写入验证结果（字段同 get_many 的返回值）"""
+        now = time.time()
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO verify_cache (proxy, valid, response_time, checked_at, protocols, anonymity)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            [(r['proxy'], int(r['valid']), r.get('response_time', 0.0), now,
+              ','.join(r.get('protocols') or []), r.get('anonymity') or '')
+             for r in results]
+        )
+        self.conn.commit()
+
+    def split(self, proxies: Iterable[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        """把代理分为 (未过期的缓存结果, 需要重新验证的代理)"""
+        proxies = list(proxies)
+        cached = self.get_many(proxies)
+        stale = [proxy for proxy in proxies if proxy not in cached]
+        return cached, stale
+
+    def purge(self, max_age: Optional[float] = None) -> int:
+        """删除超过 max_age（默认 ttl 的10倍）的旧记录，返回删除条数"""
+        max_age = max_age if max_age is not None else self.ttl * 10
+        cursor = self.conn.execute('DELETE FROM verify_cache WHERE checked_at < ?', (time.time() - max_age,))
+        self.conn.commit()
+        return cursor.rowcount
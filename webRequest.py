@@ -26,6 +26,10 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 from fake_useragent import UserAgent
 
+from page_cache import PageCache, default_page_cache
+from rate_limit import sync_limiter
+from source_health import is_dns_error
+
 ua = UserAgent()
 
 
@@ -34,6 +38,8 @@ class WebRequest(object):
 
     def __init__(self, *args, **kwargs):
         self.response = Response()
+        # 页面缓存：发送条件请求，304 时回放缓存的页面内容
+        self.cache = kwargs.get('cache') or default_page_cache()
 
     def req_header(self):
         _header = {'User-Agent': ua.random,
@@ -53,12 +59,16 @@ class WebRequest(object):
         :return:
         """
         headers = self.req_header()
+        cached = self.cache.get(url) if self.cache else None
+        headers.update(PageCache.validators(cached))
         if header and isinstance(header, dict):
             headers.update(header)
 
         for attempt in range(retry_time):
             try:
                 print(f"Fetching: {url} (attempt {attempt + 1}/{retry_time})")
+                # 按站点限速，同一站点的请求自动保持间隔
+                sync_limiter.wait(url)
                 self.response = requests.get(
                     url
                     , headers=headers
@@ -67,11 +77,20 @@ class WebRequest(object):
                     , *args
                     , **kwargs
                 )
+                if self.response.status_code == 304 and cached:
+                    self.cache.touch(url)
+                    self.response = self._replay(url, cached['body'])
+                    print(f"Not modified: {url} - using cached page")
+                    return self
+                if self.response.status_code == 200 and self.cache:
+                    self.cache.store(url, self.response.headers.get('ETag'),
+                                     self.response.headers.get('Last-Modified'), self.response.content)
                 print(f"Success: {url} - Status: {self.response.status_code}")
                 return self
             except Exception as e:
                 print(f"Failed: {url} - Error: {str(e)} - Attempt {attempt + 1}/{retry_time}")
-                if attempt < retry_time - 1:
+                # 域名解析失败重试也无法恢复
+                if attempt < retry_time - 1 and not is_dns_error(e):
                     time.sleep(retry_interval)
                 else:
                     # Final attempt failed, return empty response
@@ -80,6 +99,15 @@ class WebRequest(object):
                     self.response = resp
                     return self
 
+    @staticmethod
+    def _replay(url, body):
+        """用缓存的页面内容构造一个 200 响应"""
+        resp = Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = body
+        return resp
+
     @property
     def tree(self):
         if self.response.status_code == 200:
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+按权重随机抽样
+树状数组（Fenwick tree）保存各元素权重的前缀和：增删改和按权重抽样都是 O(log n)，均匀抽样 O(1)。
+权重按 WEIGHT_SCALE 取整后以整数累加，频繁更新也不会产生浮点误差
+"""
+
+import random
+from typing import Dict, Hashable, Iterator, List, Optional
+
+WEIGHT_SCALE = 10000
+
+
+class WeightedSampler:
+    """支持动态增删的按权重抽样集合"""
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+        self._keys: List[Hashable] = []
+        self._weights: List[int] = []
+        self._tree: List[int] = [0]  # 下标从1开始
+        self._slots: Dict[Hashable, int] = {}
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._keys)
+
+    def _add(self, index: int, delta: int):
+        """第 index 个元素（从1开始）的权重增加 delta"""
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index: int) -> int:
+        """前 index 个元素的权重之和"""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def set(self, key: Hashable, weight: float):
+        """加入元素或修改其权重"""
+        value = max(0, int(round(weight * WEIGHT_SCALE)))
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._add(slot + 1, value - self._weights[slot])
+            self.total += value - self._weights[slot]
+            self._weights[slot] = value
+            return
+        index = len(self._keys) + 1
+        self._slots[key] = index - 1
+        self._keys.append(key)
+        self._weights.append(value)
+        # 新节点覆盖 (index - lowbit, index] 区间
+        self._tree.append(value + self._prefix(index - 1) - self._prefix(index - (index & -index)))
+        self.total += value
+
+    def discard(self, key: Hashable):
+        """移除元素（不存在时忽略）：用最后一个元素填补空位，再删除末尾节点"""
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        last = len(self._keys) - 1
+        removed = self._weights[slot]
+        if slot != last:
+            moved_key, moved = self._keys[last], self._weights[last]
+            self._add(slot + 1, moved - removed)
+            self._keys[slot], self._weights[slot] = moved_key, moved
+            self._slots[moved_key] = slot
+        # 末尾节点只覆盖以它结尾的区间，直接删除不影响其余节点
+        self._keys.pop()
+        self._weights.pop()
+        self._tree.pop()
+        self.total -= removed
+
+    def clear(self):
+        """清空"""
+        self._keys.clear()
+        self._weights.clear()
+        self._tree = [0]
+        self._slots.clear()
+        self.total = 0
+
+    def choice(self) -> Optional[Hashable]:
+        """均匀随机取一个元素，为空时返回 None"""
+        if not self._keys:
+            return None
+        return self._keys[self.rng.randrange(len(self._keys))]
+
+    def sample(self) -> Optional[Hashable]:
+        """按权重随机取一个元素；总权重为0时退化为均匀抽样"""
+        if self.total <= 0:
+            return self.choice()
+        target = self.rng.randrange(self.total)
+        # 在树上二分查找前缀和超过 target 的第一个位置
+        index = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self._tree) and self._tree[nxt] <= target:
+                index = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return self._keys[index]